@@ -1,17 +1,16 @@
 from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, send_file, Response, stream_with_context
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 from werkzeug.security import check_password_hash, generate_password_hash
-import requests
 import pandas as pd
 import io
 import datetime
 import json
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
 from config import Config, get_local_now
-from db_setup import User, Log, Base, Horario, Secao, Gerencia, GerenciaSecao, Situacao, Pessoa, AgendamentoComando, ComandoRecorrente
+from database import engine, Session, get_db_session
+from db_setup import User, Log, Base, Horario, Secao, Gerencia, GerenciaSecao, Situacao, Pessoa, AgendamentoComando, ComandoRecorrente, GrupoRelogio, GrupoRelogioRelogio
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import landscape, letter
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
@@ -21,7 +20,8 @@ import werkzeug.utils
 
 # Import utility functions for comando
 from utils_envio_comando import (
-    fetch_cracha,
+    fetch_crachas,
+    cracha_cache,
     unassociate_clocks,
     associate_clocks,
     schedule_commands,
@@ -30,37 +30,19 @@ from utils_envio_comando import (
     generate_pdf_report,
     generate_cabecalho_arquivo
 )
-from automacao_relogio import run_relogio_automation
+from automacao_relogio import run_relogio_automation, BACKENDS as AUTOMACAO_BACKENDS
+import kairos_client
+import marcacoes_sync
+from cache_utils import RefreshingCache
+import diretorio_pessoas
+import locais_ponto
+import clock_topology
+import job_queue
+import job_progress
+import automacao_resultados
 app = Flask(__name__)
 app.config.from_object(Config)
 
-# Tempo limite para requisições à API externa do Kairos
-TIMEOUT = 60
-
-CLOCK_GROUPS = {
-    "P10": [1, 11, 23, 29],
-    "COCA": [3, 14, 31],
-    "CANTEIRO III": [18, 22, 24, 25],
-    "PIPE MARABA": [5, 9, 20],
-    "OFICINA II": [8],
-    "PIPE SAO FELIX": [2, 4, 10, 19, 21, 28],
-    "TREINAMENTO": [16],
-    "MUTRAN CANTEIRO IV": [13, 17],
-    "TERRAPLENAGEM III": [6, 12],
-    "TENDA MOTORISTAS III": [26],
-    "NAUTICA": [30],
-    "PI SAO FELIX": [33, 34, 35, 36],
-    "CENTRAL DE CONCRETO III": [7, 15],
-    "P12": [27, 32]
-}
-
-# Database Setup
-engine = create_engine(app.config['SQLALCHEMY_DATABASE_URI'])
-Session = sessionmaker(bind=engine)
-
-def get_db_session():
-    return Session()
-
 # Login Decorator
 def login_required(f):
     @wraps(f)
@@ -221,7 +203,7 @@ def home():
 @login_required
 def marcacoes():
     log_action('Acessou menu Marcações')
-    locations = sorted(CLOCK_GROUPS.keys())
+    locations = list(clock_topology.location_names())
     permissions = get_menu_permissions()
     current_date = get_local_now().strftime('%Y-%m-%d')
     return render_template(
@@ -339,6 +321,104 @@ def admin_users():
             user_permissions[user.id] = {}
     return render_template('admin_users.html', users=users, is_admin=session.get('is_admin'), permissions=permissions, user_permissions=user_permissions)
 
+@app.route('/admin/grupos_relogio')
+@permission_required()
+def admin_grupos_relogio():
+    log_action('Acessou menu de Grupos de Relógios')
+    db = get_db_session()
+    try:
+        grupos = db.query(GrupoRelogio).order_by(GrupoRelogio.nome).all()
+        relogios_map = {g.id: [] for g in grupos}
+        for item in db.query(GrupoRelogioRelogio).order_by(GrupoRelogioRelogio.relogio_id):
+            if item.grupo_id in relogios_map:
+                relogios_map[item.grupo_id].append(item.relogio_id)
+        permissions = get_menu_permissions()
+        return render_template(
+            'admin_grupos_relogio.html',
+            grupos=grupos,
+            relogios_map=relogios_map,
+            permissions=permissions,
+            is_admin=session.get('is_admin')
+        )
+    finally:
+        db.close()
+
+@app.route('/admin/grupos_relogio/salvar', methods=['POST'])
+@permission_required()
+def salvar_grupo_relogio():
+    grupo_id = request.form.get('grupo_id', '').strip()
+    nome = request.form.get('nome', '').strip()
+    relogios_str = request.form.get('relogios', '')
+
+    try:
+        relogio_ids = sorted({int(r) for r in relogios_str.replace(';', ',').split(',') if r.strip()})
+    except ValueError:
+        flash('Informe os relógios como números separados por vírgula.', 'danger')
+        return redirect(url_for('admin_grupos_relogio'))
+
+    if not nome or not relogio_ids:
+        flash('Nome do local e lista de relógios são obrigatórios.', 'danger')
+        return redirect(url_for('admin_grupos_relogio'))
+
+    db = get_db_session()
+    try:
+        existente = db.query(GrupoRelogio).filter_by(nome=nome).first()
+        if existente and str(existente.id) != grupo_id:
+            flash(f'Já existe um local de ponto chamado {nome}.', 'danger')
+            return redirect(url_for('admin_grupos_relogio'))
+
+        if grupo_id:
+            grupo = db.query(GrupoRelogio).get(int(grupo_id))
+            if not grupo:
+                flash('Grupo não encontrado.', 'danger')
+                return redirect(url_for('admin_grupos_relogio'))
+            grupo.nome = nome
+            db.query(GrupoRelogioRelogio).filter_by(grupo_id=grupo.id).delete()
+        else:
+            grupo = GrupoRelogio(nome=nome)
+            db.add(grupo)
+            db.flush()
+
+        for relogio_id in relogio_ids:
+            db.add(GrupoRelogioRelogio(grupo_id=grupo.id, relogio_id=relogio_id))
+        clock_topology.bump_version(db)
+        db.commit()
+        clock_topology.reload(db)
+
+        log_action(f"{'Alterou' if grupo_id else 'Criou'} grupo de relógios {nome}: {relogio_ids}")
+        flash(f'Local de ponto {nome} salvo com sucesso.', 'success')
+    except Exception as e:
+        db.rollback()
+        flash(f'Erro ao salvar grupo de relógios: {str(e)}', 'danger')
+    finally:
+        db.close()
+    return redirect(url_for('admin_grupos_relogio'))
+
+@app.route('/admin/grupos_relogio/<int:grupo_id>/excluir', methods=['POST'])
+@permission_required()
+def excluir_grupo_relogio(grupo_id):
+    db = get_db_session()
+    try:
+        grupo = db.query(GrupoRelogio).get(grupo_id)
+        if not grupo:
+            flash('Grupo não encontrado.', 'danger')
+            return redirect(url_for('admin_grupos_relogio'))
+        nome = grupo.nome
+        db.query(GrupoRelogioRelogio).filter_by(grupo_id=grupo_id).delete()
+        db.delete(grupo)
+        clock_topology.bump_version(db)
+        db.commit()
+        clock_topology.reload(db)
+
+        log_action(f'Excluiu grupo de relógios {nome}')
+        flash(f'Local de ponto {nome} excluído com sucesso.', 'success')
+    except Exception as e:
+        db.rollback()
+        flash(f'Erro ao excluir grupo de relógios: {str(e)}', 'danger')
+    finally:
+        db.close()
+    return redirect(url_for('admin_grupos_relogio'))
+
 @app.route('/admin/locais_ponto')
 @permission_required('admin_locais_ponto')
 def admin_locais_ponto():
@@ -405,6 +485,7 @@ def criar_comando_recorrente():
         )
         db.add(novo)
         db.commit()
+        job_queue.notify()
         log_action(f"Cadastrou comando recorrente de {tipo} iniciando em {data_inicio_str} às {hora_execucao}")
         db.close()
         flash('Comando recorrente cadastrado com sucesso!', 'success')
@@ -423,6 +504,7 @@ def excluir_comando_recorrente(id):
         if comando:
             db.delete(comando)
             db.commit()
+            job_queue.notify()
             log_action(f"Excluiu comando recorrente #{id} ({comando.tipo})")
             flash('Comando recorrente excluído com sucesso.', 'success')
         else:
@@ -444,7 +526,7 @@ def hora_extra_acumulada():
 @permission_required('exportar_csv')
 def exportar_csv():
     log_action('Acessou menu de Exportação CSV')
-    locations = sorted(CLOCK_GROUPS.keys())
+    locations = list(clock_topology.location_names())
     permissions = get_menu_permissions()
     current_date = get_local_now().strftime('%Y-%m-%d')
     return render_template(
@@ -587,41 +669,22 @@ def api_intersticio():
         # Load full employee list from Kairos search people API for translation
         employees_info = fetch_all_employees_map()
 
-        # Fetch appointments from Kairos API.
-        # We'll fetch all records for the chosen day in batches/pages.
-        all_records = []
-        page = 1
-        total_pages = 1
-        
-        while page <= total_pages:
-            payload = {
-                "DataInicio": formatted_date,
-                "DataFim": formatted_date,
-                "CalculoNaoAtualizado": "true",
-                "Pagina": page,
-                "ResponseType": "AS400V1",
-                "IdsPessoa": [0] # Fetch for all
-            }
-            
-            response = requests.post(
-                app.config['KAIROS_API_URL'],
-                json=payload,
-                headers=app.config['KAIROS_HEADERS'],
-                timeout=TIMEOUT
-            )
-            
-            if response.status_code != 200:
-                return jsonify({'error': 'Erro ao consultar API Kairos'}), 500
-                
-            resp_json = response.json()
-            if not resp_json.get('Sucesso'):
-                 return jsonify({'error': resp_json.get('Mensagem', 'Erro desconhecido na API')}), 500
-            
-            if 'Obj' in resp_json:
-                all_records.extend(resp_json['Obj'])
-            
-            total_pages = resp_json.get('TotalPagina', 1)
-            page += 1
+        # Fetch appointments from the local store when the day is already closed and synced,
+        # otherwise from Kairos API (all pages fetched concurrently, see kairos_client.fetch_all_pages).
+        payload = {
+            "DataInicio": formatted_date,
+            "DataFim": formatted_date,
+            "CalculoNaoAtualizado": "true",
+            "ResponseType": "AS400V1",
+            "IdsPessoa": [0] # Fetch for all
+        }
+        try:
+            plan = marcacoes_sync.plan_date_range(db, dt, dt)
+            all_records = []
+            for _, _, records in marcacoes_sync.iter_appointments(dt, dt, payload, plan=plan, chunk_days=None):
+                all_records.extend(records)
+        except kairos_client.KairosError as api_err:
+            return jsonify({'error': str(api_err)}), 500
 
         # We also need to map the sections and gerencias
         secoes_map = {s.codigo: s.descricao for s in db.query(Secao).all()}
@@ -677,7 +740,7 @@ def api_intersticio():
             if exceeded:
                 p = employees_map[db_chapa]
                 relogio_id = last_punch.get('RelogioID')
-                local = get_location_by_clock_id(relogio_id)
+                local = clock_topology.location_of(relogio_id)
                 
                 processed_data.append({
                     "Matricula": p.chapa,
@@ -746,10 +809,12 @@ def api_intersticio_bloquear():
             comandos=json.dumps(config_options),
             matriculas=json.dumps(funcionarios),
             relogios=json.dumps(relogio_list),
-            status='Pendente'
+            status='Pendente',
+            prioridade=job_queue.PRIORIDADE_IMEDIATA
         )
         db.add(novo_agendamento)
         db.commit()
+        job_queue.notify()
         log_action(f"Criou agendamento imediato #{novo_agendamento.id} de bloqueio para {len(funcionarios)} funcionarios a partir do intersticio")
         db.close()
 
@@ -815,12 +880,7 @@ def api_intersticio_desbloquear():
                     "CalculoNaoAtualizado": "true",
                     "ResponseType": "AS400V1"
                 }
-                response = requests.post(
-                    app.config['KAIROS_API_URL'],
-                    json=payload,
-                    headers=app.config['KAIROS_HEADERS'],
-                    timeout=TIMEOUT
-                )
+                response = kairos_client.post(kairos_client.GET_APPOINTMENTS, payload)
                 
                 if response.status_code == 200:
                     resp_json = response.json()
@@ -850,13 +910,10 @@ def api_intersticio_desbloquear():
                 continue
                 
             # Identificar a quais grupos de relógios (locais de ponto) a matrícula pertence
-            grupos_associados = []
-            for grupo_nome, grupo_ids in CLOCK_GROUPS.items():
-                if any(rid in grupo_ids for rid in clock_ids):
-                    grupos_associados.append(grupo_nome)
+            grupos_associados = clock_topology.groups_for(clock_ids)
             
             if not grupos_associados:
-                # Caso a matrícula não pertença a nenhum grupo de CLOCK_GROUPS, agrupa pelos relógios específicos dela
+                # Caso a matrícula não pertença a nenhum grupo de relógios, agrupa pelos relógios específicos dela
                 key = (liberacao_dt.strftime('%Y-%m-%d %H:%M:%S'), None, tuple(sorted(clock_ids)))
                 if key not in agrupamentos:
                     agrupamentos[key] = []
@@ -865,7 +922,7 @@ def api_intersticio_desbloquear():
             else:
                 for grupo_nome in grupos_associados:
                     # Agrupa pelo local de ponto, contendo todos os relógios do grupo
-                    grupo_clock_ids = CLOCK_GROUPS[grupo_nome]
+                    grupo_clock_ids = clock_topology.clock_ids(grupo_nome)
                     key = (liberacao_dt.strftime('%Y-%m-%d %H:%M:%S'), grupo_nome, tuple(sorted(grupo_clock_ids)))
                     if key not in agrupamentos:
                         agrupamentos[key] = []
@@ -893,6 +950,7 @@ def api_intersticio_desbloquear():
             )
             db.add(novo_agendamento)
             db.commit()
+            job_queue.notify()
             agendamentos_criados.append(novo_agendamento.id)
             local_info = f"local {grupo_nome}" if grupo_nome else f"relógios {list(clock_ids_tuple)}"
             log_action(f"Agendou desbloqueio do interstício #{novo_agendamento.id} para {len(matriculas_lote)} funcionários no {local_info} às {exec_dt_str}")
@@ -943,79 +1001,50 @@ def delete_user(user_id):
 
 # --- Helper Functions ---
 
+# The directory changes a few times a day at most: it is shared by every report, refreshed
+# in the background once stale and loaded by a single thread when several requests need it.
+# Each reload also updates the copy persisted in the database (see diretorio_pessoas.py).
+employees_cache = RefreshingCache(diretorio_pessoas.refresh_directory, ttl=Config.DIRETORIO_CACHE_TTL_MINUTOS * 60, name='diretorio-pessoas')
+
+def warm_employees_cache():
+    """Seeds the directory cache from the database so the first report after a restart doesn't re-page SearchPeople."""
+    db = get_db_session()
+    try:
+        directory, synced_at = diretorio_pessoas.load_snapshot(db)
+    except Exception as e:
+        directory, synced_at = None, None
+        print(f"Erro ao carregar diretório de pessoas do banco: {e}")
+    finally:
+        db.close()
+
+    if directory:
+        employees_cache.prime(directory, age=diretorio_pessoas.snapshot_age_seconds(synced_at))
+        print(f"Diretório de pessoas carregado do banco ({len(directory)} pessoas, sincronizado em {synced_at:%d/%m/%Y %H:%M}).")
+    else:
+        # No copy yet: load it in the background instead of on the first report
+        threading.Thread(target=fetch_all_employees_map, daemon=True, name='diretorio-pessoas-warmup').start()
+
 def fetch_all_employees_map():
     """
-    Fetches all employees from Kairos API and returns a dictionary {Matricula: {'Nome': ..., 'Cracha': ...}}.
-    Iterates through all pages.
+    Returns the cached employee directory {Matricula: {'Nome': ..., 'Cracha': ..., 'Id': ...}}.
+    The returned dict is shared between requests and must not be modified.
     """
-    employees_map = {}
-    page = 1
-    total_pages = 1
-    
     try:
-        while page <= total_pages:
-            payload = {
-                "Pagina": page
-            }
-            
-            response = requests.post(
-                app.config['KAIROS_SEARCH_PEOPLE_URL'],
-                json=payload,
-                headers=app.config['KAIROS_HEADERS'],
-                timeout=TIMEOUT
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('Sucesso'):
-                    total_pages = data.get('TotalPagina', 1)
-                    if 'Obj' in data:
-                        for person in data['Obj']:
-                            mat = person.get('Matricula')
-                            nome = person.get('Nome')
-                            cracha = person.get('Cracha')
-                            if mat:
-                                employees_map[str(mat)] = {'Nome': nome, 'Cracha': cracha}
-            
-            page += 1
-            
+        return employees_cache.get()
     except Exception as e:
         print(f"Error fetching all employees: {e}")
-        
-    return employees_map
-
-# --- Clock Groups Mapping ---
-CLOCK_GROUPS = {
-  "P10": [1, 11, 23,29],
-  "COCA": [3, 14, 31],
-  "CANTEIRO III": [18, 22, 24, 25],
-  "PIPE MARABA": [5, 9, 20],
-  "OFICINA II": [8],
-  "PIPE SAO FELIX": [2, 4, 10, 19, 21, 28],
-  "TREINAMENTO": [16],
-  "MUTRAN CANTEIRO IV": [13, 17],
-  "TERRAPLENAGEM III": [6, 12],
-  "TENDA MOTORISTAS III": [26],
-  "NAUTICA": [30],
-  "PI SAO FELIX": [33, 34, 35, 36],
-  "CENTRAL DE CONCRETO III": [7, 15],
-  "P12": [27, 32],
-}
-
-def get_location_by_clock_id(clock_id):
-    if clock_id is None:
-        return ""
-    try:
-        cid = int(clock_id)
-        for location, ids in CLOCK_GROUPS.items():
-            if cid in ids:
-                return location
-    except (ValueError, TypeError):
-        pass
-    return ""
+        return {}
 
 # --- Kairos API & Reports ---
 
+def plan_appointments_range(start, end):
+    """Splits [start, end] between the local appointment store and the Kairos API."""
+    db = get_db_session()
+    try:
+        return marcacoes_sync.plan_date_range(db, start, end)
+    finally:
+        db.close()
+
 @app.route('/api/appointments', methods=['POST'])
 @login_required
 def get_appointments():
@@ -1050,83 +1079,64 @@ def get_appointments():
     if req_matricula and req_matricula.strip():
         if days_diff > 365:
              return jsonify({'error': 'Para consulta individual, o intervalo máximo é de 365 dias'}), 400
-    else:
-        if days_diff > 5:
-             return jsonify({'error': 'Para consulta geral, o intervalo máximo é de 5 dias'}), 400
 
-    all_records = []
-    page = 1
-    total_pages = 1
+    payload = {
+        "DataInicio": start_date,
+        "DataFim": end_date,
+        "CalculoNaoAtualizado": "true",
+        "ResponseType": "AS400V1"
+    }
+    
+    matricula = data.get('matricula')
+    if matricula and matricula.strip():
+        try:
+            payload["CrachasPessoa"] = [int(matricula)]
+        except ValueError:
+            return jsonify({'error': 'Matrícula deve ser um número'}), 400
+    else:
+        payload["IdsPessoa"] = [0]
     
     try:
-        while page <= total_pages:
-            payload = {
-                "DataInicio": start_date,
-                "DataFim": end_date,
-                "CalculoNaoAtualizado": "true",
-                "Pagina": page,
-                "ResponseType": "AS400V1"
-            }
-            
-            matricula = data.get('matricula')
-            if matricula and matricula.strip():
-                try:
-                    payload["CrachasPessoa"] = [int(matricula)]
-                except ValueError:
-                    return jsonify({'error': 'Matrícula deve ser um número'}), 400
-            else:
-                payload["IdsPessoa"] = [0]
-            
-            response = requests.post(
-                app.config['KAIROS_API_URL'],
-                json=payload,
-                headers=app.config['KAIROS_HEADERS'],
-                timeout=TIMEOUT
-            )
-            
-            if response.status_code != 200:
-                return jsonify({'error': 'Erro ao consultar API Kairos'}), 500
-                
-            resp_json = response.json()
-            
-            if not resp_json.get('Sucesso'):
-                 return jsonify({'error': resp_json.get('Mensagem', 'Erro desconhecido na API')}), 500
-            
-            if 'Obj' in resp_json:
-                all_records.extend(resp_json['Obj'])
-            
-            total_pages = resp_json.get('TotalPagina', 1)
-            page += 1
-            
         # --- Fetch Employee Names & Cracha ---
         employees_info = {}
+        single_person = None
+        kairos_matricula = None
         
-        # If searching by specific matricula, fetch just that one
+        # If searching by specific matricula, fetch just that one. Its internal Kairos
+        # Matricula is also what filters the local appointment store.
         if matricula and matricula.strip():
              try:
                 people_payload = {"Cracha": int(matricula)}
-                p_response = requests.post(
-                    app.config['KAIROS_SEARCH_PEOPLE_URL'],
-                    json=people_payload,
-                    headers=app.config['KAIROS_HEADERS'],
-                    timeout=TIMEOUT
-                )
+                p_response = kairos_client.post(kairos_client.SEARCH_PEOPLE, people_payload)
                 if p_response.status_code == 200:
                     p_data = p_response.json()
                     if p_data.get('Sucesso') and p_data.get('Obj'):
                         person_obj = p_data['Obj'][0]
-                        found_name = person_obj.get('Nome', '')
-                        found_cracha = person_obj.get('Cracha', '')
-                        
-                        # Apply this name to all records found, handling potential matricula format mismatches
-                        for r in all_records:
-                            r_mat = str(r.get('Matricula'))
-                            employees_info[r_mat] = {'Nome': found_name, 'Cracha': found_cracha}
+                        # Applied to every record found, since they all belong to this badge
+                        single_person = {'Nome': person_obj.get('Nome', ''), 'Cracha': person_obj.get('Cracha', '')}
+                        kairos_matricula = person_obj.get('Matricula')
              except Exception as e:
                 print(f"Error fetching name for matricula {matricula}: {e}")
+
+        # Closed days already mirrored in the local store are read from SQL Server;
+        # only the remaining (recent or not yet synced) days go to the Kairos API
+        if matricula and matricula.strip() and kairos_matricula is None:
+            plan = (None, (d1.date(), d2.date()))
         else:
+            plan = plan_appointments_range(d1, d2)
+        api_range = plan[1]
+
+        # The 5-day limit protects the Kairos API, so it only applies to the part fetched from it
+        if not (matricula and matricula.strip()) and api_range and (api_range[1] - api_range[0]).days > 5:
+            return jsonify({'error': 'Para consulta geral, o intervalo máximo é de 5 dias'}), 400
+
+        if not (matricula and matricula.strip()):
             # Bulk fetch all employees
             employees_info = fetch_all_employees_map()
+
+        all_records = []
+        for _, _, records in marcacoes_sync.iter_appointments(d1, d2, payload, matricula=kairos_matricula, plan=plan, chunk_days=None):
+            all_records.extend(records)
                 
         # Process records for display
         processed_data = []
@@ -1134,12 +1144,12 @@ def get_appointments():
             mat = r.get('Matricula')
             str_mat = str(mat)
             
-            emp_data = employees_info.get(str_mat, {})
+            emp_data = single_person if single_person is not None else employees_info.get(str_mat, {})
             nome = emp_data.get('Nome', '')
             display_matricula = emp_data.get('Cracha', mat)
             
             relogio_id = r.get('RelogioID')
-            local = get_location_by_clock_id(relogio_id)
+            local = clock_topology.location_of(relogio_id)
 
             # Apply location filter
             if selected_location and selected_location.strip() and selected_location != 'Todos':
@@ -1175,6 +1185,7 @@ def get_appointments():
 def exportar_csv_file():
     import csv
     import io
+    import itertools
     
     data = request.json
     start_date = data.get('start_date')
@@ -1207,183 +1218,175 @@ def exportar_csv_file():
     if days_diff > 185:
          return jsonify({'error': 'O intervalo máximo para a exportação de CSV é de 6 meses (185 dias)'}), 400
 
-    all_records = []
+    stream_mode = bool(data.get('stream'))
     
-    session_http = requests.Session()
-    from urllib3.util import Retry
-    from requests.adapters import HTTPAdapter
-    import time
+    base_payload = {
+        "CalculoNaoAtualizado": "true",
+        "ResponseType": "AS400V1"
+    }
     
-    retries = Retry(
-        total=5,
-        backoff_factor=0.5,
-        status_forcelist=[500, 502, 503, 504],
-        raise_on_status=False
-    )
-    session_http.mount('http://', HTTPAdapter(max_retries=retries))
-    session_http.mount('https://', HTTPAdapter(max_retries=retries))
+    matricula = data.get('matricula')
+    if matricula and matricula.strip():
+        try:
+            base_payload["CrachasPessoa"] = [int(matricula)]
+        except ValueError:
+            return jsonify({'error': 'Matrícula deve ser um número'}), 400
+    else:
+        base_payload["IdsPessoa"] = [0]
     
-    current_start = d1
     try:
-        while current_start <= d2:
-            current_end = min(current_start + datetime.timedelta(days=4), d2)
-            chunk_start_str = current_start.strftime("%d-%m-%Y")
-            chunk_end_str = current_end.strftime("%d-%m-%Y")
-            
-            page = 1
-            total_pages = 1
-            while page <= total_pages:
-                payload = {
-                    "DataInicio": chunk_start_str,
-                    "DataFim": chunk_end_str,
-                    "CalculoNaoAtualizado": "true",
-                    "Pagina": page,
-                    "ResponseType": "AS400V1"
-                }
-                
-                matricula = data.get('matricula')
-                if matricula and matricula.strip():
-                    try:
-                        payload["CrachasPessoa"] = [int(matricula)]
-                    except ValueError:
-                        return jsonify({'error': 'Matrícula deve ser um número'}), 400
-                else:
-                    payload["IdsPessoa"] = [0]
-                
-                response = session_http.post(
-                    app.config['KAIROS_API_URL'],
-                    json=payload,
-                    headers=app.config['KAIROS_HEADERS'],
-                    timeout=TIMEOUT
-                )
-                
-                if response.status_code != 200:
-                    return jsonify({'error': f'Erro ao consultar API Kairos para o período {chunk_start_str} a {chunk_end_str}'}), 500
-                    
-                resp_json = response.json()
-                
-                if not resp_json.get('Sucesso'):
-                     return jsonify({'error': resp_json.get('Mensagem', 'Erro desconhecido na API')}), 500
-                
-                if 'Obj' in resp_json:
-                    all_records.extend(resp_json['Obj'])
-                
-                total_pages = resp_json.get('TotalPagina', 1)
-                page += 1
-            
-            current_start = current_end + datetime.timedelta(days=1)
-            # Tiny sleep to avoid hammering the external API
-            time.sleep(0.2)
-            
         # --- Fetch Employee Names & Cracha ---
         employees_info = {}
+        single_person = None
         
         # If searching by specific matricula, fetch just that one
         if matricula and matricula.strip():
              try:
                 people_payload = {"Cracha": int(matricula)}
-                p_response = session_http.post(
-                    app.config['KAIROS_SEARCH_PEOPLE_URL'],
-                    json=people_payload,
-                    headers=app.config['KAIROS_HEADERS'],
-                    timeout=TIMEOUT
-                )
+                p_response = kairos_client.post(kairos_client.SEARCH_PEOPLE, people_payload)
                 if p_response.status_code == 200:
                     p_data = p_response.json()
                     if p_data.get('Sucesso') and p_data.get('Obj'):
                         person_obj = p_data['Obj'][0]
-                        found_name = person_obj.get('Nome', '')
-                        found_cracha = person_obj.get('Cracha', '')
-                        
-                        # Apply this name to all records found
-                        for r in all_records:
-                            r_mat = str(r.get('Matricula'))
-                            employees_info[r_mat] = {'Nome': found_name, 'Cracha': found_cracha}
+                        # Applied to every record found, since they all belong to this badge
+                        single_person = {'Nome': person_obj.get('Nome', ''), 'Cracha': person_obj.get('Cracha', ''), 'Matricula': person_obj.get('Matricula')}
              except Exception as e:
                 print(f"Error fetching name for matricula {matricula}: {e}")
         else:
             # Bulk fetch all employees
             employees_info = fetch_all_employees_map()
+        
+        # Days already mirrored in the local appointment store are read from SQL Server.
+        # The rest is fetched in 5-day chunks, concurrently and consumed in date order; the
+        # global rate limit in kairos_client keeps us from hammering the external API
+        kairos_matricula = single_person.get('Matricula') if single_person is not None else None
+        if matricula and matricula.strip() and kairos_matricula is None:
+            plan = (None, (d1.date(), d2.date()))
+        else:
+            plan = plan_appointments_range(d1, d2)
+        chunks = marcacoes_sync.iter_appointments(d1, d2, base_payload, matricula=kairos_matricula, plan=plan, chunk_days=5)
+        
+        # The first chunk is fetched before any byte is sent, so early API errors
+        # still reach the client as a JSON error response
+        try:
+            first_chunk = next(chunks, None)
+        except kairos_client.KairosError as api_err:
+            return jsonify({'error': describe_export_error(api_err)}), 500
+        
+        def chunk_rows(records):
+            rows = []
+            for r in records:
+                mat = r.get('Matricula')
+                emp_data = single_person if single_person is not None else employees_info.get(str(mat), {})
                 
-        # Process records for export
-        processed_data = []
-        for r in all_records:
-            mat = r.get('Matricula')
-            str_mat = str(mat)
-            
-            emp_data = employees_info.get(str_mat, {})
-            nome = emp_data.get('Nome', '')
-            display_matricula = emp_data.get('Cracha', mat)
-            
-            relogio_id = r.get('RelogioID')
-            local = get_location_by_clock_id(relogio_id)
+                relogio_id = r.get('RelogioID')
+                local = clock_topology.location_of(relogio_id)
 
-            # Apply location filter
-            if selected_location and selected_location.strip() and selected_location != 'Todos':
-                if local != selected_location:
-                    continue
+                # Apply location filter
+                if selected_location and selected_location.strip() and selected_location != 'Todos':
+                    if local != selected_location:
+                        continue
 
-            processed_data.append({
-                "Matricula": display_matricula,
-                "Nome": nome,
-                "Local": local,
-                "RelogioID": relogio_id,
-                "NumeroSerieRep": r.get('NumeroSerieRep'),
-                "Dia": r.get('Dia'),
-                "Mes": r.get('Mes'),
-                "Ano": r.get('Ano'),
-                "Hora": r.get('Hora'),
-                "Minuto": r.get('Minuto'),
-                "DataFormatada": f"{r.get('Dia'):02d}/{r.get('Mes'):02d}/{r.get('Ano')}",
-                "HoraFormatada": f"{r.get('Hora'):02d}:{r.get('Minuto'):02d}"
-            })
+                rows.append((
+                    (r.get('Ano'), r.get('Mes'), r.get('Dia'), r.get('Hora'), r.get('Minuto')),
+                    [
+                        emp_data.get('Cracha', mat),
+                        emp_data.get('Nome', ''),
+                        local,
+                        relogio_id,
+                        r.get('NumeroSerieRep'),
+                        f"{r.get('Dia'):02d}/{r.get('Mes'):02d}/{r.get('Ano')}",
+                        f"{r.get('Hora'):02d}:{r.get('Minuto'):02d}"
+                    ]
+                ))
+            # Chunks cover consecutive date ranges, so sorting each chunk by
+            # date and time keeps the whole file in chronological order
+            rows.sort(key=lambda row: row[0])
+            return [row[1] for row in rows]
+        
+        def generate_csv():
+            output = io.StringIO()
+            # Add BOM for excel compatibility in Windows/Brazil
+            output.write('\ufeff')
+            writer = csv.writer(output, delimiter=';')
+            
+            # Columns matching the ones generated in excel from Marcações
+            writer.writerow(["Matricula", "Nome", "Local", "RelogioID", "NumeroSerieRep", "DataFormatada", "HoraFormatada"])
             
-        # Sort by Date and Time
-        processed_data.sort(key=lambda x: (x['Ano'], x['Mes'], x['Dia'], x['Hora'], x['Minuto']))
+            try:
+                if first_chunk is not None:
+                    for chunk in itertools.chain([first_chunk], chunks):
+                        writer.writerows(chunk_rows(chunk[2]))
+                        yield output.getvalue().encode('utf-8')
+                        output.seek(0)
+                        output.truncate(0)
+            except Exception as e:
+                if not stream_mode:
+                    raise
+                # Headers are already sent: report the failure inside the file itself
+                print(f"Erro durante exportação CSV em streaming: {e}")
+                message = describe_export_error(e) if isinstance(e, kairos_client.KairosError) else str(e)
+                writer.writerow([f"ERRO: exportação interrompida - {message}"])
+            finally:
+                chunks.close()
             
+            yield output.getvalue().encode('utf-8')
+        
         log_action(f'Exportou apontamentos em CSV de {start_date} a {end_date}')
+        download_name = f'relatorio_ponto_{start_date}_a_{end_date}.csv'
+        
+        if stream_mode:
+            # Rows are written to the client as each date chunk finishes, keeping memory bounded
+            response = Response(stream_with_context(generate_csv()), mimetype='text/csv')
+            response.headers['Content-Disposition'] = f'attachment; filename={download_name}'
+            response.headers['X-Accel-Buffering'] = 'no'
+            return response
         
-        # Generate CSV in memory
-        output = io.StringIO()
-        # Add BOM for excel compatibility in Windows/Brazil
-        output.write('\ufeff')
-        writer = csv.writer(output, delimiter=';')
-        
-        # Columns matching the ones generated in excel from Marcações
-        writer.writerow(["Matricula", "Nome", "Local", "RelogioID", "NumeroSerieRep", "DataFormatada", "HoraFormatada"])
-        
-        for r in processed_data:
-            writer.writerow([
-                r.get("Matricula", ""),
-                r.get("Nome", ""),
-                r.get("Local", ""),
-                r.get("RelogioID", ""),
-                r.get("NumeroSerieRep", ""),
-                r.get("DataFormatada", ""),
-                r.get("HoraFormatada", "")
-            ])
-            
-        csv_content = output.getvalue()
         return send_file(
-            io.BytesIO(csv_content.encode('utf-8')),
+            io.BytesIO(b''.join(generate_csv())),
             mimetype='text/csv',
             as_attachment=True,
-            download_name=f'relatorio_ponto_{start_date}_a_{end_date}.csv'
+            download_name=download_name
         )
 
+    except kairos_client.KairosError as api_err:
+        return jsonify({'error': describe_export_error(api_err)}), 500
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/admin/locais_ponto', methods=['POST'])
-@permission_required('admin_locais_ponto')
-def api_admin_locais_ponto():
-    data = request.json
+def describe_export_error(api_err):
+    if api_err.http_status and getattr(api_err, 'periodo', None):
+        chunk_start, chunk_end = api_err.periodo
+        return f'Erro ao consultar API Kairos para o período {chunk_start.strftime("%d-%m-%Y")} a {chunk_end.strftime("%d-%m-%Y")}'
+    return str(api_err)
+
+@app.route('/api/admin/cache/diretorio/invalidar', methods=['POST'])
+@permission_required()
+def api_admin_invalidar_cache_diretorio():
+    employees_cache.invalidate()
+    log_action('Invalidou o cache do diretório de pessoas')
+    return jsonify({'success': True, 'cache': employees_cache.info()})
+
+@app.route('/api/admin/cache/crachas', methods=['GET'])
+@permission_required()
+def api_admin_cache_crachas():
+    return jsonify({'success': True, 'cache': cracha_cache.info()})
+
+@app.route('/api/admin/cache/crachas/invalidar', methods=['POST'])
+@permission_required()
+def api_admin_invalidar_cache_crachas():
+    cracha_cache.invalidate()
+    log_action('Invalidou o cache de consultas de crachás')
+    return jsonify({'success': True, 'cache': cracha_cache.info()})
+
+def parse_locais_ponto_request(data):
+    """Validates a Locais de Ponto submission. Returns (start_date, end_date, matriculas, error_response)."""
     start_date = data.get('start_date')
     end_date = data.get('end_date')
     matriculas = data.get('matriculas', [])
 
     if not start_date or not end_date or not matriculas:
-        return jsonify({'error': 'Datas e lista de matrículas são obrigatórias'}), 400
+        return None, None, None, (jsonify({'error': 'Datas e lista de matrículas são obrigatórias'}), 400)
         
     try:
         sd_parts = start_date.split('-')
@@ -1399,72 +1402,113 @@ def api_admin_locais_ponto():
         datetime.datetime.strptime(start_date, "%d-%m-%Y")
         datetime.datetime.strptime(end_date, "%d-%m-%Y")
     except ValueError:
-        return jsonify({'error': 'Formato de data inválido'}), 400
+        return None, None, None, (jsonify({'error': 'Formato de data inválido'}), 400)
 
-    grupo_crachas = {grupo: set() for grupo in CLOCK_GROUPS}
-    crachas_sem_dados = []
-    crachas_inexistentes = []
+    return start_date, end_date, matriculas, None
+
+@app.route('/api/admin/locais_ponto', methods=['POST'])
+@permission_required('admin_locais_ponto')
+def api_admin_locais_ponto():
+    start_date, end_date, matriculas, error = parse_locais_ponto_request(request.json)
+    if error:
+        return error
 
     try:
-        for cracha in matriculas:
-            payload = {
-                "CrachasPessoa": [cracha],
-                "DataInicio": start_date,
-                "DataFim": end_date,
-                "CalculoNaoAtualizado": "true",
-                "ResponseType": "AS400V1"
-            }
-            
-            response = requests.post(
-                app.config['KAIROS_API_URL'],
-                json=payload,
-                headers=app.config['KAIROS_HEADERS'],
-                timeout=TIMEOUT
-            )
-            
-            if response.status_code == 200:
-                resp_json = response.json()
-                sucesso = resp_json.get("Sucesso")
-                obj_list = resp_json.get("Obj")
-                
-                if sucesso and isinstance(obj_list, list) and len(obj_list) > 0:
-                    relogio_ids = set()
-                    for item in obj_list:
-                        relogio_id = item.get("RelogioID")
-                        if relogio_id is not None:
-                            relogio_ids.add(relogio_id)
-                            
-                    for grupo, ids_grupo in CLOCK_GROUPS.items():
-                        if any(relogio_id in ids_grupo for relogio_id in relogio_ids):
-                            grupo_crachas[grupo].add(cracha)
-                            
-                elif sucesso and isinstance(obj_list, list) and len(obj_list) == 0:
-                    crachas_sem_dados.append(cracha)
-                elif not sucesso and obj_list is None:
-                    crachas_inexistentes.append(cracha)
-            else:
-                print(f"Erro ao consultar api/admin/locais_ponto crachá {cracha}: {response.status_code}")
-                # We log it but continue processing the rest
-                
-        # Convert sets to sorted lists for JSON serialization
-        grupo_crachas_serializable = {
-            k: sorted(list(v)) for k, v in grupo_crachas.items() if v
-        }
+        # Badges are queried in batches (one GetAppointmentsV2 call per batch) and split back
+        # per badge through the Kairos directory; only failing batches are retried badge by badge
+        resultado = locais_ponto.consultar_locais_ponto(matriculas, start_date, end_date, fetch_all_employees_map())
         
         log_action(f'Consultou Locais de Ponto para {len(matriculas)} matrículas ({start_date} a {end_date})')
         
-        return jsonify({
-            'data': {
-                'grupo_crachas': grupo_crachas_serializable,
-                'crachas_sem_dados': sorted(crachas_sem_dados),
-                'crachas_inexistentes': sorted(crachas_inexistentes)
-            }
-        })
+        return jsonify({'data': locais_ponto.serialize_result(resultado)})
         
     except Exception as e:
          print(f"Error in api_admin_locais_ponto: {e}")
          return jsonify({'error': str(e)}), 500
 
+def get_locais_ponto_job_or_404(job_id):
+    """Returns (job, None) or (None, error_response); jobs are only visible to their owner and admins."""
+    job = locais_ponto.get_job(job_id)
+    if not job or (not session.get('is_admin') and job.user_id != session.get('user_id')):
+        return None, (jsonify({'error': 'Consulta não encontrada ou expirada'}), 404)
+    return job, None
+
+@app.route('/api/admin/locais_ponto/jobs', methods=['POST'])
+@permission_required('admin_locais_ponto')
+def api_admin_locais_ponto_job_criar():
+    start_date, end_date, matriculas, error = parse_locais_ponto_request(request.json)
+    if error:
+        return error
+
+    # The lookup runs on the background executor so the request thread is released right away
+    job = locais_ponto.submit_job(matriculas, start_date, end_date, fetch_all_employees_map, user_id=session.get('user_id'))
+    log_action(f'Iniciou consulta de Locais de Ponto para {len(matriculas)} matrículas ({start_date} a {end_date})')
+    return jsonify({'job_id': job.id, 'status': job.status}), 202
+
+@app.route('/api/admin/locais_ponto/jobs/<job_id>', methods=['GET'])
+@permission_required('admin_locais_ponto')
+def api_admin_locais_ponto_job_status(job_id):
+    job, error = get_locais_ponto_job_or_404(job_id)
+    if error:
+        return error
+    return jsonify(job.to_dict())
+
+@app.route('/api/admin/locais_ponto/jobs/<job_id>/stream', methods=['GET'])
+@permission_required('admin_locais_ponto')
+def api_admin_locais_ponto_job_stream(job_id):
+    job, error = get_locais_ponto_job_or_404(job_id)
+    if error:
+        return error
+
+    def generate_events():
+        last_sent = None
+        while True:
+            status = job.to_dict()
+            progress = (status['status'], status['processados'])
+            if progress != last_sent:
+                yield f"data: {json.dumps(status)}\n\n"
+                last_sent = progress
+            if status['status'] in ('concluido', 'erro'):
+                break
+            time.sleep(1)
+
+    response = Response(stream_with_context(generate_events()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/admin/locais_ponto/jobs/<job_id>/download', methods=['GET'])
+@permission_required('admin_locais_ponto')
+def api_admin_locais_ponto_job_download(job_id):
+    import csv
+
+    job, error = get_locais_ponto_job_or_404(job_id)
+    if error:
+        return error
+    status = job.to_dict()
+    if status['status'] != 'concluido':
+        return jsonify({'error': 'A consulta ainda não foi concluída'}), 409
+
+    resultado = status['data']
+    output = io.StringIO()
+    output.write('\ufeff')
+    writer = csv.writer(output, delimiter=';')
+    writer.writerow(['Local', 'Crachá'])
+    for grupo, crachas in resultado['grupo_crachas'].items():
+        for cracha in crachas:
+            writer.writerow([grupo, cracha])
+    for cracha in resultado['crachas_sem_dados']:
+        writer.writerow(['Sem Marcação no Período', cracha])
+    for cracha in resultado['crachas_inexistentes']:
+        writer.writerow(['Matrícula Inexistente na Base', cracha])
+
+    return send_file(
+        io.BytesIO(output.getvalue().encode('utf-8')),
+        mimetype='text/csv',
+        as_attachment=True,
+        download_name=f"locais_ponto_{status['start_date']}_a_{status['end_date']}.csv"
+    )
+
 # --- Envio de Comandos API ---
 
 @app.route('/api/envio_comando/relogios', methods=['GET'])
@@ -1513,10 +1557,12 @@ def api_envio_comando_processar():
             comandos=comandos_str,
             matriculas=json.dumps(funcionarios),
             relogios=relogios_str,
-            status='Pendente'
+            status='Pendente',
+            prioridade=job_queue.PRIORIDADE_IMEDIATA
         )
         db.add(novo_agendamento)
         db.commit()
+        job_queue.notify()
         log_action(f"Criou agendamento imediato #{novo_agendamento.id} de comandos para {len(funcionarios)} funcionarios")
         db.close()
 
@@ -1532,87 +1578,177 @@ def api_envio_comando_processar():
 
 # --- Agendamento de Comandos API e Worker ---
 
-def process_scheduled_commands_worker():
+def execute_scheduled_jobs(db, jobs):
+    """
+    Executa agendamentos já reservados pela fila (status 'Executando') e grava o resultado de cada um.
+    Os jobs agrupados pela fila têm os mesmos comandos e relógios, então são enviados numa única
+    chamada ao ScheduleCommands com a união dos crachás.
+    """
+    pendentes = []
+    for job in jobs:
+        try:
+            matriculas_list = json.loads(job.matriculas)
+            funcionarios = [int(m) for m in matriculas_list if str(m).isdigit()]
+        except Exception as ex:
+            job.status = 'Erro'
+            job.resultado = f"Exceção durante a execução: {str(ex)}"
+            continue
+
+        if not funcionarios:
+            job.status = 'Erro'
+            job.resultado = 'Nenhum funcionário válido encontrado.'
+            continue
+        pendentes.append((job, funcionarios))
+    db.commit()
+    if not pendentes:
+        return
+
+    todos_crachas = [cracha for _, funcionarios in pendentes for cracha in funcionarios]
+    progresso = job_progress.JobProgress([job.id for job, _ in pendentes], len(set(todos_crachas)))
+    contagens = {}
+    gravado = False
+    try:
+        _execute_pending_jobs(db, pendentes, todos_crachas, progresso, contagens)
+        db.commit()
+        gravado = True
+    finally:
+        # Depois do commit, para a tela já encontrar o status final ao receber o fim do progresso.
+        # Também quando algo falhou, para o progresso não ficar "em execução" para sempre
+        progresso.finish(contagens, erro=not gravado or not any(job.status == 'Executado' for job, _ in pendentes))
+
+def _execute_pending_jobs(db, pendentes, todos_crachas, progresso, contagens):
+    """Consulta os crachás, agenda os comandos e preenche status/resultado dos jobs (o commit fica com o chamador)."""
+    try:
+        comandos_obj = json.loads(pendentes[0][0].comandos)
+        relogio_list = json.loads(pendentes[0][0].relogios)
+
+        resultados = dict(zip(todos_crachas, fetch_crachas(
+            todos_crachas, progress=lambda result: progresso.badge_done(result.get('sucesso'))
+        )))
+
+        por_job = []
+        for job, funcionarios in pendentes:
+            pesquisa_falha = []
+            crachas_sucesso = []
+            for cracha in funcionarios:
+                result = dict(resultados[cracha])
+                if not result.get('sucesso'):
+                    pesquisa_falha.append(result)
+                else:
+                    crachas_sucesso.append(result)
+                    if result.get('semTemplates'):
+                        pesquisa_falha.append({
+                            'cracha': result.get('cracha'),
+                            'nome': result.get('nome'),
+                            'sucesso': False,
+                            'mensagem': result.get('mensagem', 'Não possui Biometria')
+                        })
+            por_job.append((job, pesquisa_falha, crachas_sucesso))
+            contagens[job.id] = (len(crachas_sucesso), len(funcionarios) - len(crachas_sucesso))
+
+        # Mapeia IDs de banco de dados/URL (35, 36) para os números de relógio reais da API (33, 34) e remove duplicatas
+        mapped_clock_ids = clock_topology.to_api_clock_ids(relogio_list)
+        cracha_list = list(dict.fromkeys(c.get('cracha') for _, _, sucesso in por_job for c in sucesso))
+        progresso.phase(job_progress.FASE_AGENDANDO)
+        schedule_result = schedule_commands(cracha_list, comandos_obj, mapped_clock_ids) if cracha_list else None
+
+        progresso.phase(job_progress.FASE_GERANDO_ARQUIVOS)
+        agrupados = [job.id for job, _, _ in por_job]
+        for job, pesquisa_falha, crachas_sucesso in por_job:
+            if crachas_sucesso:
+                if schedule_result.get('sucesso'):
+                    job.status = 'Executado'
+                    job.resultado = f"Executado com sucesso para {len(crachas_sucesso)} colaboradores em {len(mapped_clock_ids)} relógios."
+                    if pesquisa_falha:
+                        job.resultado += f" ({len(pesquisa_falha)} falhas/sem biometria)"
+                else:
+                    job.status = 'Erro'
+                    job.resultado = schedule_result.get('mensagem', 'Erro ao agendar comandos no Kairos')
+                if len(agrupados) > 1:
+                    outros = ', '.join(f"#{job_id}" for job_id in agrupados if job_id != job.id)
+                    job.resultado += f" [Enviado junto com os agendamentos {outros}]"
+            else:
+                job.status = 'Erro'
+                job.resultado = f"Falha na consulta dos crachás ({len(pesquisa_falha)} erros)."
+
+            # Gerar arquivos de sucesso (PDF) e falha (TXT) automaticamente
+            try:
+                sucesso_f, falha_f = generate_reports_for_job(job, pesquisa_falha, crachas_sucesso, comandos_obj, mapped_clock_ids, app.root_path)
+                job.sucesso_file = sucesso_f
+                job.falha_file = falha_f
+            except Exception as r_err:
+                print(f"[AGENDAMENTO WORKER] Erro ao gerar arquivos: {r_err}")
+
+    except Exception as ex:
+        for job, _ in pendentes:
+            job.status = 'Erro'
+            job.resultado = f"Exceção durante a execução: {str(ex)}"
+
+def run_scheduled_jobs(job_ids, vagas):
+    """
+    Executa um grupo de agendamentos reservados numa thread do pool do worker, com sessão própria.
+    Jobs que usam algum relógio em comum com um job em andamento esperam ele terminar.
+    """
+    db = get_db_session()
+    try:
+        jobs = db.query(AgendamentoComando).filter(AgendamentoComando.id.in_(job_ids)).order_by(AgendamentoComando.id).all()
+        try:
+            relogios = clock_topology.to_api_clock_ids(json.loads(jobs[0].relogios))
+        except Exception:
+            relogios = []
+        with job_queue.clock_locks.holding(relogios):
+            execute_scheduled_jobs(db, jobs)
+    except Exception as e:
+        print(f"[AGENDAMENTO WORKER] Erro ao executar agendamentos {job_ids}: {e}")
+    finally:
+        db.close()
+        vagas.release()
+        # Acorda o worker caso ele esteja esperando vaga para jobs já vencidos
+        job_queue.notify()
+
+def process_scheduled_commands_worker(raia=job_queue.RAIA_GERAL, indice=0):
     """
     Worker em segundo plano para executar comandos de relógio agendados no momento correto.
+    Os agendamentos são reservados um a um pela fila (job_queue), o que permite vários
+    workers/processos; a raia 'imediata' só executa agendamentos imediatos. O primeiro
+    worker da raia 'geral' também processa os comandos recorrentes, desde que seja o
+    líder entre os processos (lock de aplicação no SQL Server).
     """
+    worker = job_queue.worker_name(raia, indice)
+    # Jobs independentes rodam em paralelo, limitados a AGENDAMENTO_JOBS_SIMULTANEOS por worker
+    executor = ThreadPoolExecutor(max_workers=Config.AGENDAMENTO_JOBS_SIMULTANEOS, thread_name_prefix=f'agendamento-{raia}-{indice}')
+    vagas = threading.BoundedSemaphore(Config.AGENDAMENTO_JOBS_SIMULTANEOS)
+    # Com o pool cheio, o worker não fica preso esperando vaga e segue para os comandos recorrentes
+    espera_vaga = 1
+    lider_recorrentes = job_queue.LeaderLock('agendamento_comandos_recorrentes') if raia == job_queue.RAIA_GERAL and indice == 0 else None
+    espera = 0
+    geracao = job_queue.generation()
     while True:
         try:
-            time.sleep(15)
+            # Dorme até o próximo vencimento ou até uma rota criar/remover um agendamento (job_queue.notify)
+            job_queue.wait(espera, geracao)
+            espera = Config.AGENDAMENTO_INTERVALO_SEGUNDOS
+            geracao = job_queue.generation()
             db = get_db_session()
             now = get_local_now()
             now_naive = now.replace(tzinfo=None)
 
-            pending_jobs = db.query(AgendamentoComando).filter(
-                AgendamentoComando.status == 'Pendente',
-                AgendamentoComando.data_hora_execucao <= now_naive
-            ).order_by(AgendamentoComando.data_hora_execucao.asc(), AgendamentoComando.id.asc()).all()
-
-            for job in pending_jobs:
-                job.status = 'Executando'
-                db.commit()
-
-                try:
-                    comandos_obj = json.loads(job.comandos)
-                    relogio_list = json.loads(job.relogios)
-                    matriculas_list = json.loads(job.matriculas)
-                    funcionarios = [int(m) for m in matriculas_list if str(m).isdigit()]
-
-                    if not funcionarios:
-                        job.status = 'Erro'
-                        job.resultado = 'Nenhum funcionário válido encontrado.'
-                        db.commit()
-                        continue
-
-                    pesquisa_falha = []
-                    crachas_sucesso = []
-
-                    for cracha in funcionarios:
-                        result = fetch_cracha(cracha)
-                        if not result.get('sucesso'):
-                            pesquisa_falha.append(result)
-                        else:
-                            crachas_sucesso.append(result)
-                            if result.get('semTemplates'):
-                                pesquisa_falha.append({
-                                    'cracha': result.get('cracha'),
-                                    'nome': result.get('nome'),
-                                    'sucesso': False,
-                                    'mensagem': result.get('mensagem', 'Não possui Biometria')
-                                })
-
-                    if crachas_sucesso:
-                        cracha_list = [c.get('cracha') for c in crachas_sucesso]
-                        # Mapeia IDs de banco de dados/URL (35, 36) para os números de relógio reais da API (33, 34) e remove duplicatas
-                        mapped_clock_ids = list(dict.fromkeys([33 if cid == 35 else 34 if cid == 36 else cid for cid in relogio_list]))
-                        schedule_result = schedule_commands(cracha_list, comandos_obj, mapped_clock_ids)
-                        if schedule_result.get('sucesso'):
-                            job.status = 'Executado'
-                            job.resultado = f"Executado com sucesso para {len(crachas_sucesso)} colaboradores em {len(mapped_clock_ids)} relógios."
-                            if pesquisa_falha:
-                                job.resultado += f" ({len(pesquisa_falha)} falhas/sem biometria)"
-                        else:
-                            job.status = 'Erro'
-                            job.resultado = schedule_result.get('mensagem', 'Erro ao agendar comandos no Kairos')
-                    else:
-                        job.status = 'Erro'
-                        job.resultado = f"Falha na consulta dos crachás ({len(pesquisa_falha)} erros)."
-
-                    # Gerar arquivos de sucesso (PDF) e falha (TXT) automaticamente
-                    try:
-                        mapped_clock_ids = list(dict.fromkeys([33 if cid == 35 else 34 if cid == 36 else cid for cid in relogio_list]))
-                        sucesso_f, falha_f = generate_reports_for_job(job, pesquisa_falha, crachas_sucesso, comandos_obj, mapped_clock_ids, app.root_path)
-                        job.sucesso_file = sucesso_f
-                        job.falha_file = falha_f
-                    except Exception as r_err:
-                        print(f"[AGENDAMENTO WORKER] Erro ao gerar arquivos: {r_err}")
-
-                except Exception as ex:
-                    job.status = 'Erro'
-                    job.resultado = f"Exceção durante a execução: {str(ex)}"
-
-                db.commit()
-                time.sleep(2)  # Pausa de segurança entre execuções de agendamentos para não sobrecarregar a API do Kairos
+            # Reserva jobs enquanto houver vaga no pool; o ritmo de chamadas ao Kairos fica com o rate limiter global
+            while vagas.acquire(timeout=espera_vaga):
+                job = job_queue.claim_next(db, worker, raia)
+                if job is None:
+                    vagas.release()
+                    break
+                # Agendamentos vencidos com os mesmos comandos e relógios vão numa única chamada ao Kairos
+                job_ids = [job.id] + job_queue.claim_compatible(db, job, worker, raia)
+                executor.submit(run_scheduled_jobs, job_ids, vagas)
+
+            if lider_recorrentes is None or not lider_recorrentes.acquire():
+                espera = job_queue.seconds_until(
+                    [job_queue.next_due(db, raia)], get_local_now().replace(tzinfo=None), Config.AGENDAMENTO_INTERVALO_SEGUNDOS
+                )
+                db.close()
+                continue
 
             # --- PROCESSAMENTO DOS COMANDOS RECORRENTES ---
             try:
@@ -1639,13 +1775,13 @@ def process_scheduled_commands_worker():
                                         f_log.write(f"Data/Hora de Início: {now.strftime('%d/%m/%Y %H:%M:%S')}\n\n")
                                         
                                         if command.tipo == 'datahora':
-                                            for line in run_relogio_automation('datahora', relogio_ids=None):
+                                            for line in run_relogio_automation('datahora', relogio_ids=None, origem=automacao_resultados.ORIGEM_RECORRENTE, usuario=f"Sistema (Recorrente #{command.id})"):
                                                 f_log.write(line)
                                                 f_log.flush()
                                         elif command.tipo == 'ponteiro':
                                             yesterday = now - datetime.timedelta(days=1)
                                             yesterday_str = yesterday.strftime('%d/%m/%Y')
-                                            for line in run_relogio_automation('ponteiro', data_personalizada=yesterday_str, relogio_ids=None):
+                                            for line in run_relogio_automation('ponteiro', data_personalizada=yesterday_str, relogio_ids=None, origem=automacao_resultados.ORIGEM_RECORRENTE, usuario=f"Sistema (Recorrente #{command.id})"):
                                                 f_log.write(line)
                                                 f_log.flush()
                                         elif command.tipo == 'desbloqueio_ferias':
@@ -1700,7 +1836,7 @@ def process_scheduled_commands_worker():
                                                 f_log.write("Consultando API do Kairos...\n\n")
                                                 f_log.flush()
                                                 
-                                                grupo_crachas = {grupo: set() for grupo in CLOCK_GROUPS}
+                                                grupo_crachas = {grupo: set() for grupo in clock_topology.location_names()}
                                                 crachas_sem_dados = []
                                                 crachas_inexistentes = []
                                                 
@@ -1719,12 +1855,7 @@ def process_scheduled_commands_worker():
                                                     }
                                                     
                                                     try:
-                                                        response = requests.post(
-                                                            app.config['KAIROS_API_URL'],
-                                                            json=payload,
-                                                            headers=app.config['KAIROS_HEADERS'],
-                                                            timeout=TIMEOUT
-                                                        )
+                                                        response = kairos_client.post(kairos_client.GET_APPOINTMENTS, payload)
                                                         
                                                         if response.status_code == 200:
                                                             resp_json = response.json()
@@ -1738,11 +1869,9 @@ def process_scheduled_commands_worker():
                                                                     if relogio_id is not None:
                                                                         relogio_ids.add(relogio_id)
                                                                         
-                                                                grupos_encontrados = []
-                                                                for grupo, ids_grupo in CLOCK_GROUPS.items():
-                                                                    if any(relogio_id in ids_grupo for relogio_id in relogio_ids):
-                                                                        grupo_crachas[grupo].add(cracha)
-                                                                        grupos_encontrados.append(grupo)
+                                                                grupos_encontrados = clock_topology.groups_for(relogio_ids)
+                                                                for grupo in grupos_encontrados:
+                                                                    grupo_crachas[grupo].add(cracha)
                                                                 
                                                                 f_log.write(f"OK. Relógios: {list(relogio_ids)}. Locais: {grupos_encontrados}\n")
                                                                 
@@ -1772,7 +1901,7 @@ def process_scheduled_commands_worker():
                                                 agendamentos_criados = 0
                                                 for grupo, crachas in grupo_crachas.items():
                                                     if crachas:
-                                                        clock_ids = CLOCK_GROUPS.get(grupo, [])
+                                                        clock_ids = clock_topology.clock_ids(grupo)
                                                         if clock_ids:
                                                             novo_agendamento = AgendamentoComando(
                                                                 usuario=f"Sistema (Recorrente Desbloqueio #{command.id})",
@@ -1780,7 +1909,8 @@ def process_scheduled_commands_worker():
                                                                 comandos=json.dumps(config_options),
                                                                 matriculas=json.dumps(list(crachas)),
                                                                 relogios=json.dumps(clock_ids),
-                                                                status='Pendente'
+                                                                status='Pendente',
+                                                                prioridade=job_queue.PRIORIDADE_IMEDIATA
                                                             )
                                                             db.add(novo_agendamento)
                                                             db.flush() # Gerar ID do agendamento
@@ -1791,6 +1921,7 @@ def process_scheduled_commands_worker():
                                                 
                                                 if agendamentos_criados > 0:
                                                     db.commit()
+                                                    job_queue.notify()
                                                     f_log.write(f"\nTotal de {agendamentos_criados} agendamentos gerados com sucesso na fila imediata.\n")
                                                 else:
                                                     f_log.write("\nNenhum agendamento gerado (nenhum local correspondente encontrado).\n")
@@ -1865,7 +1996,8 @@ def process_scheduled_commands_worker():
                                                             comandos=json.dumps(config_options),
                                                             matriculas=json.dumps(funcionarios),
                                                             relogios=json.dumps(relogio_list),
-                                                            status='Pendente'
+                                                            status='Pendente',
+                                                            prioridade=job_queue.PRIORIDADE_IMEDIATA
                                                         )
                                                         db.add(novo_agendamento)
                                                         db.flush() # Gerar ID do agendamento
@@ -1878,6 +2010,7 @@ def process_scheduled_commands_worker():
                                     
                                     command.log_file = log_filename
                                     db.commit()
+                                    job_queue.notify()
 
                                     novo_log = Log(
                                         user_id=None,
@@ -1907,6 +2040,11 @@ def process_scheduled_commands_worker():
             except Exception as rec_err:
                 print(f"[AGENDAMENTO WORKER] Erro no processamento de recorrentes: {rec_err}")
 
+            # Próximo vencimento: agendamento pendente mais próximo ou próximo disparo recorrente
+            now_naive = get_local_now().replace(tzinfo=None)
+            due_times = [job_queue.next_due(db, raia)]
+            due_times += [job_queue.next_recurrent_run(c, now_naive) for c in db.query(ComandoRecorrente).all()]
+            espera = job_queue.seconds_until(due_times, now_naive, Config.AGENDAMENTO_INTERVALO_SEGUNDOS)
             db.close()
         except Exception as e:
             print(f"[AGENDAMENTO WORKER] Erro no loop: {e}")
@@ -1948,12 +2086,40 @@ def generate_reports_for_job(job, pesquisa_falha, crachas_sucesso, comandos_obj,
 
     return sucesso_file_name, falha_file_name
 
-# Iniciar thread do worker de agendamento em segundo plano
-try:
-    agendamento_worker_thread = threading.Thread(target=process_scheduled_commands_worker, daemon=True)
-    agendamento_worker_thread.start()
-except Exception as t_err:
-    print(f"Erro ao iniciar thread de agendamento: {t_err}")
+def start_scheduler_workers(workers=None, workers_imediatos=None):
+    """Inicia as threads do worker de agendamento (raia geral + raia de agendamentos imediatos)."""
+    workers = Config.AGENDAMENTO_WORKERS if workers is None else workers
+    workers_imediatos = Config.AGENDAMENTO_WORKERS_IMEDIATOS if workers_imediatos is None else workers_imediatos
+    threads = [
+        threading.Thread(target=process_scheduled_commands_worker, args=(job_queue.RAIA_GERAL, indice), daemon=True, name=f'agendamento-geral-{indice}')
+        for indice in range(workers)
+    ] + [
+        threading.Thread(target=process_scheduled_commands_worker, args=(job_queue.RAIA_IMEDIATA, indice), daemon=True, name=f'agendamento-imediata-{indice}')
+        for indice in range(workers_imediatos)
+    ]
+    for thread in threads:
+        thread.start()
+    return threads
+
+# Iniciar o worker de agendamento embutido no servidor web (desative com AGENDAMENTO_EMBUTIDO=false e rode `python -m scheduler`)
+if Config.AGENDAMENTO_EMBUTIDO:
+    try:
+        start_scheduler_workers()
+    except Exception as t_err:
+        print(f"Erro ao iniciar thread de agendamento: {t_err}")
+
+# Carregar os grupos de relógios do banco e acompanhar alterações feitas por outros processos
+clock_topology.start_reload_watcher()
+
+# Preencher o cache do diretório de pessoas a partir do banco
+warm_employees_cache()
+
+# Iniciar sincronização do armazém local de marcações em segundo plano
+if Config.MARCACOES_SYNC_ATIVO:
+    try:
+        marcacoes_sync.start_sync_worker()
+    except Exception as t_err:
+        print(f"Erro ao iniciar thread de sincronização de marcações: {t_err}")
 
 @app.route('/api/agendamento_comandos/criar', methods=['POST'])
 @permission_required('envio_comando')
@@ -2017,6 +2183,7 @@ def api_agendamento_comandos_criar():
         )
         db.add(novo_agendamento)
         db.commit()
+        job_queue.notify()
         log_action(f"Criou agendamento #{novo_agendamento.id} de comandos para {dt_exec.strftime('%d/%m/%Y %H:%M')}")
         db.close()
 
@@ -2044,7 +2211,7 @@ def api_agendamento_comandos_criar_por_local():
         except ValueError:
             return jsonify({'sucesso': False, 'mensagem': 'Formato de data e hora inválido.'}), 400
 
-        clock_ids = CLOCK_GROUPS.get(location, [])
+        clock_ids = clock_topology.clock_ids(location)
         if not clock_ids:
             return jsonify({'sucesso': False, 'mensagem': f'Local {location} não encontrado nos grupos de relógios.'}), 400
 
@@ -2064,6 +2231,7 @@ def api_agendamento_comandos_criar_por_local():
         )
         db.add(novo_agendamento)
         db.commit()
+        job_queue.notify()
         log_action(f"Criou agendamento #{novo_agendamento.id} de comandos para local {location}")
         db.close()
 
@@ -2077,6 +2245,7 @@ def api_agendamento_comandos_listar():
     db = get_db_session()
     try:
         agendamentos = db.query(AgendamentoComando).order_by(AgendamentoComando.data_hora_execucao.desc()).all()
+        progressos = job_progress.load(db, [a.id for a in agendamentos if a.status != 'Pendente'])
         lista = []
         for a in agendamentos:
             try:
@@ -2098,10 +2267,7 @@ def api_agendamento_comandos_listar():
                 qtd_rels = len(rels)
                 
                 # Mapear locais de ponto correspondentes aos relógios
-                grupos_associados = []
-                for grupo_nome, grupo_ids in CLOCK_GROUPS.items():
-                    if any(rid in grupo_ids for rid in rels):
-                        grupos_associados.append(grupo_nome)
+                grupos_associados = clock_topology.groups_for(rels)
                 locais_str = ", ".join(sorted(grupos_associados)) if grupos_associados else "-"
             except Exception:
                 qtd_rels = 0
@@ -2120,6 +2286,7 @@ def api_agendamento_comandos_listar():
                 'resultado': a.resultado,
                 'sucesso_file': a.sucesso_file,
                 'falha_file': a.falha_file,
+                'progresso': progressos.get(a.id),
                 'created_at': a.created_at.strftime('%d/%m/%Y %H:%M') if a.created_at else ''
             })
 
@@ -2127,6 +2294,42 @@ def api_agendamento_comandos_listar():
     finally:
         db.close()
 
+@app.route('/api/agendamento_comandos/progresso/stream', methods=['GET'])
+@permission_required('envio_comando')
+def api_agendamento_comandos_progresso_stream():
+    """
+    Envia por SSE o progresso dos agendamentos em execução. A conexão é encerrada depois de
+    AGENDAMENTO_PROGRESSO_STREAM_SEGUNDOS (ou logo, se nada estiver em execução) e o navegador
+    reconecta sozinho, para a página não prender uma thread do servidor indefinidamente.
+    """
+    def generate_events():
+        inicio = time.monotonic()
+        desde = get_local_now().replace(tzinfo=None) - datetime.timedelta(seconds=job_progress.update_interval() * 2)
+        enviados = {}
+        while True:
+            db = get_db_session()
+            try:
+                progressos = job_progress.load_recent(db, desde)
+            finally:
+                db.close()
+
+            for progresso in progressos:
+                if enviados.get(progresso['agendamento_id']) != progresso:
+                    yield f"data: {json.dumps(progresso)}\n\n"
+                    enviados[progresso['agendamento_id']] = progresso
+
+            em_execucao = any(p['fase'] not in job_progress.FASES_FINAIS for p in progressos)
+            if not em_execucao or time.monotonic() - inicio >= Config.AGENDAMENTO_PROGRESSO_STREAM_SEGUNDOS:
+                # Sem execuções, reconecta mais devagar
+                yield f"retry: {2000 if em_execucao else 15000}\n\n"
+                break
+            time.sleep(job_progress.update_interval())
+
+    response = Response(stream_with_context(generate_events()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @app.route('/api/agendamento_comandos/remover/<int:id>', methods=['POST'])
 @permission_required('envio_comando')
 def api_agendamento_comandos_remover(id):
@@ -2141,6 +2344,7 @@ def api_agendamento_comandos_remover(id):
 
         db.delete(agendamento)
         db.commit()
+        job_queue.notify()
         log_action(f"Removeu agendamento #{id} de comandos")
         return jsonify({'sucesso': True, 'mensagem': 'Agendamento removido com sucesso.'})
     finally:
@@ -2178,8 +2382,7 @@ def api_agendamento_comandos_gerar_arquivos(id):
         pesquisa_falha = []
         crachas_sucesso = []
 
-        for cracha in funcionarios:
-            result = fetch_cracha(cracha)
+        for result in fetch_crachas(funcionarios):
             if not result.get('sucesso'):
                 pesquisa_falha.append(result)
             else:
@@ -2243,8 +2446,7 @@ def api_envio_comando_associar():
                     if linha and linha.isdigit():
                         funcionarios.append(int(linha))
                         
-        for cracha in funcionarios:
-            result = fetch_cracha(cracha)
+        for result in fetch_crachas(funcionarios):
             if not result.get('sucesso'):
                 pesquisa_falha.append(result)
             else:
@@ -2342,11 +2544,11 @@ def api_envio_comando_desligar():
         crachas_sucesso = []
         crachas_falha = []
         
-        for item in cracha_list:
+        resultados = fetch_crachas([item["Cracha"] for item in cracha_list])
+        for item, result in zip(cracha_list, resultados):
             cracha = item["Cracha"]
             data_desligamento = item["DataDesligamento"]
             
-            result = fetch_cracha(cracha)
             if result.get('sucesso'):
                 if result.get('semTemplates'):
                     crachas_falha.append({
@@ -2411,6 +2613,13 @@ def api_automacao_stream():
     tipo = request.args.get('tipo', 'ponteiro')
     data_val = request.args.get('data')
     relogios_str = request.args.get('relogios', '[]')
+    # Opcional: força o backend da automação ('http' ou 'navegador'); padrão Config.AUTOMACAO_BACKEND
+    backend = request.args.get('backend')
+    if backend not in AUTOMACAO_BACKENDS:
+        backend = None
+    # Modo "refazer falhas": repete só as etapas que falharam na execução informada
+    refazer_execucao_id = request.args.get('refazer', type=int)
+    usuario = session.get('username', 'Admin')
     
     # Process date format (from HTML5 date input YYYY-MM-DD to dimepkairos format DD/MM/YYYY)
     data_personalizada = None
@@ -2428,11 +2637,17 @@ def api_automacao_stream():
     except Exception:
         relogio_ids = None
 
-    log_action(f"Executou comando de automação '{tipo}' para os relógios: {relogio_ids}")
+    if refazer_execucao_id is not None:
+        log_action(f"Refez as etapas com falha da execução de automação #{refazer_execucao_id}")
+    else:
+        log_action(f"Executou comando de automação '{tipo}' para os relógios: {relogio_ids}")
 
     def generate_events():
         try:
-            for log_line in run_relogio_automation(tipo, data_personalizada, relogio_ids):
+            for log_line in run_relogio_automation(
+                tipo, data_personalizada, relogio_ids, backend=backend,
+                usuario=usuario, refazer_execucao_id=refazer_execucao_id
+            ):
                 # Send the line clean or wrapped in event stream format
                 yield f"data: {log_line.strip()}\n\n"
         except Exception as err:
@@ -2443,6 +2658,28 @@ def api_automacao_stream():
     response.headers['X-Accel-Buffering'] = 'no'
     return response
 
+@app.route('/api/automacao/execucoes', methods=['GET'])
+@permission_required('envio_comando')
+def api_automacao_execucoes():
+    db = get_db_session()
+    try:
+        limite = min(request.args.get('limite', 20, type=int), 100)
+        return jsonify({'sucesso': True, 'execucoes': automacao_resultados.load_recent(db, limite)})
+    finally:
+        db.close()
+
+@app.route('/api/automacao/execucoes/<int:execucao_id>', methods=['GET'])
+@permission_required('envio_comando')
+def api_automacao_execucao(execucao_id):
+    db = get_db_session()
+    try:
+        execucao = automacao_resultados.load(db, execucao_id)
+        if execucao is None:
+            return jsonify({'sucesso': False, 'mensagem': 'Execução não encontrada.'}), 404
+        return jsonify({'sucesso': True, 'execucao': execucao})
+    finally:
+        db.close()
+
 @app.route('/api/envio_comando_por_local', methods=['POST'])
 @permission_required('envio_comando')
 def api_envio_comando_por_local():
@@ -2454,7 +2691,7 @@ def api_envio_comando_por_local():
         if not location or not crachas:
             return jsonify({'sucesso': False, 'mensagem': 'Local e lista de crachás são obrigatórios.'}), 400
 
-        clock_ids = CLOCK_GROUPS.get(location, [])
+        clock_ids = clock_topology.clock_ids(location)
         if not clock_ids:
             return jsonify({'sucesso': False, 'mensagem': f'Local {location} não encontrado nos grupos de relógios.'}), 400
 
@@ -2470,10 +2707,12 @@ def api_envio_comando_por_local():
             comandos=json.dumps(config_options),
             matriculas=json.dumps(crachas),
             relogios=json.dumps(clock_ids),
-            status='Pendente'
+            status='Pendente',
+            prioridade=job_queue.PRIORIDADE_IMEDIATA
         )
         db.add(novo_agendamento)
         db.commit()
+        job_queue.notify()
         log_action(f"Criou agendamento imediato #{novo_agendamento.id} de comandos por local {location}")
         db.close()
 
@@ -0,0 +1,290 @@
+"""
+Automação dos relógios direto por HTTP, sem navegador.
+
+As operações da automação são requisições simples do site do Kairos: a atualização
+de data e hora é um GET em AgendarOperacaoRelogio/{id}?operacao=3. Aqui o login é feito
+uma vez, o cookie de autenticação fica num requests.Session reaproveitado entre as
+execuções (o login só é refeito quando a sessão expira) e formulários são enviados como o
+usuário faria (KairosWebSession.submit). Uma operação só conta como feita com confirmação
+explícita do site (aviso .validation-summary-ok ou JSON com Sucesso = true); qualquer
+outra resposta é falha e vai para o fallback no navegador.
+
+A reposição do ponteiro e as importações da página Advanced/{id} ainda não têm envio via
+HTTP: os botões "Sim" (diálogo de confirmação) e "Importar" (AJAX) não enviam o formulário
+da página, e a requisição deles precisa ser copiada de uma execução real no navegador.
+automacao_relogio manda essas fases direto para o Chromium.
+
+As operações têm a mesma interface da automação pelo navegador (geradores de linhas de
+log); automacao_relogio escolhe o backend e refaz no Chromium os relógios que falharem.
+"""
+import threading
+import time
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+import requests
+
+BASE_URL = 'https://www.dimepkairos.com.br'
+LOGIN_USER_ID = 'LogOnModel_UserName'
+LOGIN_PASSWORD_ID = 'LogOnModel_Password'
+
+# Timeouts (conexão, leitura) em segundos das páginas do site
+TIMEOUT = (10, 60)
+
+
+class AutomacaoHttpError(Exception):
+    """Resposta inesperada do site (login recusado, formulário não encontrado, erro de validação)."""
+
+
+class _Form:
+    def __init__(self, attrs):
+        self.action = attrs.get('action') or ''
+        self.method = (attrs.get('method') or 'get').lower()
+        # Campos na ordem da página: dicts com os atributos do input/select/textarea/button
+        self.fields = []
+
+    def field(self, **attrs):
+        for field in self.fields:
+            if all(attr in field.get(nome, '').split() if nome == 'class' else field.get(nome) == attr
+                   for nome, attr in attrs.items()):
+                return field
+        return None
+
+
+# Tags sem fechamento: não contam na profundidade do bloco de erros, escritas com ou sem "/>"
+_TAGS_VAZIAS = frozenset(('br', 'hr', 'img', 'input', 'meta', 'link'))
+
+
+class _FormParser(HTMLParser):
+    """Coleta os formulários da página com os valores padrão dos seus campos."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.forms = []
+        self.erros = []
+        # Aviso de sucesso do ASP.NET MVC (.validation-summary-ok) presente na página
+        self.ok = False
+        self._form = None
+        self._select = None
+        self._textarea = None
+        self._erro_nivel = 0
+
+    def handle_starttag(self, tag, attrs):
+        attrs = {nome: (valor if valor is not None else '') for nome, valor in attrs}
+        if self._erro_nivel:
+            self._erro_nivel += tag not in _TAGS_VAZIAS
+        elif 'validation-summary-errors' in attrs.get('class', '').split():
+            self._erro_nivel = 1
+        if 'validation-summary-ok' in attrs.get('class', '').split():
+            self.ok = True
+
+        if tag == 'form':
+            self._form = _Form(attrs)
+            self.forms.append(self._form)
+        elif self._form is None:
+            return
+        elif tag in ('input', 'button'):
+            attrs.setdefault('type', 'submit' if tag == 'button' else 'text')
+            attrs['tag'] = tag
+            self._form.fields.append(attrs)
+        elif tag == 'select':
+            self._select = dict(attrs, tag='select', value=None)
+            self._form.fields.append(self._select)
+        elif tag == 'option' and self._select is not None:
+            if self._select['value'] is None or 'selected' in attrs:
+                self._select['value'] = attrs.get('value', '')
+        elif tag == 'textarea':
+            self._textarea = dict(attrs, tag='textarea', value='')
+            self._form.fields.append(self._textarea)
+
+    def handle_endtag(self, tag):
+        if self._erro_nivel and tag not in _TAGS_VAZIAS:
+            self._erro_nivel -= 1
+        if tag == 'form':
+            self._form = None
+        elif tag == 'select':
+            self._select = None
+        elif tag == 'textarea':
+            self._textarea = None
+
+    def handle_data(self, data):
+        if self._textarea is not None:
+            self._textarea['value'] += data
+        if self._erro_nivel and data.strip():
+            self.erros.append(data.strip())
+
+
+def _parse(html):
+    parser = _FormParser()
+    parser.feed(html)
+    parser.close()
+    return parser
+
+
+def _form_payload(form, marcar=(), valores=None, botao=None):
+    """
+    Dados enviados pelo navegador ao submeter `form`: valores padrão da página, com os
+    radios/checkboxes de id em `marcar` marcados, os campos de `valores` ({id: valor})
+    preenchidos e o botão `botao` (campo do formulário) como o botão clicado.
+    """
+    valores = valores or {}
+    marcados = {field['name']: field for field in form.fields
+                if field.get('id') in marcar and field.get('type') == 'radio' and field.get('name')}
+    payload = []
+    for field in form.fields:
+        nome = field.get('name')
+        tipo = field.get('type', '').lower()
+        if not nome or 'disabled' in field:
+            continue
+        if tipo in ('submit', 'button', 'image', 'reset'):
+            if field is botao:
+                payload.append((nome, field.get('value', '')))
+        elif tipo == 'radio':
+            escolhido = marcados.get(nome)
+            if field is escolhido or (escolhido is None and 'checked' in field):
+                payload.append((nome, field.get('value', 'on')))
+        elif tipo == 'checkbox':
+            if field.get('id') in marcar or 'checked' in field:
+                payload.append((nome, field.get('value', 'on')))
+        elif field.get('tag') == 'select' and field['value'] is None and field.get('id') not in valores:
+            # Select sem opções: o navegador não envia o campo
+            continue
+        else:
+            payload.append((nome, valores.get(field.get('id'), field.get('value', ''))))
+    return payload
+
+
+class KairosWebSession:
+    """Sessão autenticada no site do Kairos, compartilhada entre as execuções da automação."""
+
+    def __init__(self):
+        self.session = requests.Session()
+        self._credentials = None
+        self._autenticado = False
+        # Quantidade de logins feitos: evita que várias threads refaçam o mesmo login expirado
+        self._logins = 0
+        self._lock = threading.Lock()
+
+    def ensure_login(self, credentials):
+        """Faz o login se ainda não houver sessão para essas credenciais. Retorna True se logou agora."""
+        with self._lock:
+            if self._autenticado and self._credentials == credentials:
+                return False
+            self._login(credentials)
+            return True
+
+    def _login(self, credentials):
+        login, password = credentials
+        self._credentials = credentials
+        self._autenticado = False
+        self.session.cookies.clear()
+        response = self.session.get(BASE_URL, timeout=TIMEOUT)
+        response.raise_for_status()
+        form = self._find_form(_parse(response.text), LOGIN_USER_ID, response.url)
+        payload = _form_payload(form, valores={LOGIN_USER_ID: login, LOGIN_PASSWORD_ID: password})
+        response = self.session.post(urljoin(response.url, form.action), data=payload, timeout=TIMEOUT)
+        response.raise_for_status()
+        pagina = _parse(response.text)
+        if self._is_login_page(pagina):
+            raise AutomacaoHttpError(' '.join(pagina.erros) or 'login recusado pelo site do Kairos')
+        self._autenticado = True
+        self._logins += 1
+
+    def _is_login_page(self, pagina):
+        return any(form.field(id=LOGIN_USER_ID) for form in pagina.forms)
+
+    def _find_form(self, pagina, field_id, url):
+        for form in pagina.forms:
+            if form.field(id=field_id):
+                return form
+        raise AutomacaoHttpError(f"formulário com o campo '{field_id}' não encontrado em {url}")
+
+    def get(self, url):
+        """GET autenticado; se a sessão tiver expirado, refaz o login e repete uma vez."""
+        logins = self._logins
+        response = self.session.get(url, timeout=TIMEOUT)
+        response.raise_for_status()
+        pagina = _parse(response.text)
+        if self._is_login_page(pagina):
+            with self._lock:
+                if self._credentials is None:
+                    raise AutomacaoHttpError('sessão do Kairos expirada')
+                if self._logins == logins:
+                    self._login(self._credentials)
+            response = self.session.get(url, timeout=TIMEOUT)
+            response.raise_for_status()
+            pagina = _parse(response.text)
+        return response, pagina
+
+    def submit(self, url, field_id, marcar=(), valores=None, botao=None):
+        """
+        Abre `url`, localiza o formulário que contém o campo `field_id`, preenche e envia.
+        `botao` ({atributo: valor}, ex.: {'class': 'buttonImportar'}) identifica o botão clicado;
+        se ele não estiver no formulário o envio não é feito (o botão pode disparar outra coisa,
+        como um diálogo de confirmação ou uma chamada AJAX que o formulário não reproduz).
+        """
+        response, pagina = self.get(url)
+        form = self._find_form(pagina, field_id, url)
+        campo_botao = None
+        if botao:
+            campo_botao = form.field(**botao)
+            if campo_botao is None:
+                raise AutomacaoHttpError(f"botão {botao} não encontrado no formulário de '{field_id}' em {url}")
+        payload = _form_payload(form, marcar=marcar, valores=valores, botao=campo_botao)
+        action = urljoin(response.url, (campo_botao or {}).get('formaction') or form.action)
+        if form.method == 'post':
+            response = self.session.post(action, data=payload, timeout=TIMEOUT)
+        else:
+            response = self.session.get(action, params=payload, timeout=TIMEOUT)
+        response.raise_for_status()
+        return self._check_result(response)
+
+    def _check_result(self, response):
+        """
+        Exige confirmação explícita de sucesso: o aviso .validation-summary-ok na página de
+        resposta ou um JSON com Sucesso = true. Qualquer outra resposta conta como falha, para
+        a etapa ir para o fallback no navegador em vez de ser dada como feita.
+        """
+        if 'json' in response.headers.get('Content-Type', ''):
+            try:
+                dados = response.json()
+            except ValueError:
+                dados = None
+            if isinstance(dados, dict) and any(dados.get(chave) is True for chave in ('Sucesso', 'sucesso', 'success')):
+                return response
+            raise AutomacaoHttpError(f"o site não confirmou o envio (resposta: {response.text[:200]})")
+
+        pagina = _parse(response.text)
+        if pagina.erros:
+            raise AutomacaoHttpError(' '.join(pagina.erros))
+        if self._is_login_page(pagina):
+            with self._lock:
+                self._autenticado = False
+            raise AutomacaoHttpError('sessão do Kairos expirada durante o envio')
+        if not pagina.ok:
+            raise AutomacaoHttpError(f"o site não confirmou o envio (página {response.url} sem aviso de sucesso)")
+        return response
+
+
+sessao = KairosWebSession()
+
+
+def _timed(mensagem, acao):
+    inicio = time.monotonic()
+    acao()
+    return f"{mensagem} ({time.monotonic() - inicio:.2f}s)\n"
+
+
+def datahora_relogio(i):
+    url = f"{BASE_URL}/Dimep/Relogios/AgendarOperacaoRelogio/{i}?operacao=3"
+
+    def enviar():
+        _, pagina = sessao.get(url)
+        if pagina.erros:
+            raise AutomacaoHttpError(' '.join(pagina.erros))
+        if not pagina.ok:
+            raise AutomacaoHttpError('a página não confirmou o agendamento da operação')
+
+    yield f"\n🔄 Enviando comando de data e hora para o relógio {i}...\n"
+    yield _timed(f"✅ Comando enviado com sucesso para o relógio {i}.", enviar)
+
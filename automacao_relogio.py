@@ -1,8 +1,15 @@
 import os
+import threading
 import time
 import datetime
-from playwright.sync_api import sync_playwright
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv, dotenv_values
+from config import Config
+import automacao_http
+import automacao_resultados
+import clock_topology
+import navegador_pool
+from database import get_db_session
 
 load_dotenv()
 
@@ -10,8 +17,21 @@ def get_previous_date():
     yesterday = datetime.datetime.now() - datetime.timedelta(days=1)
     return yesterday.strftime('%d/%m/%Y')
 
-def run_relogio_automation(tipo, data_personalizada=None, relogio_ids=None):
-    # 1. Load credentials
+# Backends da automação: 'http' (requisições diretas nas fases que as suportam, com o navegador como
+# fallback) ou 'navegador' (Playwright)
+BACKEND_HTTP = 'http'
+BACKEND_NAVEGADOR = 'navegador'
+BACKENDS = (BACKEND_HTTP, BACKEND_NAVEGADOR)
+
+# Mensagem de erro de cada fase (seguida do motivo)
+_MENSAGENS_ERRO = {
+    automacao_resultados.FASE_DATAHORA: "❌ Erro ao enviar comando para o relógio {i}",
+    automacao_resultados.FASE_REPOSICAO: "❌ Erro na reposição do ponteiro para o relógio {i}",
+    automacao_resultados.FASE_MARCACOES: "❌ Erro na 2ª importação para o relógio {i}",
+    automacao_resultados.FASE_STATUS: "❌ Erro na 3ª importação para o relógio {i}"
+}
+
+def _load_credentials():
     login = os.environ.get('KAIROS_LOGIN') or os.environ.get('LOGIN')
     password = os.environ.get('KAIROS_PASSWORD') or os.environ.get('SENHA')
 
@@ -23,214 +43,350 @@ def run_relogio_automation(tipo, data_personalizada=None, relogio_ids=None):
             ponteiro_env = dotenv_values(ponteiro_env_path)
             login = login or ponteiro_env.get('LOGIN')
             password = password or ponteiro_env.get('SENHA')
+    return login, password
+
+def run_relogio_automation(tipo, data_personalizada=None, relogio_ids=None, backend=None,
+                           origem=automacao_resultados.ORIGEM_MANUAL, usuario=None, refazer_execucao_id=None):
+    """
+    Executa a automação gerando as linhas de log. O resultado de cada fase em cada relógio
+    é registrado em automacao_resultados; com `refazer_execucao_id` só as etapas que falharam
+    (ou não chegaram a rodar) naquela execução são refeitas, com o tipo e a data dela.
+    """
+    # 1. Load credentials
+    login, password = _load_credentials()
 
     if not login or not password:
         yield "❌ Erro: Credenciais de login (LOGIN/SENHA) não encontradas no ambiente ou em ponteiro/.env.\n"
         return
 
-    if not data_personalizada:
-        data_personalizada = get_previous_date()
+    if refazer_execucao_id is not None:
+        db = get_db_session()
+        try:
+            original, plano = automacao_resultados.plano_de_falhas(db, refazer_execucao_id)
+        finally:
+            db.close()
+        if original is None:
+            yield f"❌ Erro: Execução #{refazer_execucao_id} não encontrada.\n"
+            return
+        if not plano:
+            yield f"✅ A execução #{refazer_execucao_id} não tem etapas com falha para refazer.\n"
+            return
+        tipo, data_personalizada = original.tipo, original.data_personalizada
+        origem = automacao_resultados.ORIGEM_REFAZER
+        yield f"🔁 Refazendo apenas as etapas com falha da execução #{refazer_execucao_id}.\n"
+    else:
+        if not data_personalizada:
+            data_personalizada = get_previous_date()
 
-    if relogio_ids is None:
-        # Default clock IDs: 1 to 32, plus 35 and 36
-        relogio_ids = list(range(1, 33)) + [35, 36]
+        if relogio_ids is None:
+            # Default clock IDs: 1 to 32, plus 35 and 36
+            relogio_ids = list(clock_topology.DEFAULT_URL_CLOCK_IDS)
+        else:
+            # Map selectable clock IDs 33 -> 35 and 34 -> 36 for URL access
+            relogio_ids = clock_topology.to_url_clock_ids(relogio_ids)
+        plano = automacao_resultados.plano_completo(tipo, relogio_ids)
+
+    if tipo == 'datahora':
+        data_personalizada = None
+
+    backend = backend or Config.AUTOMACAO_BACKEND
+    registro = automacao_resultados.ExecucaoRegistro(
+        tipo, data_personalizada, plano, origem,
+        usuario=usuario, backend=backend, refaz_execucao_id=refazer_execucao_id
+    )
+    if registro.id is not None:
+        yield f"🧾 Execução #{registro.id} registrada.\n"
+
+    if tipo == 'datahora':
+        yield "📅 Iniciando atualização de data e hora para os relógios selecionados...\n"
     else:
-        # Map selectable clock IDs 33 -> 35 and 34 -> 36 for URL access
-        relogio_ids = [35 if rid == 33 else 36 if rid == 34 else rid for rid in relogio_ids]
+        yield f"📅 Iniciando reposição do ponteiro para a data: {data_personalizada}...\n"
 
-    yield "🔄 Iniciando automação com Playwright...\n"
-    
-    p = None
-    browser = None
+    # Sinalizado se o consumidor parar no meio (ex.: cliente desconectou): os relógios que ainda
+    # não começaram são pulados e a execução só é encerrada depois que os workers terminarem
+    cancelar = threading.Event()
+    concluida = False
     try:
-        p = sync_playwright().start()
-        browser = p.chromium.launch(headless=True)
-        context = browser.new_context(viewport={"width": 1280, "height": 800})
-        page = context.new_page()
-
-        # Login
-        LOGIN_URL = 'https://www.dimepkairos.com.br'
-        yield "🔄 Acessando página de login...\n"
-        page.goto(LOGIN_URL, wait_until='domcontentloaded')
-        yield "✅ Página de login carregada.\n"
-
-        page.wait_for_selector('#LogOnModel_UserName')
-        page.type('#LogOnModel_UserName', login, delay=50)
-        time.sleep(0.3)
-        page.type('#LogOnModel_Password', password, delay=50)
-
-        page.wait_for_selector('#btnFormLogin')
-        page.click('#btnFormLogin')
-        yield "🔐 Dados de login enviados.\n"
-
-        # Wait for navigation after form submission
-        page.wait_for_load_state('domcontentloaded')
-        yield "✅ Login realizado com sucesso.\n"
-
-        if tipo == 'datahora':
-            yield "📅 Iniciando atualização de data e hora para os relógios selecionados...\n"
-            for i in relogio_ids:
-                target_url = f"https://www.dimepkairos.com.br/Dimep/Relogios/AgendarOperacaoRelogio/{i}?operacao=3"
-                yield f"\n🔄 Enviando comando de data e hora para o relógio {i}...\n"
-                try:
-                    page.goto(target_url, wait_until='domcontentloaded')
-                    # Wait for validation summary success or timeout
-                    page.wait_for_selector('.validation-summary-ok', timeout=10000)
-                    yield f"✅ Comando enviado com sucesso para o relógio {i}.\n"
-                    time.sleep(0.5)
-                except Exception as inner_err:
-                    yield f"❌ Erro ao enviar comando para o relógio {i}: {str(inner_err)}\n"
-            
-            yield "\n🏁 Automação de Data e Hora concluída!\n"
+        if backend == BACKEND_HTTP:
+            plano_http = {fase: ids for fase, ids in plano.items() if fase in _OPERACOES_HTTP}
+            plano_navegador = {fase: ids for fase, ids in plano.items() if fase not in _OPERACOES_HTTP}
+            if plano_http:
+                yield from _run_http((login, password), plano_http, registro, cancelar)
+                pendentes = registro.pendentes(plano_http)
+                if pendentes and Config.AUTOMACAO_HTTP_FALLBACK:
+                    relogios = automacao_resultados.relogios_do_plano(pendentes)
+                    yield f"\n🔁 {len(relogios)} relógio(s) com falha via HTTP serão refeitos no navegador: {relogios}\n"
+                    plano_navegador.update(pendentes)
+            elif plano_navegador:
+                yield "ℹ️ Reposição do ponteiro e importações ainda não têm envio via HTTP; seguem pelo navegador.\n"
+            if plano_navegador:
+                yield from _run_navegador((login, password), data_personalizada, plano_navegador, registro, cancelar)
+        else:
+            yield from _run_navegador((login, password), data_personalizada, plano, registro, cancelar)
+        concluida = True
+    finally:
+        registro.finish(interrompida=not concluida)
 
+    concluidas, total = registro.resumo()
+    if registro.id is not None:
+        if concluidas < total:
+            yield (f"\n📊 Execução #{registro.id}: {concluidas} de {total} etapas concluídas, "
+                   f"{total - concluidas} com falha (use 'Refazer falhas' para repetir só essas).\n")
         else:
-            # Pointer Repositioning
-            yield f"📅 Iniciando reposição do ponteiro para a data: {data_personalizada}...\n"
-            
-            # 1. Reposição de Ponteiro for each clock
-            for i in relogio_ids:
-                advanced_url = f"https://www.dimepkairos.com.br/Dimep/Relogios/Advanced/{i}"
-                yield f"\n🔄 Processando reposição do ponteiro para o relógio {i}...\n"
-                try:
-                    page.goto(advanced_url, wait_until='domcontentloaded')
-                    time.sleep(0.5)
-                    yield f"✅ Acessou o relógio {i}\n"
-
-                    page.wait_for_selector('#TabReposicaoPonteiro')
-                    page.click('#TabReposicaoPonteiro')
-                    time.sleep(0.5)
-                    yield "✅ Aba 'Reposição do Ponteiro' selecionada.\n"
-
-                    page.wait_for_selector('label[for="radioAPartirDeData"]')
-                    page.click('label[for="radioAPartirDeData"]')
-                    time.sleep(0.3)
-
-                    page.wait_for_selector('#textboxData')
-                    page.evaluate(f"""() => {{
-                        const dateInput = document.querySelector('#textboxData');
-                        if (dateInput) {{
-                            dateInput.value = '';
-                            dateInput.value = '{data_personalizada}';
-                        }}
-                    }}""")
-                    yield f"📅 Data '{data_personalizada}' inserida.\n"
-                    time.sleep(0.3)
-
-                    page.wait_for_selector('.questionReposicaoPonteiro')
-                    page.click('.questionReposicaoPonteiro')
-                    yield "🚀 Requisição enviada.\n"
-
-                    # Confirmação (botão "Sim")
-                    page.wait_for_selector('#bReposicaoPonteiro', state='visible', timeout=5000)
-                    time.sleep(0.3)
-                    page.click('#bReposicaoPonteiro')
-                    yield "✔️ Confirmação da reposição executada.\n"
-
-                except Exception as inner_err:
-                    yield f"❌ Erro na reposição do ponteiro para o relógio {i}: {str(inner_err)}\n"
-                    continue
-
-            # 2. Importação (Marcações)
-            for i in relogio_ids:
-                advanced_url = f"https://www.dimepkairos.com.br/Dimep/Relogios/Advanced/{i}"
-                yield f"\n🔄 Processando 2ª importação para o relógio {i}...\n"
-                try:
-                    page.goto(advanced_url, wait_until='domcontentloaded')
-                    time.sleep(0.5)
-
-                    page.wait_for_selector('#TabExportarDados', state='visible', timeout=5000)
-                    page.evaluate("""() => {
-                        const exportTab = document.querySelector('#TabExportarDados');
-                        if (exportTab) exportTab.scrollIntoView({ behavior: 'smooth', block: 'center' });
-                    }""")
-                    time.sleep(0.5)
-
-                    page.click('#TabExportarDados')
-                    time.sleep(0.5)
-                    yield "📁 Aba 'Comandos do Relógio' aberta.\n"
-
-                    # Seleciona "Importar"
-                    page.wait_for_selector('label[for="radioFunctionImportar"]')
-                    page.click('label[for="radioFunctionImportar"]')
-                    time.sleep(0.3)
-                    yield "☑️ Opção 'Importar' selecionada novamente para 'Marcações'.\n"
-
-                    # Marca "Marcações"
-                    page.wait_for_selector('label[for="checkImportarMarcacoes"]')
-                    page.click('label[for="checkImportarMarcacoes"]')
-                    time.sleep(0.3)
-                    yield "🔘 'Marcações' marcado.\n"
-
-                    # Clica em "Importar"
-                    page.wait_for_selector('.buttonImportar')
-                    page.click('.buttonImportar')
-                    time.sleep(1.0)
-                    yield "📨 Importação de 'Marcações' concluída.\n"
-
-                except Exception as inner_err:
-                    yield f"❌ Erro na 2ª importação para o relógio {i}: {str(inner_err)}\n"
-                    continue
-
-            # 3. Importação (Status Completo e Status Imediato)
-            for i in relogio_ids:
-                advanced_url = f"https://www.dimepkairos.com.br/Dimep/Relogios/Advanced/{i}"
-                yield f"\n🔄 Processando 3ª importação para o relógio {i}...\n"
-                try:
-                    page.goto(advanced_url, wait_until='domcontentloaded')
-                    time.sleep(0.5)
-
-                    page.wait_for_selector('#TabExportarDados', state='visible', timeout=5000)
-                    page.evaluate("""() => {
-                        const exportTab = document.querySelector('#TabExportarDados');
-                        if (exportTab) exportTab.scrollIntoView({ behavior: 'smooth', block: 'center' });
-                    }""")
-                    time.sleep(0.5)
-
-                    page.click('#TabExportarDados')
-                    time.sleep(0.5)
-                    yield "📁 Aba 'Comandos do Relógio' aberta.\n"
-
-                    # Seleciona "Importar"
-                    page.wait_for_selector('label[for="radioFunctionImportar"]')
-                    page.click('label[for="radioFunctionImportar"]')
-                    time.sleep(0.3)
-                    yield "☑️ Opção 'Importar' selecionada novamente para 'Status Completo' e 'Status Imediato'.\n"
-
-                    # Marca "Status Completo"
-                    page.wait_for_selector('label[for="checkboxImportarStatusCompleto"]')
-                    page.click('label[for="checkboxImportarStatusCompleto"]')
-                    time.sleep(0.3)
-                    yield "🔘 'Status Completo' marcado.\n"
-
-                    # Marca "Status Imediato"
-                    page.wait_for_selector('label[for="checkboxImportarStatusImediato"]')
-                    page.click('label[for="checkboxImportarStatusImediato"]')
-                    time.sleep(0.3)
-                    yield "🔘 'Status Imediato' marcado.\n"
-
-                    # Clica em "Importar"
-                    page.wait_for_selector('.buttonImportar')
-                    page.click('.buttonImportar')
-                    time.sleep(1.0)
-                    yield "📨 Importação de 'Status Completo' e 'Status Imediato' concluída novamente.\n"
-
-                except Exception as inner_err:
-                    yield f"❌ Erro na 3ª importação para o relógio {i}: {str(inner_err)}\n"
-                    continue
-
-            yield "\n🏁 Automação de Reposição de Ponteiro concluída!\n"
+            yield f"\n📊 Execução #{registro.id}: {concluidas} de {total} etapas concluídas.\n"
 
+    if tipo == 'datahora':
+        yield "\n🏁 Automação de Data e Hora concluída!\n"
+    else:
+        yield "\n🏁 Automação de Reposição de Ponteiro concluída!\n"
+
+def _run_phase(registro, fase, relogio_id, passos, backend):
+    # Executa uma fase em um relógio (gerador de linhas) e registra o resultado
+    inicio = time.monotonic()
+    try:
+        yield from _tagged(relogio_id, passos)
     except Exception as e:
-        yield f"❌ Erro geral na automação: {str(e)}\n"
-    finally:
-        if browser:
-            try:
-                browser.close()
-            except:
-                pass
-        if p:
-            try:
-                p.stop()
-            except:
-                pass
-        print("🔒 Navegador encerrado.")
+        yield from _tagged(relogio_id, [f"{_MENSAGENS_ERRO[fase].format(i=relogio_id)}: {str(e)}\n"])
+        registro.add(relogio_id, fase, False, str(e), time.monotonic() - inicio, backend)
+    else:
+        registro.add(relogio_id, fase, True, None, time.monotonic() - inicio, backend)
+
+# Fases com envio via HTTP. A reposição do ponteiro e as importações são disparadas pelo botão
+# "Sim" do diálogo de confirmação e pelo botão "Importar" (AJAX), cujas requisições o envio do
+# formulário da página não reproduz; até elas serem copiadas de uma requisição real do navegador,
+# essas fases vão direto para o navegador mesmo com o backend 'http'.
+_OPERACOES_HTTP = {
+    automacao_resultados.FASE_DATAHORA: automacao_http.datahora_relogio
+}
+
+def _run_http(credentials, plano, registro, cancelar):
+    yield "🔄 Iniciando automação via HTTP...\n"
+    try:
+        if automacao_http.sessao.ensure_login(credentials):
+            yield "🔐 Login realizado com sucesso.\n"
+        else:
+            yield "✅ Sessão do Kairos ainda ativa.\n"
+    except Exception as e:
+        yield f"⚠️ Falha no login via HTTP: {str(e)}\n"
+        return
+
+    def executar(fase, i):
+        if cancelar.is_set():
+            return []
+        return list(_run_phase(registro, fase, i, _OPERACOES_HTTP[fase](i), BACKEND_HTTP))
+
+    paralelos = max(1, min(Config.AUTOMACAO_RELOGIOS_PARALELOS, len(automacao_resultados.relogios_do_plano(plano))))
+    falhas = set()
+    with ThreadPoolExecutor(max_workers=paralelos, thread_name_prefix='automacao-http') as executor:
+        try:
+            # Mesma ordem da automação pelo navegador: reposição, marcações, status
+            for fase, ids in plano.items():
+                # Um relógio que falhou numa fase não segue para as próximas (vai inteiro para o fallback)
+                ids = [i for i in ids if i not in falhas]
+                for i, linhas in zip(ids, executor.map(lambda i: executar(fase, i), ids)):
+                    yield from linhas
+                    if registro.falhou(i, fase):
+                        falhas.add(i)
+        except GeneratorExit:
+            # O executor ainda espera os relógios em andamento; os que estão na fila são pulados
+            cancelar.set()
+            raise
+
+def _run_navegador(credentials, data_personalizada, plano, registro, cancelar):
+    yield "🔄 Iniciando automação com Playwright...\n"
+
+    # Os relógios são divididos entre até AUTOMACAO_RELOGIOS_PARALELOS navegadores do pool (já
+    # autenticados, quando possível); cada navegador percorre as fases na ordem para os seus relógios
+    relogio_ids = automacao_resultados.relogios_do_plano(plano)
+    paralelos = max(1, min(Config.AUTOMACAO_RELOGIOS_PARALELOS, len(relogio_ids)))
+    grupos = [set(relogio_ids[k::paralelos]) for k in range(paralelos)]
+    planos = [{fase: [i for i in ids if i in grupo] for fase, ids in plano.items()} for grupo in grupos]
+
+    if paralelos > 1:
+        yield f"⚡ {len(relogio_ids)} relógios divididos entre {paralelos} navegadores em paralelo.\n"
+
+    yield from navegador_pool.pool.stream_parallel(
+        credentials,
+        [lambda page, p=p: _automation_steps(page, data_personalizada, p, registro, cancelar) for p in planos],
+        cancelar
+    )
+
+def _tagged(relogio_id, linhas):
+    # Identifica o relógio em cada linha, já que os logs de navegadores paralelos se intercalam
+    for linha in linhas:
+        quebra = '\n' if linha.startswith('\n') else ''
+        yield f"{quebra}[Relógio {relogio_id}] {linha.lstrip(chr(10))}"
+
+def _automation_steps(page, data_personalizada, plano, registro, cancelar):
+    # 1. Reposição de Ponteiro, 2. Importação (Marcações), 3. Importação (Status Completo e Status Imediato)
+    operacoes = {
+        automacao_resultados.FASE_DATAHORA: lambda i: _datahora_relogio(page, i),
+        automacao_resultados.FASE_REPOSICAO: lambda i: _reposicao_ponteiro(page, i, data_personalizada),
+        automacao_resultados.FASE_MARCACOES: lambda i: _importar_marcacoes(page, i),
+        automacao_resultados.FASE_STATUS: lambda i: _importar_status(page, i)
+    }
+    for fase, ids in plano.items():
+        for i in ids:
+            # Execução interrompida: para entre um relógio e outro
+            if cancelar.is_set():
+                return
+            yield from _run_phase(registro, fase, i, operacoes[fase](i), BACKEND_NAVEGADOR)
+
+# Tempo máximo de espera pela condição de conclusão de cada passo
+STEP_TIMEOUT_MS = 10000
+
+# URL absoluta para onde o botão envia o formulário (null se ele não pertence a um formulário)
+_DESTINO_DO_BOTAO_JS = """(selector) => {
+    const el = document.querySelector(selector);
+    if (!el || !el.form) return null;
+    return el.formAction || el.form.action || null;
+}"""
+
+class _Passos:
+    """
+    Executa os passos de um relógio. Cada passo espera a própria condição de conclusão
+    (seletor visível, checkbox marcado, resposta da requisição disparada pelo clique) em
+    vez de pausas fixas, e a linha de log informa quanto tempo ele levou.
+    """
+
+    def __init__(self, page):
+        self.page = page
+        self.inicio = time.monotonic()
+
+    def run(self, mensagem, acao):
+        inicio = time.monotonic()
+        acao()
+        return f"{mensagem} ({time.monotonic() - inicio:.2f}s)\n"
+
+    def total(self, mensagem):
+        return f"⏱️ {mensagem} em {time.monotonic() - self.inicio:.2f}s.\n"
+
+    def goto(self, url, pronto):
+        """Navega e espera o elemento `pronto` ficar visível."""
+        self.page.goto(url, wait_until='domcontentloaded')
+        self.page.wait_for_selector(pronto, state='visible', timeout=STEP_TIMEOUT_MS)
+
+    def click(self, selector, pronto):
+        """Clica e espera o elemento `pronto` (conteúdo revelado pelo clique) ficar visível."""
+        self.page.click(selector, timeout=STEP_TIMEOUT_MS)
+        self.page.wait_for_selector(pronto, state='visible', timeout=STEP_TIMEOUT_MS)
+
+    def check(self, input_id):
+        """Marca o radio/checkbox pelo seu label (se ainda não estiver marcado) e espera a marcação."""
+        marcado = f"() => {{ const el = document.getElementById('{input_id}'); return !!(el && el.checked); }}"
+        if not self.page.evaluate(marcado):
+            self.page.click(f'label[for="{input_id}"]', timeout=STEP_TIMEOUT_MS)
+        self.page.wait_for_function(marcado, timeout=STEP_TIMEOUT_MS)
+
+    def click_and_wait_response(self, selector):
+        """
+        Clica e espera a resposta do POST que o botão dispara: o action do formulário do botão
+        (formaction ou action do form) ou, para botões fora de formulário (envio por AJAX),
+        um POST para o controlador dos relógios. Redirecionamentos (3xx) contam como sucesso.
+        """
+        destino = self.page.evaluate(_DESTINO_DO_BOTAO_JS, selector)
+
+        def disparada_pelo_botao(response):
+            if response.request.method != 'POST':
+                return False
+            url = response.url.split('?')[0].split('#')[0]
+            if destino:
+                return url == destino.split('?')[0].split('#')[0]
+            return '/Dimep/Relogios/' in url
+
+        with self.page.expect_response(disparada_pelo_botao, timeout=STEP_TIMEOUT_MS) as resposta:
+            self.page.click(selector, timeout=STEP_TIMEOUT_MS)
+        if resposta.value.status >= 400:
+            raise RuntimeError(f"o servidor respondeu HTTP {resposta.value.status}")
+
+def _datahora_relogio(page, i):
+    target_url = f"https://www.dimepkairos.com.br/Dimep/Relogios/AgendarOperacaoRelogio/{i}?operacao=3"
+    yield f"\n🔄 Enviando comando de data e hora para o relógio {i}...\n"
+    passos = _Passos(page)
+    # A página confirma o agendamento com o aviso .validation-summary-ok
+    yield passos.run(
+        f"✅ Comando enviado com sucesso para o relógio {i}.",
+        lambda: passos.goto(target_url, '.validation-summary-ok')
+    )
+
+def _reposicao_ponteiro(page, i, data_personalizada):
+    advanced_url = f"https://www.dimepkairos.com.br/Dimep/Relogios/Advanced/{i}"
+    yield f"\n🔄 Processando reposição do ponteiro para o relógio {i}...\n"
+    passos = _Passos(page)
+    yield passos.run(f"✅ Acessou o relógio {i}", lambda: passos.goto(advanced_url, '#TabReposicaoPonteiro'))
+
+    yield passos.run(
+        "✅ Aba 'Reposição do Ponteiro' selecionada.",
+        lambda: passos.click('#TabReposicaoPonteiro', 'label[for="radioAPartirDeData"]')
+    )
+
+    def preencher_data():
+        passos.check('radioAPartirDeData')
+        page.wait_for_selector('#textboxData', state='visible', timeout=STEP_TIMEOUT_MS)
+        page.evaluate(f"""() => {{
+            const dateInput = document.querySelector('#textboxData');
+            if (dateInput) {{
+                dateInput.value = '';
+                dateInput.value = '{data_personalizada}';
+            }}
+        }}""")
+    yield passos.run(f"📅 Data '{data_personalizada}' inserida.", preencher_data)
+
+    # Confirmação (botão "Sim") aparece depois do clique
+    yield passos.run("🚀 Requisição enviada.", lambda: passos.click('.questionReposicaoPonteiro', '#bReposicaoPonteiro'))
+
+    yield passos.run(
+        "✔️ Confirmação da reposição executada.",
+        lambda: passos.click_and_wait_response('#bReposicaoPonteiro')
+    )
+    yield passos.total(f"Reposição do ponteiro do relógio {i}")
+
+def _abrir_comandos_do_relogio(passos, advanced_url):
+    passos.goto(advanced_url, '#TabExportarDados')
+    # O clique já rola a aba para a área visível
+    passos.click('#TabExportarDados', 'label[for="radioFunctionImportar"]')
+
+def _importar_marcacoes(page, i):
+    advanced_url = f"https://www.dimepkairos.com.br/Dimep/Relogios/Advanced/{i}"
+    yield f"\n🔄 Processando 2ª importação para o relógio {i}...\n"
+    passos = _Passos(page)
+    yield passos.run("📁 Aba 'Comandos do Relógio' aberta.", lambda: _abrir_comandos_do_relogio(passos, advanced_url))
+
+    # Seleciona "Importar"
+    yield passos.run(
+        "☑️ Opção 'Importar' selecionada novamente para 'Marcações'.",
+        lambda: passos.check('radioFunctionImportar')
+    )
+
+    # Marca "Marcações"
+    yield passos.run("🔘 'Marcações' marcado.", lambda: passos.check('checkImportarMarcacoes'))
+
+    # Clica em "Importar" e espera a resposta do servidor
+    yield passos.run(
+        "📨 Importação de 'Marcações' concluída.",
+        lambda: passos.click_and_wait_response('.buttonImportar')
+    )
+    yield passos.total(f"2ª importação do relógio {i}")
+
+def _importar_status(page, i):
+    advanced_url = f"https://www.dimepkairos.com.br/Dimep/Relogios/Advanced/{i}"
+    yield f"\n🔄 Processando 3ª importação para o relógio {i}...\n"
+    passos = _Passos(page)
+    yield passos.run("📁 Aba 'Comandos do Relógio' aberta.", lambda: _abrir_comandos_do_relogio(passos, advanced_url))
+
+    # Seleciona "Importar"
+    yield passos.run(
+        "☑️ Opção 'Importar' selecionada novamente para 'Status Completo' e 'Status Imediato'.",
+        lambda: passos.check('radioFunctionImportar')
+    )
+
+    # Marca "Status Completo" e "Status Imediato"
+    yield passos.run("🔘 'Status Completo' marcado.", lambda: passos.check('checkboxImportarStatusCompleto'))
+    yield passos.run("🔘 'Status Imediato' marcado.", lambda: passos.check('checkboxImportarStatusImediato'))
+
+    # Clica em "Importar" e espera a resposta do servidor
+    yield passos.run(
+        "📨 Importação de 'Status Completo' e 'Status Imediato' concluída novamente.",
+        lambda: passos.click_and_wait_response('.buttonImportar')
+    )
+    yield passos.total(f"3ª importação do relógio {i}")
@@ -0,0 +1,228 @@
+"""
+Resultado da automação dos relógios por relógio e fase (tabelas automacao_execucoes e
+automacao_resultados).
+
+Cada execução grava o plano (quais fases rodam em quais relógios) e, conforme cada fase
+termina em um relógio, o resultado, o backend que a executou e quanto tempo levou. Uma
+execução interrompida no meio deixa registrado o que já foi feito, e o modo "refazer
+falhas" monta um plano só com as etapas que falharam ou não chegaram a rodar.
+"""
+import json
+import threading
+import time
+
+from config import get_local_now
+from database import get_db_session
+from db_setup import ExecucaoAutomacao, ResultadoAutomacao
+
+FASE_DATAHORA = 'datahora'
+FASE_REPOSICAO = 'reposicao'
+FASE_MARCACOES = 'marcacoes'
+FASE_STATUS = 'status'
+
+# Fases de cada tipo de automação, na ordem de execução
+FASES_POR_TIPO = {
+    'datahora': (FASE_DATAHORA,),
+    'ponteiro': (FASE_REPOSICAO, FASE_MARCACOES, FASE_STATUS)
+}
+
+ORIGEM_MANUAL = 'manual'
+ORIGEM_RECORRENTE = 'recorrente'
+ORIGEM_REFAZER = 'refazer'
+
+STATUS_EXECUTANDO = 'Executando'
+STATUS_CONCLUIDA = 'Concluída'
+STATUS_COM_FALHAS = 'Com falhas'
+STATUS_INTERROMPIDA = 'Interrompida'
+
+
+def plano_completo(tipo, relogio_ids):
+    """Todas as fases do tipo em todos os relógios: {fase: [relógios]}."""
+    return {fase: list(relogio_ids) for fase in FASES_POR_TIPO[tipo]}
+
+
+def relogios_do_plano(plano):
+    """Relógios do plano, sem repetição e na ordem em que aparecem."""
+    return list(dict.fromkeys(i for ids in plano.values() for i in ids))
+
+
+class ExecucaoRegistro:
+    """
+    Registro de uma execução em andamento. Os resultados ficam em memória (para calcular as
+    pendências) e são gravados no banco um a um, para sobreviver a uma queda no meio da execução.
+    Falhas ao gravar só são logadas: a automação não para por causa do registro.
+    """
+
+    def __init__(self, tipo, data_personalizada, plano, origem, usuario=None, backend=None, refaz_execucao_id=None):
+        self.tipo = tipo
+        self.data_personalizada = data_personalizada
+        self.plano = plano
+        self.id = None
+        self._sucessos = set()
+        self._falhas = set()
+        self._inicio = time.monotonic()
+        self._lock = threading.Lock()
+
+        db = get_db_session()
+        try:
+            execucao = ExecucaoAutomacao(
+                tipo=tipo,
+                data_personalizada=data_personalizada,
+                origem=origem,
+                usuario=usuario,
+                backend=backend,
+                plano=json.dumps(plano),
+                refaz_execucao_id=refaz_execucao_id,
+                status=STATUS_EXECUTANDO,
+                iniciado_em=get_local_now().replace(tzinfo=None)
+            )
+            db.add(execucao)
+            db.commit()
+            self.id = execucao.id
+        except Exception as e:
+            db.rollback()
+            print(f"[AUTOMACAO] Erro ao registrar execução da automação: {e}")
+        finally:
+            db.close()
+
+    def add(self, relogio_id, fase, sucesso, erro, duracao, backend):
+        with self._lock:
+            (self._sucessos if sucesso else self._falhas).add((relogio_id, fase))
+            if sucesso:
+                self._falhas.discard((relogio_id, fase))
+        if self.id is None:
+            return
+
+        db = get_db_session()
+        try:
+            db.add(ResultadoAutomacao(
+                execucao_id=self.id,
+                relogio_id=relogio_id,
+                fase=fase,
+                sucesso=sucesso,
+                erro=erro[:1000] if erro else None,
+                backend=backend,
+                duracao_ms=int(duracao * 1000),
+                registrado_em=get_local_now().replace(tzinfo=None)
+            ))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"[AUTOMACAO] Erro ao gravar resultado do relógio {relogio_id} ({fase}): {e}")
+        finally:
+            db.close()
+
+    def falhou(self, relogio_id, fase):
+        with self._lock:
+            return (relogio_id, fase) in self._falhas
+
+    def pendentes(self, plano=None):
+        """Plano com as etapas (de `plano` ou do plano da execução) que ainda não tiveram sucesso."""
+        with self._lock:
+            return _sem_sucessos(plano or self.plano, self._sucessos)
+
+    def resumo(self):
+        """(etapas concluídas, etapas planejadas)."""
+        total = sum(len(ids) for ids in self.plano.values())
+        pendentes = sum(len(ids) for ids in self.pendentes().values())
+        return total - pendentes, total
+
+    def finish(self, interrompida=False):
+        concluidas, total = self.resumo()
+        if interrompida:
+            status = STATUS_INTERROMPIDA
+        else:
+            status = STATUS_CONCLUIDA if concluidas == total else STATUS_COM_FALHAS
+        if self.id is None:
+            return status
+
+        db = get_db_session()
+        try:
+            execucao = db.query(ExecucaoAutomacao).get(self.id)
+            execucao.status = status
+            execucao.finalizado_em = get_local_now().replace(tzinfo=None)
+            execucao.duracao_segundos = int(time.monotonic() - self._inicio)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"[AUTOMACAO] Erro ao finalizar execução #{self.id}: {e}")
+        finally:
+            db.close()
+        return status
+
+
+def _sem_sucessos(plano, sucessos):
+    pendentes = {}
+    for fase, ids in plano.items():
+        faltam = [i for i in ids if (i, fase) not in sucessos]
+        if faltam:
+            pendentes[fase] = faltam
+    return pendentes
+
+
+def plano_de_falhas(db, execucao_id):
+    """
+    (execução, plano) com as etapas da execução que falharam ou não chegaram a rodar.
+    A execução é None se não existir; o plano fica vazio se tudo teve sucesso.
+    """
+    execucao = db.query(ExecucaoAutomacao).get(execucao_id)
+    if execucao is None:
+        return None, {}
+    sucessos = {
+        (r.relogio_id, r.fase)
+        for r in db.query(ResultadoAutomacao).filter_by(execucao_id=execucao_id, sucesso=True)
+    }
+    return execucao, _sem_sucessos(json.loads(execucao.plano), sucessos)
+
+
+def load_recent(db, limite=20):
+    """Últimas execuções, com as contagens de etapas."""
+    execucoes = db.query(ExecucaoAutomacao).order_by(ExecucaoAutomacao.id.desc()).limit(limite).all()
+    return [to_dict(execucao, _resultados(db, execucao.id)) for execucao in execucoes]
+
+
+def load(db, execucao_id):
+    """Execução com o resultado de cada relógio e fase (None se não existir)."""
+    execucao = db.query(ExecucaoAutomacao).get(execucao_id)
+    if execucao is None:
+        return None
+    resultados = _resultados(db, execucao_id)
+    dados = to_dict(execucao, resultados)
+    dados['resultados'] = [{
+        'relogio_id': r.relogio_id,
+        'fase': r.fase,
+        'sucesso': r.sucesso,
+        'erro': r.erro,
+        'backend': r.backend,
+        'duracao_ms': r.duracao_ms,
+        'registrado_em': r.registrado_em.strftime('%d/%m/%Y %H:%M:%S')
+    } for r in resultados]
+    return dados
+
+
+def _resultados(db, execucao_id):
+    return db.query(ResultadoAutomacao).filter_by(execucao_id=execucao_id).order_by(ResultadoAutomacao.id).all()
+
+
+def to_dict(execucao, resultados):
+    plano = json.loads(execucao.plano)
+    sucessos = {(r.relogio_id, r.fase) for r in resultados if r.sucesso}
+    total = sum(len(ids) for ids in plano.values())
+    pendentes = sum(len(ids) for ids in _sem_sucessos(plano, sucessos).values())
+    return {
+        'id': execucao.id,
+        'tipo': execucao.tipo,
+        'data_personalizada': execucao.data_personalizada,
+        'origem': execucao.origem,
+        'usuario': execucao.usuario,
+        'backend': execucao.backend,
+        'refaz_execucao_id': execucao.refaz_execucao_id,
+        'status': execucao.status,
+        'relogios': relogios_do_plano(plano),
+        'etapas_total': total,
+        'etapas_concluidas': total - pendentes,
+        'etapas_pendentes': pendentes,
+        'iniciado_em': execucao.iniciado_em.strftime('%d/%m/%Y %H:%M:%S') if execucao.iniciado_em else None,
+        'finalizado_em': execucao.finalizado_em.strftime('%d/%m/%Y %H:%M:%S') if execucao.finalizado_em else None,
+        'duracao_segundos': execucao.duracao_segundos
+    }
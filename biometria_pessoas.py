@@ -0,0 +1,91 @@
+"""
+Indicador persistido de "pessoa possui biometria" no Kairos.
+
+Para saber se alguém tem biometria o SearchPerson precisa devolver todos os templates
+(CarregarBiometrias), o que pesa kilobytes por pessoa. Como biometria cadastrada quase
+nunca é removida, o resultado fica gravado na tabela `biometria_pessoas` junto com o
+crachá consultado, e um resultado positivo vale por BIOMETRIA_REVALIDAR_DIAS: nesse
+período a consulta daquele crachá é feita sem templates. Crachás desconhecidos e pessoas
+sem biometria (que podem ser cadastradas a qualquer momento) são consultados direto com
+templates, numa única chamada. O banco só é gravado quando o indicador muda ou vence.
+"""
+import datetime
+import threading
+
+from config import Config, get_local_now
+from database import get_db_session
+from db_setup import BiometriaPessoa
+
+_lock = threading.Lock()
+_flags = None  # {kairos_id: (possui_biometria, verificado_em)}, carregado do banco no primeiro uso
+_ids = None  # {cracha: kairos_id} da última consulta de cada crachá
+
+
+def _load_locked():
+    global _flags, _ids
+    if _flags is not None:
+        return
+    _flags = {}
+    _ids = {}
+    db = get_db_session()
+    try:
+        for row in db.query(BiometriaPessoa):
+            _flags[row.kairos_id] = (row.possui_biometria, row.verificado_em)
+            if row.cracha:
+                _ids[row.cracha] = row.kairos_id
+    except Exception as e:
+        print(f"[BIOMETRIA] Erro ao carregar indicadores de biometria do banco: {e}")
+    finally:
+        db.close()
+
+
+def _valid(flag):
+    validade = datetime.timedelta(days=Config.BIOMETRIA_REVALIDAR_DIAS)
+    return get_local_now().replace(tzinfo=None) - flag[1] <= validade
+
+
+def biometric_person_id(cracha):
+    """
+    Id no Kairos da pessoa do crachá, se ela teve biometria confirmada dentro da validade;
+    None quando é preciso consultar com templates. `cracha` já normalizado pelo chamador.
+    """
+    with _lock:
+        _load_locked()
+        kairos_id = _ids.get(cracha)
+        flag = _flags.get(kairos_id)
+    if not flag or not flag[0] or not _valid(flag):
+        return None
+    return kairos_id
+
+
+def record(kairos_id, cracha, possui_biometria):
+    """
+    Guarda o resultado de uma consulta com templates. Só grava no banco quando o indicador
+    ou o crachá mudaram, ou quando um resultado positivo precisa ser revalidado.
+    """
+    if kairos_id is None:
+        return
+    now = get_local_now().replace(tzinfo=None)
+    with _lock:
+        _load_locked()
+        anterior = _flags.get(kairos_id)
+        mudou = (
+            anterior is None
+            or anterior[0] != possui_biometria
+            or _ids.get(cracha) != kairos_id
+            or (possui_biometria and not _valid(anterior))
+        )
+        if not mudou:
+            return
+        _flags[kairos_id] = (possui_biometria, now)
+        _ids[cracha] = kairos_id
+
+    db = get_db_session()
+    try:
+        db.merge(BiometriaPessoa(kairos_id=kairos_id, cracha=cracha, possui_biometria=possui_biometria, verificado_em=now))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"[BIOMETRIA] Erro ao gravar indicador de biometria da pessoa {kairos_id}: {e}")
+    finally:
+        db.close()
@@ -0,0 +1,177 @@
+"""
+Cache em memória compartilhado entre threads para dados caros de montar
+(ex.: o diretório completo de pessoas do Kairos).
+"""
+import threading
+import time
+
+
+class _Flight:
+    """Uma carga em andamento; threads que pedem o mesmo valor aguardam por ela."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class RefreshingCache:
+    """
+    Guarda o resultado de `loader()` por `ttl` segundos.
+
+    - Single-flight: chamadas simultâneas sem valor em cache disparam uma única carga
+      e aguardam o mesmo resultado.
+    - Stale-while-revalidate: depois do TTL o valor antigo continua sendo devolvido
+      imediatamente enquanto uma thread em segundo plano faz a recarga.
+    - Se a recarga falhar, o valor antigo é mantido e uma nova tentativa só acontece
+      depois de `retry_after` segundos.
+    """
+
+    def __init__(self, loader, ttl, name='cache', retry_after=60):
+        self._loader = loader
+        self.ttl = ttl
+        self.name = name
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._value = None
+        self._loaded_at = None
+        self._next_refresh = None
+        self._flight = None
+        self._generation = 0
+
+    def get(self):
+        with self._lock:
+            if self._loaded_at is not None:
+                if time.monotonic() >= self._next_refresh and self._flight is None:
+                    self._start_flight_locked(background=True)
+                return self._value
+            flight = self._flight
+            leader = flight is None
+            if leader:
+                flight = self._start_flight_locked(background=False)
+                generation = self._generation
+
+        if leader:
+            self._load(flight, generation)
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def prime(self, value, age=0):
+        """
+        Preenche o cache com um valor já conhecido (ex.: cópia persistida), considerado
+        carregado há `age` segundos. Se já estiver vencido, a primeira chamada a get()
+        devolve esse valor e dispara a recarga em segundo plano.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._value = value
+            self._loaded_at = now - age
+            self._next_refresh = now + max(self.ttl - age, 0)
+
+    def invalidate(self):
+        """Descarta o valor em cache; a próxima chamada a get() carrega novamente."""
+        with self._lock:
+            self._generation += 1
+            self._value = None
+            self._loaded_at = None
+            self._next_refresh = None
+            self._flight = None
+
+    def info(self):
+        with self._lock:
+            return {
+                'nome': self.name,
+                'carregado': self._loaded_at is not None,
+                'idade_segundos': round(time.monotonic() - self._loaded_at, 1) if self._loaded_at is not None else None,
+                'ttl_segundos': self.ttl,
+                'recarregando': self._flight is not None
+            }
+
+    def _start_flight_locked(self, background):
+        flight = _Flight()
+        self._flight = flight
+        if background:
+            threading.Thread(
+                target=self._load,
+                args=(flight, self._generation),
+                daemon=True,
+                name=f'{self.name}-refresh'
+            ).start()
+        return flight
+
+    def _load(self, flight, generation):
+        try:
+            flight.value = self._loader()
+        except Exception as e:
+            flight.error = e
+            print(f"[{self.name}] Erro ao carregar cache: {e}")
+
+        with self._lock:
+            # Uma invalidação durante a carga descarta o resultado desta carga
+            if generation == self._generation:
+                now = time.monotonic()
+                if flight.error is None:
+                    self._value = flight.value
+                    self._loaded_at = now
+                    self._next_refresh = now + self.ttl
+                elif self._loaded_at is not None:
+                    self._next_refresh = now + self.retry_after
+            if self._flight is flight:
+                self._flight = None
+        flight.done.set()
+
+
+class TTLCache:
+    """
+    Cache por chave em que cada entrada vale `ttl` segundos, com contadores de
+    acertos/falhas (ex.: resultado da consulta de cada crachá no SearchPerson).
+    """
+
+    def __init__(self, ttl, name='cache'):
+        self.ttl = ttl
+        self.name = name
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key):
+        """Retorna o valor em cache ou None (entrada ausente ou vencida)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() < entry[1]:
+                self._hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self._misses += 1
+            return None
+
+    def set(self, key, value):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+
+    def invalidate(self, key=None):
+        """Descarta uma entrada, ou todas quando `key` não é informada."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def info(self):
+        with self._lock:
+            now = time.monotonic()
+            total = self._hits + self._misses
+            return {
+                'nome': self.name,
+                'entradas': sum(1 for _, expires in self._entries.values() if now < expires),
+                'ttl_segundos': self.ttl,
+                'acertos': self._hits,
+                'falhas': self._misses,
+                'taxa_acerto': round(self._hits / total, 3) if total else None
+            }
@@ -0,0 +1,228 @@
+"""
+Topologia dos relógios de ponto: grupos (locais de ponto) e mapeamento de IDs.
+
+Os grupos ficam nas tabelas `grupos_relogio` / `grupos_relogio_relogios` (editadas na
+tela de administração) e são compilados em índices imutáveis em memória, para que as
+consultas por relógio (local de uma marcação, grupos de um conjunto de relógios) sejam
+O(1) sem nenhuma consulta ao banco por requisição. Cada alteração incrementa um contador
+de versão na tabela `settings`; o processo que alterou recarrega na hora e os demais
+percebem a nova versão pelo watcher em segundo plano (start_reload_watcher).
+
+Os relógios 33 e 34 da API do Kairos aparecem no site (URL de AgendarOperacaoRelogio)
+e no banco como 35 e 36; to_api_clock_ids / to_url_clock_ids fazem essa conversão.
+"""
+import threading
+import time
+from types import MappingProxyType
+
+from sqlalchemy import Integer, String, cast
+from sqlalchemy.exc import IntegrityError
+
+from config import Config
+from database import get_db_session
+from db_setup import GrupoRelogio, GrupoRelogioRelogio, Setting
+
+VERSION_SETTING_KEY = 'grupos_relogio_versao'
+
+# Grupos padrão: usados para popular as tabelas e enquanto o banco não pôde ser lido
+CLOCK_GROUPS = {
+    "P10": [1, 11, 23, 29],
+    "COCA": [3, 14, 31],
+    "CANTEIRO III": [18, 22, 24, 25],
+    "PIPE MARABA": [5, 9, 20],
+    "OFICINA II": [8],
+    "PIPE SAO FELIX": [2, 4, 10, 19, 21, 28],
+    "TREINAMENTO": [16],
+    "MUTRAN CANTEIRO IV": [13, 17],
+    "TERRAPLENAGEM III": [6, 12],
+    "TENDA MOTORISTAS III": [26],
+    "NAUTICA": [30],
+    "PI SAO FELIX": [33, 34, 35, 36],
+    "CENTRAL DE CONCRETO III": [7, 15],
+    "P12": [27, 32]
+}
+
+# IDs de relógio usados nas URLs do site/banco -> número do relógio na API REST
+URL_TO_API_CLOCK_ID = MappingProxyType({35: 33, 36: 34})
+API_TO_URL_CLOCK_ID = MappingProxyType({api: url for url, api in URL_TO_API_CLOCK_ID.items()})
+
+# Relógios percorridos pela automação quando nenhum é informado (IDs de URL)
+DEFAULT_URL_CLOCK_IDS = tuple(range(1, 33)) + (35, 36)
+
+
+def _as_clock_id(clock_id):
+    try:
+        return int(clock_id)
+    except (ValueError, TypeError):
+        return None
+
+
+class ClockTopology:
+    """Índices imutáveis dos grupos de relógios."""
+
+    def __init__(self, groups):
+        self.groups = MappingProxyType({name: tuple(ids) for name, ids in groups.items()})
+        self.group_sets = MappingProxyType({name: frozenset(ids) for name, ids in groups.items()})
+        self.location_names = tuple(sorted(groups))
+
+        reverse = {}
+        for name, ids in groups.items():
+            for cid in ids:
+                reverse.setdefault(cid, []).append(name)
+        self._locations = MappingProxyType({cid: tuple(names) for cid, names in reverse.items()})
+
+    def locations_of(self, clock_id):
+        """Todos os locais que contêm o relógio, na ordem de definição dos grupos."""
+        return self._locations.get(_as_clock_id(clock_id), ())
+
+    def location_of(self, clock_id):
+        """Local de ponto de um relógio ("" quando não pertence a nenhum grupo)."""
+        locations = self.locations_of(clock_id)
+        return locations[0] if locations else ""
+
+    def clock_ids(self, location):
+        """Relógios de um local (lista nova; vazia se o local não existir)."""
+        return list(self.groups.get(location, ()))
+
+    def groups_for(self, clock_ids):
+        """Locais que têm ao menos um dos relógios informados, na ordem de definição dos grupos."""
+        found = set()
+        for cid in clock_ids:
+            found.update(self.locations_of(cid))
+        return [name for name in self.groups if name in found]
+
+
+topology = ClockTopology(CLOCK_GROUPS)
+_version = None
+_reload_lock = threading.Lock()
+
+
+def seed_groups(db):
+    """Popula as tabelas com CLOCK_GROUPS se ainda não houver nenhum grupo. Retorna True se populou."""
+    if db.query(GrupoRelogio).first():
+        return False
+    for nome, ids in CLOCK_GROUPS.items():
+        grupo = GrupoRelogio(nome=nome)
+        db.add(grupo)
+        db.flush()
+        for cid in ids:
+            db.add(GrupoRelogioRelogio(grupo_id=grupo.id, relogio_id=cid))
+    bump_version(db)
+    db.commit()
+    return True
+
+
+def load_groups(db):
+    """Lê os grupos do banco como {nome: [relógios]}, na ordem de cadastro."""
+    grupos = db.query(GrupoRelogio).order_by(GrupoRelogio.id).all()
+    groups = {grupo.nome: [] for grupo in grupos}
+    nomes = {grupo.id: grupo.nome for grupo in grupos}
+    items = db.query(GrupoRelogioRelogio).order_by(GrupoRelogioRelogio.grupo_id, GrupoRelogioRelogio.relogio_id)
+    for item in items:
+        if item.grupo_id in nomes:
+            groups[nomes[item.grupo_id]].append(item.relogio_id)
+    return groups
+
+
+def _read_version(db):
+    setting = db.query(Setting).filter_by(key=VERSION_SETTING_KEY).first()
+    return int(setting.value) if setting else 0
+
+
+def bump_version(db):
+    """
+    Incrementa o contador de versão num único UPDATE no banco (o commit fica com o chamador).
+    Ler e incrementar em Python deixaria dois salvamentos simultâneos gravarem o mesmo número,
+    e os processos que recarregaram depois do primeiro nunca veriam o segundo.
+    """
+    if _increment_version(db):
+        return
+    try:
+        with db.begin_nested():
+            db.add(Setting(key=VERSION_SETTING_KEY, value='1'))
+    except IntegrityError:
+        # Outro processo criou o contador ao mesmo tempo: incrementa o dele
+        _increment_version(db)
+
+
+def _increment_version(db):
+    atualizados = db.query(Setting).filter_by(key=VERSION_SETTING_KEY).update(
+        {Setting.value: cast(cast(Setting.value, Integer) + 1, String(500))},
+        synchronize_session=False
+    )
+    return atualizados > 0
+
+
+def reload(db, force=False):
+    """Recompila a topologia a partir do banco se a versão mudou. Retorna True se recarregou."""
+    global topology, _version
+    with _reload_lock:
+        version = _read_version(db)
+        if not force and version == _version:
+            return False
+        groups = load_groups(db)
+        # Sem versão gravada as tabelas ainda não foram populadas: mantém os grupos padrão
+        if groups or version:
+            # Troca atômica: leitores em andamento continuam com os índices antigos
+            topology = ClockTopology(groups)
+        _version = version
+        return True
+
+
+def _reload_watcher(interval):
+    while True:
+        time.sleep(interval)
+        db = get_db_session()
+        try:
+            if reload(db):
+                print(f"[GRUPOS RELÓGIO] Topologia recarregada (versão {_version}).")
+        except Exception as e:
+            print(f"[GRUPOS RELÓGIO] Erro ao verificar versão dos grupos: {e}")
+        finally:
+            db.close()
+
+
+def start_reload_watcher():
+    """Carrega os grupos do banco e passa a verificar o contador de versão periodicamente."""
+    db = get_db_session()
+    try:
+        reload(db, force=True)
+    except Exception as e:
+        print(f"[GRUPOS RELÓGIO] Erro ao carregar grupos do banco, usando grupos padrão: {e}")
+    finally:
+        db.close()
+
+    thread = threading.Thread(
+        target=_reload_watcher,
+        args=(Config.GRUPOS_RELOGIO_RECARGA_SEGUNDOS,),
+        daemon=True,
+        name='grupos-relogio-watcher'
+    )
+    thread.start()
+    return thread
+
+
+def location_names():
+    return topology.location_names
+
+
+def location_of(clock_id):
+    return topology.location_of(clock_id)
+
+
+def clock_ids(location):
+    return topology.clock_ids(location)
+
+
+def groups_for(ids):
+    return topology.groups_for(ids)
+
+
+def to_api_clock_ids(ids):
+    """Converte IDs de URL/banco (35, 36) para os números da API (33, 34), sem duplicatas e mantendo a ordem."""
+    return list(dict.fromkeys(URL_TO_API_CLOCK_ID.get(cid, cid) for cid in ids))
+
+
+def to_url_clock_ids(ids):
+    """Converte números da API (33, 34) para os IDs usados nas URLs do site (35, 36)."""
+    return [API_TO_URL_CLOCK_ID.get(cid, cid) for cid in ids]
@@ -24,9 +24,32 @@ class Config:
     SQLALCHEMY_DATABASE_URI = f"mssql+pyodbc:///?odbc_connect={params}"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Servidor web (waitress)
+    WAITRESS_THREADS = int(os.environ.get('WAITRESS_THREADS', 12))
+
     # Kairos API
-    KAIROS_API_URL = "https://www.dimepkairos.com.br/RestServiceApi/Appointment/GetAppointmentsV2"
-    KAIROS_SEARCH_PEOPLE_URL = "https://www.dimepkairos.com.br/RestServiceApi/People/SearchPeople"
+    KAIROS_BASE_URL = "https://www.dimepkairos.com.br/RestServiceApi"
+    KAIROS_API_URL = f"{KAIROS_BASE_URL}/Appointment/GetAppointmentsV2"
+    KAIROS_SEARCH_PEOPLE_URL = f"{KAIROS_BASE_URL}/People/SearchPeople"
+    # Threads usadas para buscar em paralelo as páginas 2..TotalPagina de uma consulta
+    KAIROS_PAGE_WORKERS = int(os.environ.get('KAIROS_PAGE_WORKERS', 6))
+    # Blocos de datas buscados em paralelo nas consultas longas (ex.: exportação CSV de 185 dias)
+    KAIROS_CHUNK_WORKERS = int(os.environ.get('KAIROS_CHUNK_WORKERS', 4))
+    # Crachás consultados em paralelo (SearchPerson) ao executar agendamentos, associações e desligamentos
+    KAIROS_CRACHA_WORKERS = int(os.environ.get('KAIROS_CRACHA_WORKERS', 6))
+    # Validade do cache de consultas de crachá (SearchPerson); 12h cobre o desbloqueio do interstício (0 desativa)
+    CRACHA_CACHE_TTL_MINUTOS = int(os.environ.get('CRACHA_CACHE_TTL_MINUTOS', 720))
+    # Dias em que "possui biometria" vale sem baixar os templates de novo (pessoas sem biometria são sempre reverificadas)
+    BIOMETRIA_REVALIDAR_DIAS = int(os.environ.get('BIOMETRIA_REVALIDAR_DIAS', 7))
+    # Limite de requisições por segundo ao Kairos (0 desativa) e rajada máxima permitida. Vale por processo:
+    # com o servidor web e `python -m scheduler` rodando juntos o total chega a N vezes o valor, então divida-o entre eles
+    KAIROS_RATE_LIMIT = float(os.environ.get('KAIROS_RATE_LIMIT', 8))
+    KAIROS_RATE_BURST = int(os.environ.get('KAIROS_RATE_BURST', 8))
+    # Conexões keep-alive mantidas no pool do cliente HTTP compartilhado (kairos_client.py);
+    # 0 calcula pelo máximo de requisições simultâneas que as threads configuradas podem fazer
+    KAIROS_POOL_SIZE = int(os.environ.get('KAIROS_POOL_SIZE', 0))
+    KAIROS_MAX_RETRIES = int(os.environ.get('KAIROS_MAX_RETRIES', 5))
+    KAIROS_BACKOFF_FACTOR = float(os.environ.get('KAIROS_BACKOFF_FACTOR', 0.5))
     KAIROS_HEADERS = {
         "Content-Type": "application/json",
         "key": os.environ.get('KAIROS_KEY'),
@@ -34,6 +57,60 @@ class Config:
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
     }
 
+    # Cache do diretório de pessoas do Kairos (SearchPeople) usado pelos relatórios
+    DIRETORIO_CACHE_TTL_MINUTOS = int(os.environ.get('DIRETORIO_CACHE_TTL_MINUTOS', 60))
+
+    # Crachás enviados em cada chamada GetAppointmentsV2 da consulta de Locais de Ponto
+    LOCAIS_PONTO_CRACHAS_POR_LOTE = int(os.environ.get('LOCAIS_PONTO_CRACHAS_POR_LOTE', 50))
+    # Consultas de Locais de Ponto em segundo plano: jobs simultâneos e horas que o resultado fica disponível
+    LOCAIS_PONTO_JOB_WORKERS = int(os.environ.get('LOCAIS_PONTO_JOB_WORKERS', 2))
+    LOCAIS_PONTO_JOB_RETENCAO_HORAS = int(os.environ.get('LOCAIS_PONTO_JOB_RETENCAO_HORAS', 24))
+
+    # Intervalo para outros processos perceberem alterações nos grupos de relógios (locais de ponto)
+    GRUPOS_RELOGIO_RECARGA_SEGUNDOS = int(os.environ.get('GRUPOS_RELOGIO_RECARGA_SEGUNDOS', 30))
+
+    # Fila de agendamentos: espera máxima do worker entre verificações (normalmente ele dorme até o
+    # próximo vencimento e é acordado ao criar/remover agendamentos) e workers dedicados aos imediatos
+    AGENDAMENTO_INTERVALO_SEGUNDOS = int(os.environ.get('AGENDAMENTO_INTERVALO_SEGUNDOS', 300))
+    AGENDAMENTO_WORKERS_IMEDIATOS = int(os.environ.get('AGENDAMENTO_WORKERS_IMEDIATOS', 1))
+    AGENDAMENTO_WORKERS = int(os.environ.get('AGENDAMENTO_WORKERS', 1))
+    # Agendamentos executados ao mesmo tempo por worker (jobs com relógios em comum continuam um de cada vez)
+    AGENDAMENTO_JOBS_SIMULTANEOS = int(os.environ.get('AGENDAMENTO_JOBS_SIMULTANEOS', 4))
+    # Agendamentos vencidos com os mesmos comandos e relógios, com horários a até N segundos um do outro,
+    # vão numa única chamada ao ScheduleCommands (janela 0 desativa); máximo de agendamentos por chamada
+    AGENDAMENTO_AGRUPAR_JANELA_SEGUNDOS = int(os.environ.get('AGENDAMENTO_AGRUPAR_JANELA_SEGUNDOS', 60))
+    AGENDAMENTO_AGRUPAR_MAXIMO = int(os.environ.get('AGENDAMENTO_AGRUPAR_MAXIMO', 20))
+    # Progresso dos agendamentos em execução: intervalo mínimo entre gravações no banco / atualizações da tela,
+    # e duração máxima de cada conexão SSE da tela de Comandos Agendados (o navegador reconecta)
+    AGENDAMENTO_PROGRESSO_INTERVALO_SEGUNDOS = int(os.environ.get('AGENDAMENTO_PROGRESSO_INTERVALO_SEGUNDOS', 2))
+    AGENDAMENTO_PROGRESSO_STREAM_SEGUNDOS = int(os.environ.get('AGENDAMENTO_PROGRESSO_STREAM_SEGUNDOS', 120))
+
+    # Automação dos relógios (Playwright): navegadores mantidos abertos e autenticados, e minutos
+    # sem uso até um navegador ser fechado para liberar memória
+    AUTOMACAO_NAVEGADORES = int(os.environ.get('AUTOMACAO_NAVEGADORES', 2))
+    AUTOMACAO_NAVEGADOR_OCIOSO_MINUTOS = int(os.environ.get('AUTOMACAO_NAVEGADOR_OCIOSO_MINUTOS', 60))
+    # Navegadores usados ao mesmo tempo por uma execução (os relógios são divididos entre eles)
+    AUTOMACAO_RELOGIOS_PARALELOS = int(os.environ.get('AUTOMACAO_RELOGIOS_PARALELOS', 2))
+    # Backend da automação: 'http' (requisições diretas ao site, sem renderizar páginas) ou 'navegador' (Playwright);
+    # com o fallback ativo, os relógios que falharem via HTTP são refeitos no navegador. Só a data e hora tem
+    # envio via HTTP: reposição do ponteiro e importações sempre rodam no navegador
+    AUTOMACAO_BACKEND = os.environ.get('AUTOMACAO_BACKEND', 'http').lower()
+    AUTOMACAO_HTTP_FALLBACK = os.environ.get('AUTOMACAO_HTTP_FALLBACK', 'true').lower() in ('1', 'true', 'sim', 'yes')
+    # false: o servidor web não executa agendamentos; eles ficam com o processo `python -m scheduler`
+    AGENDAMENTO_EMBUTIDO = os.environ.get('AGENDAMENTO_EMBUTIDO', 'true').lower() in ('1', 'true', 'sim', 'yes')
+    # Espera máxima do `python -m scheduler`: ele não recebe o aviso das rotas do servidor web, então verifica a fila com frequência
+    AGENDAMENTO_SCHEDULER_INTERVALO_SEGUNDOS = int(os.environ.get('AGENDAMENTO_SCHEDULER_INTERVALO_SEGUNDOS', 5))
+
+    # Armazém local de marcações (tabela marcacoes, sincronizada por marcacoes_sync.py)
+    MARCACOES_SYNC_ATIVO = os.environ.get('MARCACOES_SYNC_ATIVO', 'true').lower() in ('1', 'true', 'sim', 'yes')
+    # Dias mais recentes que ainda podem mudar no Kairos e por isso são sempre consultados na API
+    MARCACOES_JANELA_MUTAVEL_DIAS = int(os.environ.get('MARCACOES_JANELA_MUTAVEL_DIAS', 7))
+    # Quantos dias de histórico manter sincronizados
+    MARCACOES_HISTORICO_DIAS = int(os.environ.get('MARCACOES_HISTORICO_DIAS', 185))
+    MARCACOES_SYNC_INTERVALO_MINUTOS = int(os.environ.get('MARCACOES_SYNC_INTERVALO_MINUTOS', 30))
+    # Limite de dias antigos baixados por ciclo (a carga inicial é distribuída em vários ciclos)
+    MARCACOES_SYNC_DIAS_POR_CICLO = int(os.environ.get('MARCACOES_SYNC_DIAS_POR_CICLO', 31))
+
 def get_local_now():
     try:
         import zoneinfo
@@ -0,0 +1,11 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from config import Config
+
+# Engine/Session compartilhados pela aplicação web e pelos workers em segundo plano
+# fast_executemany: inserções em lote (ex.: sincronização de marcações) num único round-trip do pyodbc
+engine = create_engine(Config.SQLALCHEMY_DATABASE_URI, fast_executemany=True)
+Session = sessionmaker(bind=engine)
+
+def get_db_session():
+    return Session()
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, text, ForeignKey
+from sqlalchemy import create_engine, Column, Integer, String, Date, DateTime, Boolean, text, ForeignKey
 from sqlalchemy.orm import declarative_base, sessionmaker
 from werkzeug.security import generate_password_hash
 import datetime
@@ -107,9 +107,26 @@ class AgendamentoComando(Base):
     resultado = Column(String(8000), nullable=True)
     sucesso_file = Column(String(500), nullable=True)
     falha_file = Column(String(500), nullable=True)
+    prioridade = Column(Integer, nullable=True, default=1)  # 0 = imediato, 1 = agendado (menor executa primeiro)
+    worker = Column(String(100), nullable=True)  # Worker que reservou o agendamento na fila
+    iniciado_em = Column(DateTime, nullable=True)  # Momento em que o worker reservou o agendamento
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
 
+class ProgressoAgendamento(Base):
+    # Andamento da execução de um agendamento, gravado em lotes pelo worker (ver job_progress.py)
+    __tablename__ = 'agendamento_progresso'
+    agendamento_id = Column(Integer, ForeignKey('agendamento_comandos.id'), primary_key=True)
+    fase = Column(String(50), nullable=False)  # consultando_crachas, agendando, gerando_arquivos, concluido, erro
+    crachas_total = Column(Integer, nullable=False, default=0)
+    crachas_resolvidos = Column(Integer, nullable=False, default=0)
+    crachas_falha = Column(Integer, nullable=False, default=0)
+    iniciado_em = Column(DateTime, nullable=False)
+    finalizado_em = Column(DateTime, nullable=True)
+    duracao_segundos = Column(Integer, nullable=True)
+    atualizado_em = Column(DateTime, nullable=False)
+
+
 class ComandoRecorrente(Base):
     __tablename__ = 'comandos_recorrentes'
     id = Column(Integer, primary_key=True)
@@ -122,6 +139,89 @@ class ComandoRecorrente(Base):
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
 
+class GrupoRelogio(Base):
+    # Local de ponto (grupo de relógios); carregado em memória por clock_topology.py
+    __tablename__ = 'grupos_relogio'
+    id = Column(Integer, primary_key=True)
+    nome = Column(String(100), unique=True, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class GrupoRelogioRelogio(Base):
+    __tablename__ = 'grupos_relogio_relogios'
+    grupo_id = Column(Integer, ForeignKey('grupos_relogio.id'), primary_key=True)
+    relogio_id = Column(Integer, primary_key=True)  # ID do relógio como usado no banco/URL (35 e 36 = relógios 33 e 34 da API)
+
+
+class Marcacao(Base):
+    # Cópia local das marcações do GetAppointmentsV2 (ver marcacoes_sync.py)
+    __tablename__ = 'marcacoes'
+    id = Column(Integer, primary_key=True)
+    data = Column(Date, nullable=False, index=True)
+    hora = Column(Integer, nullable=False)
+    minuto = Column(Integer, nullable=False)
+    matricula = Column(String(50), nullable=False, index=True)  # Matrícula interna do Kairos (não é o crachá)
+    relogio_id = Column(Integer, nullable=True, index=True)
+    numero_serie_rep = Column(String(100), nullable=True)
+
+
+class MarcacaoSincronizacao(Base):
+    __tablename__ = 'marcacoes_sincronizacao'
+    data = Column(Date, primary_key=True)
+    sincronizado_em = Column(DateTime, nullable=False)
+    total_registros = Column(Integer, default=0)
+    definitivo = Column(Boolean, default=False)  # True quando sincronizado após o dia sair da janela mutável
+
+
+
+class PessoaDiretorio(Base):
+    # Cópia persistida do diretório SearchPeople do Kairos (ver diretorio_pessoas.py)
+    __tablename__ = 'diretorio_pessoas'
+    matricula = Column(String(50), primary_key=True)  # Matrícula interna do Kairos
+    nome = Column(String(200), nullable=True)
+    cracha = Column(String(50), nullable=True, index=True)
+    kairos_id = Column(Integer, nullable=True)
+    atualizado_em = Column(DateTime, nullable=False)
+
+
+class BiometriaPessoa(Base):
+    # Se a pessoa tem biometria cadastrada no Kairos, para evitar baixar os templates a cada consulta (ver biometria_pessoas.py)
+    __tablename__ = 'biometria_pessoas'
+    kairos_id = Column(Integer, primary_key=True)  # Id da pessoa no Kairos
+    cracha = Column(String(50), nullable=True, index=True)  # Crachá normalizado da última consulta
+    possui_biometria = Column(Boolean, nullable=False)
+    verificado_em = Column(DateTime, nullable=False)
+
+
+class ExecucaoAutomacao(Base):
+    # Uma execução da automação dos relógios (manual, recorrente ou refazendo falhas); ver automacao_resultados.py
+    __tablename__ = 'automacao_execucoes'
+    id = Column(Integer, primary_key=True)
+    tipo = Column(String(50), nullable=False)  # 'datahora' ou 'ponteiro'
+    data_personalizada = Column(String(10), nullable=True)  # Data da reposição do ponteiro (DD/MM/AAAA)
+    origem = Column(String(50), nullable=False)  # manual, recorrente, refazer
+    usuario = Column(String(100), nullable=True)
+    backend = Column(String(20), nullable=True)  # http ou navegador
+    plano = Column(String(4000), nullable=False)  # JSON {fase: [relógios]} com as etapas planejadas
+    refaz_execucao_id = Column(Integer, ForeignKey('automacao_execucoes.id'), nullable=True)  # Execução cujas falhas foram refeitas
+    status = Column(String(50), nullable=False)  # Executando, Concluída, Com falhas, Interrompida
+    iniciado_em = Column(DateTime, nullable=False)
+    finalizado_em = Column(DateTime, nullable=True)
+    duracao_segundos = Column(Integer, nullable=True)
+
+
+class ResultadoAutomacao(Base):
+    # Resultado de uma fase da automação em um relógio
+    __tablename__ = 'automacao_resultados'
+    id = Column(Integer, primary_key=True)
+    execucao_id = Column(Integer, ForeignKey('automacao_execucoes.id'), nullable=False, index=True)
+    relogio_id = Column(Integer, nullable=False)  # ID de URL do relógio (35 e 36 = relógios 33 e 34 da API)
+    fase = Column(String(20), nullable=False)  # datahora, reposicao, marcacoes, status
+    sucesso = Column(Boolean, nullable=False)
+    erro = Column(String(1000), nullable=True)
+    backend = Column(String(20), nullable=False)  # Backend que executou a fase (http ou navegador)
+    duracao_ms = Column(Integer, nullable=False)
+    registrado_em = Column(DateTime, nullable=False)
+
 HORARIOS = [{'codigo': '3001900001', 'descricao': 'Seg. à Qui. 07:00 às 17:00 / Sex 07:00 às 16:00 / Almoço rigido 12:00 às 13:00'}, {'codigo': '3001900025', 'descricao': 'Seg. à Sex. 07:00 as 13:00 - Estagiario'}, {'codigo': '3001900006', 'descricao': 'Seg. à Qui. 16:30 às 02:00 / Sex. 15:30 às 00:00 - / Almoço 19:30 às 20:30'}, {'codigo': '3001900010', 'descricao': 'Seg à Qui. 23:00 às 08:00/ Sex 23:00 às 07:00 / Janta 03:00 ás 04:00'}, {'codigo': '3001900026', 'descricao': 'HORARIO -  Seg. a Qui. 07:00 às 16:00 (APENAS COM AUTORIZAÇÃO QUE PODE SE USAR)'}, {'codigo': '3001900037', 'descricao': 'Seg. á Qui. 17:00 às 02:22 / Sex. 16:00 ás 00:37 / Janta 21:00 às 22:00'}, {'codigo': '3001900019', 'descricao': 'Seg à Qui. 05:00 às 15:00 / Sex 05:00 às 14:00 / Almoço 11:00 às 12:00'}, {'codigo': '3001900023', 'descricao': 'Seg. à Qui. 22:00 às 07:00 / Sex 22:00 ás 06:00 / Janta 23:30 ás 00:30'}, {'codigo': '3001900003', 'descricao': 'Seg. à Qui. 14:00 às 23:45 / Sex. 13:00 às 22:00 - / Almoço 18:00 às 19:00'}, {'codigo': '3001900020', 'descricao': 'Seg. á Qui. 17:30 às 02:46 / Sex. 16:30 ás 01:46 / Almoço 22:30: às 23:30'}, {'codigo': '3001900002', 'descricao': 'Seg. à Sex. 07:00 às 14:00 / Almoço rigido 12:00 às 13:00'}, {'codigo': '3001900017', 'descricao': 'Seg à Qui. 21:00 às 06:09 / Sex 21:00 às 05:09 / Jantar 22:30 ás 23:30'}, {'codigo': '3001900009', 'descricao': 'Seg. à Sex. 13:00 às 17:00 - Jovem Aprendiz'}, {'codigo': '3001900008', 'descricao': 'Seg. à Sex. 07:00 às 11:00 - Jovem Aprendiz'}, {'codigo': '3001900005', 'descricao': 'Seg à Qui. 21:00 às 06:09 / Sex 21:00 às 05:09 / Janta 10:30 ás 11:30'}, {'codigo': '3001900021', 'descricao': 'Seg. à Sex. 08:00 às 12:00 - Jovem Aprendiz'}, {'codigo': '3001900022', 'descricao': 'Seg. à Sex. 14:00 às 18:00 - Jovem Aprendiz'}, {'codigo': '3001900024', 'descricao': 'MARITIMO - NAUTICA'}, {'codigo': '3001900007', 'descricao': 'Seg. á Qui. 19:00 às 04:20 / Sex. 19:00 ás 03:00 / Almoço 22:00 às 23:00'}, {'codigo': '3001900038', 'descricao': 'JORNADA - 1 - 12 x 36 - Seg. á Sex. 07:00 ás 19:00 / Almoço  12:00 às 13:00'}, {'codigo': '3001900044', 'descricao': 'Seg. à Sex. 07:00 às 10:00 - Medico do trabalho 02'}, {'codigo': '3001900041', 'descricao': 'JORNADA - 12 x 36 -Seg. á Sext.19:00 às 07:00   / janta 22:00  às 23:00'}]
 
 SECOES = [{'codigo': '0004.002.30019.2.00100', 'descricao': 'CONSORCIO PONTE RIO TOCANTINS MOI - ADMINISTRAÇÃO'}, {'codigo': '0004.002.30019.2.21000', 'descricao': 'CPRT  - GSB -  ADM'}, {'codigo': '0004.002.30019.2.15000', 'descricao': 'CPRT  - GEN -  ADM'}, {'codigo': '0004.002.30019.2.18001', 'descricao': 'CPRT - GPC -  CENTRAIS ARMACAO E CARPINTARIA'}, {'codigo': '0004.002.30019.2.20008', 'descricao': 'CPRT  - GPC -  FUNDACAO'}, {'codigo': '0004.002.30019.2.14001', 'descricao': 'CPRT  - GSU -  OPERACIONAL'}, {'codigo': '0004.002.30019.2.00003', 'descricao': 'CONSORCIO PONTE RIO TOCANTINS MOD - PRODUÇÃO TERRAPLENAGEM'}, {'codigo': '0004.002.30019.2.19001', 'descricao': 'CPRT  - GPT -  TERRAPLENAGEM'}, {'codigo': '0004.002.30019.2.17002', 'descricao': 'CPRT  - GQL -  LABORATORIO'}, {'codigo': '0004.002.30019.2.00002', 'descricao': 'CONSORCIO PONTE RIO TOCANTINS MOD - PRODUÇÃO OAE DIR'}, {'codigo': '0004.002.30019.2.20010', 'descricao': 'CPRT  - GPC -  MONTAGEM DE PRE-MOLDADOS E EXECUCAO IN-LOCO'}, {'codigo': '0004.002.30019.2.20005', 'descricao': 'CPRT  - GEQ -  MOVIMENTACAO DE CARGA'}, {'codigo': '0004.002.30019.2.13000', 'descricao': 'CPRT  - GAF -  ADM'}, {'codigo': '0004.002.30019.2.18002', 'descricao': 'CPRT - GPC -\xa0 PIPE-SHOP / EMPURRE SUPERESTRUTURA'}, {'codigo': '0004.002.30019.2.15001', 'descricao': 'CPRT  - GEN -  OPERACIONAL'}, {'codigo': '0004.002.30019.2.20004', 'descricao': 'CPRT  - GEQ  -  ELETRICA'}, {'codigo': '0004.002.30019.2.20006', 'descricao': 'CPRT  - GPC -  CENTRAIS DE CONCRETO'}, {'codigo': '0004.002.30019.2.00102', 'descricao': 'CONSORCIO PONTE RIO TOCANTINS MOI - EQUIPAMENTOS'}, {'codigo': '0004.002.30019.2.18003', 'descricao': 'CPRT  - GPC -  OBRAS CIVIS EM GERAL'}, {'codigo': '0004.002.30019.2.16001', 'descricao': 'CPRT  - GPL -  OPERACIONAL'}, {'codigo': '0004.002.30019.2.14000', 'descricao': 'CPRT  - GSU -  ADM'}, {'codigo': '0004.002.30019.2.13001', 'descricao': 'CPRT  - GAF -  TRANSPORTE'}, {'codigo': '0004.002.30019.2.00109', 'descricao': 'CONSORCIO PONTE RIO TOCANTINS MOI -  SUSTENTABILIDADE'}, {'codigo': '0004.002.30019.2.20000', 'descricao': 'CPRT  - GEQ -  ADM'}, {'codigo': '0004.002.30019.2.20003', 'descricao': 'CPRT  - GEQ  -  MANUTENCAO EQUIPAMENTOS'}, {'codigo': '0004.002.30019.2.00101', 'descricao': 'CONSORCIO PONTE RIO TOCANTINS MOI - ENGENHARIA OPERACIONAL'}, {'codigo': '0004.002.30019.2.17000', 'descricao': 'CPRT  - GQL -  ADM'}, {'codigo': '0004.002.30019.2.20002', 'descricao': 'CPRT  - GEQ -  LUBRIFICACAO E LAVAGEM'}, {'codigo': '0004.002.30019.2.00106', 'descricao': 'CONSORCIO PONTE RIO TOCANTINS MOI -  PLANEJAMENTO'}, {'codigo': '0004.002.30019.2.16000', 'descricao': 'CPRT  - GPL -  ADM'}, {'codigo': '0004.002.30019.2.00103', 'descricao': 'CONSORCIO PONTE RIO TOCANTINS MOI - EQUIPAMENTOS MANUTENÇÃO'}, {'codigo': '0004.002.30019.2.00104', 'descricao': 'CONSORCIO PONTE RIO TOCANTINS MOI -  MOVIMENTAÇÃO DE CARGA'}, {'codigo': '0004.002.30019.2.00108', 'descricao': 'CONSORCIO PONTE RIO TOCANTINS MOI -  SUPRIMENTOS'}, {'codigo': '0004.002.30019.2.17001', 'descricao': 'CPRT  - GQL -  QUALIDADE OPERACIONAL'}, {'codigo': '0004.002.30019.2.20009', 'descricao': 'CPRT  - GPC -  ATIVIDADE NAUTICA'}, {'codigo': '0004.002.30019.2.19000', 'descricao': 'CPRT  - GPT -  ADM'}, {'codigo': '0004.002.30019.2.00107', 'descricao': 'CONSORCIO PONTE RIO TOCANTINS MOI -  QUALIDADE'}, {'codigo': '0004.002.30019.2.22000', 'descricao': 'CPRT  - GPF -  ADM'}, {'codigo': '0004.002.30019.2.18004', 'descricao': 'CPRT - GPC -\xa0 LADO MARABA PIPE-SHOP / EMPURRE SUPERESTRUTURA'}, {'codigo': '0004.002.30019.2.22001', 'descricao': 'CPRT  - GPF -  OPERACIONAL'}, {'codigo': '0004.002.30019.2.21001', 'descricao': 'CPRT  - GSB -  OPERACIONAL'}, {'codigo': '0004.002.30019.2.18000', 'descricao': 'CPRT  - GPC -  ADM'}, {'codigo': '0004.002.30019.2.12000', 'descricao': 'CPRT  - GAC - ADM'}, {'codigo': '0004.002.30019.2.19003', 'descricao': 'CPRT  - GPT -  DRENAGEM'}]
@@ -192,6 +292,15 @@ def seed_initial_data(session):
         session.rollback()
         print(f"Error seeding Gerência: {e}")
 
+    # 5. Seed Grupos de Relógios (locais de ponto)
+    try:
+        from clock_topology import seed_groups
+        if seed_groups(session):
+            print("Grupos de relógios seeded statically.")
+    except Exception as e:
+        session.rollback()
+        print(f"Error seeding Grupos de Relógios: {e}")
+
 # 3. Create Tables and Seed Admin
 def init_db():
     engine = create_engine(Config.SQLALCHEMY_DATABASE_URI)
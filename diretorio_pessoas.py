@@ -0,0 +1,120 @@
+"""
+Diretório de pessoas do Kairos (SearchPeople) persistido no banco.
+
+O diretório completo fica na tabela `diretorio_pessoas` e o horário da última
+sincronização na tabela `settings`. Na subida da aplicação o cache em memória é
+preenchido a partir do banco, sem paginar o SearchPeople; depois disso cada recarga
+do cache grava no banco apenas as pessoas novas ou alteradas.
+
+A atualização é incremental só na gravação: o SearchPeople não tem filtro por data de
+alteração (o payload aceita apenas os filtros de pessoa e a paginação), então cada recarga
+ainda pagina o diretório inteiro. O que se evita é repaginar na subida da aplicação e
+regravar no banco as pessoas que não mudaram.
+"""
+import datetime
+
+from config import get_local_now
+from database import get_db_session
+from db_setup import PessoaDiretorio, Setting
+import kairos_client
+
+SYNC_SETTING_KEY = 'diretorio_pessoas_sincronizado_em'
+
+
+def _cracha_value(cracha):
+    # Mesmo tipo devolvido pelo SearchPeople (numérico sempre que possível)
+    if cracha is None:
+        return None
+    return int(cracha) if str(cracha).isdigit() else cracha
+
+
+def fetch_directory():
+    """
+    Fetches all employees from Kairos API and returns a dictionary
+    {Matricula: {'Nome': ..., 'Cracha': ..., 'Id': ...}}. Raises if nothing could be
+    loaded, so an empty directory is never cached or persisted.
+    """
+    directory = {}
+
+    # Pages that fail are skipped so a single bad page doesn't hide the whole directory
+    people = kairos_client.fetch_all_pages(kairos_client.SEARCH_PEOPLE, {}, fail_fast=False)
+    for person in people:
+        mat = person.get('Matricula')
+        if mat:
+            directory[str(mat)] = {'Nome': person.get('Nome'), 'Cracha': person.get('Cracha'), 'Id': person.get('Id')}
+
+    if not directory:
+        raise kairos_client.KairosError('Nenhuma pessoa retornada pelo SearchPeople')
+    return directory
+
+
+def load_snapshot(db):
+    """Retorna (diretorio, sincronizado_em) a partir do banco, ou (None, None) se ainda não houver cópia."""
+    setting = db.query(Setting).filter_by(key=SYNC_SETTING_KEY).first()
+    if not setting:
+        return None, None
+
+    directory = {
+        p.matricula: {'Nome': p.nome, 'Cracha': _cracha_value(p.cracha), 'Id': p.kairos_id}
+        for p in db.query(PessoaDiretorio)
+    }
+    if not directory:
+        return None, None
+    return directory, datetime.datetime.fromisoformat(setting.value)
+
+
+def save_snapshot(db, directory):
+    """
+    Grava no banco as pessoas novas ou alteradas do diretório. Pessoas que não vieram
+    na consulta são mantidas, já que uma página com erro não deve apagar ninguém.
+    Retorna a quantidade de registros gravados.
+    """
+    now = get_local_now().replace(tzinfo=None)
+    existing = {p.matricula: p for p in db.query(PessoaDiretorio)}
+
+    new_rows = []
+    changed = 0
+    for mat, info in directory.items():
+        nome = info.get('Nome')
+        cracha = str(info['Cracha']) if info.get('Cracha') is not None else None
+        kairos_id = info.get('Id')
+        row = existing.get(mat)
+        if row is None:
+            new_rows.append({'matricula': mat, 'nome': nome, 'cracha': cracha, 'kairos_id': kairos_id, 'atualizado_em': now})
+        elif (row.nome, row.cracha, row.kairos_id) != (nome, cracha, kairos_id):
+            row.nome, row.cracha, row.kairos_id, row.atualizado_em = nome, cracha, kairos_id, now
+            changed += 1
+
+    if new_rows:
+        db.bulk_insert_mappings(PessoaDiretorio, new_rows)
+
+    setting = db.query(Setting).filter_by(key=SYNC_SETTING_KEY).first()
+    if not setting:
+        setting = Setting(key=SYNC_SETTING_KEY, value='')
+        db.add(setting)
+    setting.value = now.isoformat()
+    db.commit()
+    return len(new_rows) + changed
+
+
+def refresh_directory():
+    """
+    Carrega o diretório completo do Kairos (sem filtro de alteração no SearchPeople) e grava
+    no banco só as diferenças (usado como loader do cache).
+    """
+    directory = fetch_directory()
+    db = get_db_session()
+    try:
+        written = save_snapshot(db, directory)
+        if written:
+            print(f"[DIRETORIO] {written} pessoas novas ou alteradas gravadas no banco.")
+    except Exception as e:
+        db.rollback()
+        print(f"[DIRETORIO] Erro ao gravar diretório no banco: {e}")
+    finally:
+        db.close()
+    return directory
+
+
+def snapshot_age_seconds(synced_at):
+    return max((get_local_now().replace(tzinfo=None) - synced_at).total_seconds(), 0)
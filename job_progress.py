@@ -0,0 +1,160 @@
+"""
+Andamento da execução dos agendamentos de comandos (tabela agendamento_progresso).
+
+O worker atualiza o progresso em memória a cada crachá consultado e só grava no banco
+em lotes: na troca de fase e no máximo a cada AGENDAMENTO_PROGRESSO_INTERVALO_SEGUNDOS.
+A tela de Comandos Agendados recebe as mudanças por SSE, sem recarregar a lista toda.
+Enquanto o job roda, uma thread de batimento regrava o progresso a cada intervalo mesmo
+sem novidades; um progresso não finalizado que parou de ser atualizado (worker caiu,
+processo reiniciou) é considerado expirado e aparece como erro.
+Agendamentos agrupados numa única chamada ao Kairos compartilham o progresso do grupo
+até o fim, quando cada um recebe as próprias contagens.
+"""
+import datetime
+import threading
+import time
+
+from config import Config, get_local_now
+from database import get_db_session
+from db_setup import ProgressoAgendamento
+
+FASE_CONSULTANDO_CRACHAS = 'consultando_crachas'
+FASE_AGENDANDO = 'agendando'
+FASE_GERANDO_ARQUIVOS = 'gerando_arquivos'
+FASE_CONCLUIDO = 'concluido'
+FASE_ERRO = 'erro'
+
+FASES_FINAIS = (FASE_CONCLUIDO, FASE_ERRO)
+
+# Intervalos sem atualização até um progresso não finalizado ser considerado abandonado
+EXPIRA_INTERVALOS = 5
+
+
+def update_interval():
+    """Segundos entre gravações/leituras do progresso; mínimo de 1, senão 0 vira um laço gravando no banco."""
+    return max(Config.AGENDAMENTO_PROGRESSO_INTERVALO_SEGUNDOS, 1)
+
+
+def _limite_expiracao():
+    segundos = max(update_interval() * EXPIRA_INTERVALOS, 30)
+    return get_local_now().replace(tzinfo=None) - datetime.timedelta(seconds=segundos)
+
+
+class JobProgress:
+    """Progresso de um agendamento (ou grupo de agendamentos) em execução."""
+
+    def __init__(self, job_ids, total):
+        self.job_ids = list(job_ids)
+        self.fase = FASE_CONSULTANDO_CRACHAS
+        self.total = total
+        self.resolvidos = 0
+        self.falhas = 0
+        self.iniciado_em = get_local_now().replace(tzinfo=None)
+        self._inicio = time.monotonic()
+        self._ultima_gravacao = None
+        self._lock = threading.Lock()
+        self._fim = threading.Event()
+        self._flush()
+        threading.Thread(target=self._heartbeat, daemon=True, name=f'progresso-{self.job_ids[0]}').start()
+
+    def _heartbeat(self):
+        intervalo = update_interval()
+        while not self._fim.wait(intervalo):
+            with self._lock:
+                vencido = time.monotonic() - self._ultima_gravacao >= intervalo
+            if vencido:
+                self._flush()
+
+    def badge_done(self, sucesso):
+        with self._lock:
+            if sucesso:
+                self.resolvidos += 1
+            else:
+                self.falhas += 1
+            vencido = time.monotonic() - self._ultima_gravacao >= update_interval()
+        if vencido:
+            self._flush()
+
+    def phase(self, fase):
+        with self._lock:
+            self.fase = fase
+        self._flush()
+
+    def finish(self, contagens=None, erro=False):
+        """
+        Grava o resultado final. `contagens` = {job_id: (resolvidos, falhas)} com os números
+        de cada agendamento; sem ele todos ficam com as contagens do grupo. Só a primeira
+        chamada grava.
+        """
+        if self._fim.is_set():
+            return
+        self._fim.set()
+        with self._lock:
+            self.fase = FASE_ERRO if erro else FASE_CONCLUIDO
+        self._flush(final=True, contagens=contagens or {})
+
+    def _flush(self, final=False, contagens=None):
+        with self._lock:
+            agora = get_local_now().replace(tzinfo=None)
+            valores = {
+                'fase': self.fase,
+                'crachas_total': self.total,
+                'crachas_resolvidos': self.resolvidos,
+                'crachas_falha': self.falhas,
+                'iniciado_em': self.iniciado_em,
+                'finalizado_em': agora if final else None,
+                'duracao_segundos': int(time.monotonic() - self._inicio) if final else None,
+                'atualizado_em': agora
+            }
+            self._ultima_gravacao = time.monotonic()
+
+        db = get_db_session()
+        try:
+            for job_id in self.job_ids:
+                linha = dict(valores, agendamento_id=job_id)
+                if contagens and job_id in contagens:
+                    resolvidos, falhas = contagens[job_id]
+                    linha.update(crachas_total=resolvidos + falhas, crachas_resolvidos=resolvidos, crachas_falha=falhas)
+                db.merge(ProgressoAgendamento(**linha))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"[AGENDAMENTO WORKER] Erro ao gravar progresso dos agendamentos {self.job_ids}: {e}")
+        finally:
+            db.close()
+
+
+def load(db, job_ids):
+    """{agendamento_id: progresso} dos agendamentos informados."""
+    if not job_ids:
+        return {}
+    rows = db.query(ProgressoAgendamento).filter(ProgressoAgendamento.agendamento_id.in_(job_ids))
+    return {row.agendamento_id: to_dict(row) for row in rows}
+
+
+def load_recent(db, desde):
+    """
+    Progresso dos agendamentos em execução e dos que foram atualizados a partir de `desde`.
+    Progressos abandonados (sem atualização há EXPIRA_INTERVALOS intervalos) não contam como em execução.
+    """
+    rows = db.query(ProgressoAgendamento).filter(
+        (ProgressoAgendamento.finalizado_em.is_(None) & (ProgressoAgendamento.atualizado_em >= _limite_expiracao()))
+        | (ProgressoAgendamento.atualizado_em >= desde)
+    )
+    return [to_dict(row) for row in rows]
+
+
+def to_dict(row):
+    fase = row.fase
+    if fase not in FASES_FINAIS and row.atualizado_em < _limite_expiracao():
+        fase = FASE_ERRO
+    return {
+        'agendamento_id': row.agendamento_id,
+        'fase': fase,
+        'crachas_total': row.crachas_total,
+        'crachas_resolvidos': row.crachas_resolvidos,
+        'crachas_falha': row.crachas_falha,
+        'iniciado_em': row.iniciado_em.strftime('%d/%m/%Y %H:%M:%S') if row.iniciado_em else None,
+        'finalizado_em': row.finalizado_em.strftime('%d/%m/%Y %H:%M:%S') if row.finalizado_em else None,
+        'duracao_segundos': row.duracao_segundos
+    }
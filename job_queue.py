@@ -0,0 +1,295 @@
+"""
+Fila de execução dos agendamentos de comandos (tabela agendamento_comandos).
+
+Os jobs são reservados de forma atômica no SQL Server (UPDATE ... OUTPUT sobre um
+SELECT TOP 1 com UPDLOCK/READPAST), então vários workers, na mesma ou em outras
+instâncias, podem consumir a fila sem executar o mesmo agendamento duas vezes.
+Agendamentos imediatos têm prioridade e uma raia própria de workers, para não
+esperarem atrás de agendamentos longos.
+
+Os workers não fazem polling fixo: dormem até o próximo vencimento (agendamento
+pendente mais próximo ou próximo disparo de comando recorrente, ver seconds_until)
+e quem insere ou remove um job chama notify() para acordá-los na hora.
+
+Jobs de relógios diferentes rodam em paralelo; ClockLocks serializa os jobs que
+compartilham algum relógio, dentro do processo e entre processos (um sp_getapplock
+por relógio).
+"""
+import datetime
+import os
+import socket
+import threading
+from contextlib import contextmanager
+
+from sqlalchemy import text
+
+from config import Config, get_local_now
+from database import engine
+from db_setup import AgendamentoComando
+
+# Menor valor = maior prioridade
+PRIORIDADE_IMEDIATA = 0
+PRIORIDADE_AGENDADA = 1
+
+# Raias de workers: 'imediata' só pega jobs imediatos; 'geral' pega qualquer job, por prioridade
+RAIA_IMEDIATA = 'imediata'
+RAIA_GERAL = 'geral'
+
+_CLAIM_SQL = text("""
+    WITH proximo AS (
+        SELECT TOP (1) status, worker, iniciado_em
+        FROM agendamento_comandos WITH (UPDLOCK, READPAST, ROWLOCK)
+        WHERE status = 'Pendente'
+          AND data_hora_execucao <= :agora
+          AND ISNULL(prioridade, :prioridade_padrao) <= :prioridade_maxima
+        ORDER BY ISNULL(prioridade, :prioridade_padrao) ASC, data_hora_execucao ASC, id ASC
+    )
+    UPDATE proximo
+    SET status = 'Executando', worker = :worker, iniciado_em = :agora
+    OUTPUT inserted.id
+""")
+
+# Agendamentos vencidos compatíveis com um job já reservado (mesmos comandos e relógios,
+# vencimento dentro da janela), reservados de uma vez para irem na mesma chamada ao Kairos
+_CLAIM_COMPATIBLE_SQL = text("""
+    WITH compativeis AS (
+        SELECT TOP (:limite) status, worker, iniciado_em
+        FROM agendamento_comandos WITH (UPDLOCK, READPAST, ROWLOCK)
+        WHERE status = 'Pendente'
+          AND data_hora_execucao <= :agora
+          AND data_hora_execucao BETWEEN :inicio AND :fim
+          AND comandos = :comandos
+          AND relogios = :relogios
+          AND ISNULL(prioridade, :prioridade_padrao) <= :prioridade_maxima
+        ORDER BY data_hora_execucao ASC, id ASC
+    )
+    UPDATE compativeis
+    SET status = 'Executando', worker = :worker, iniciado_em = :agora
+    OUTPUT inserted.id
+""")
+
+# Lock de aplicação com dono 'Session': fica com a conexão até ela ser fechada
+_APPLOCK_SQL = text("""
+    SET NOCOUNT ON;
+    DECLARE @resultado int;
+    EXEC @resultado = sp_getapplock @Resource = :resource, @LockMode = 'Exclusive', @LockOwner = 'Session', @LockTimeout = 0;
+    SELECT @resultado;
+""")
+
+# Lock de um relógio para os jobs de todos os processos; espera até o dono liberar
+_CLOCK_LOCK_SQL = text("""
+    SET NOCOUNT ON;
+    DECLARE @resultado int;
+    EXEC @resultado = sp_getapplock @Resource = :resource, @LockMode = 'Exclusive', @LockOwner = 'Session', @LockTimeout = -1;
+    SELECT @resultado;
+""")
+
+# Contador de notificações: o worker guarda o valor antes de consultar o banco e
+# espera ele mudar, então um notify() entre a consulta e a espera não se perde
+_wakeup = threading.Condition()
+_generation = 0
+
+
+def worker_name(raia, indice=0):
+    return f"{socket.gethostname()}:{os.getpid()}:{raia}-{indice}"
+
+
+def _prioridade_maxima(raia):
+    return PRIORIDADE_IMEDIATA if raia == RAIA_IMEDIATA else PRIORIDADE_AGENDADA
+
+
+def notify():
+    """Acorda os workers deste processo (chamar depois do commit que cria ou remove um agendamento)."""
+    global _generation
+    with _wakeup:
+        _generation += 1
+        _wakeup.notify_all()
+
+
+def generation():
+    with _wakeup:
+        return _generation
+
+
+def wait(timeout, desde):
+    """
+    Espera até um notify() posterior à geração `desde` ou até o timeout.
+    Retorna True se foi acordado por notify().
+    """
+    with _wakeup:
+        return _wakeup.wait_for(lambda: _generation != desde, timeout)
+
+
+def claim_next(db, worker, raia=RAIA_GERAL):
+    """
+    Reserva o próximo agendamento vencido (status passa para 'Executando') e o retorna,
+    ou None se não houver nenhum disponível para a raia.
+    """
+    prioridade_maxima = _prioridade_maxima(raia)
+    job_id = db.execute(_CLAIM_SQL, {
+        'agora': get_local_now().replace(tzinfo=None),
+        'worker': worker,
+        'prioridade_maxima': prioridade_maxima,
+        'prioridade_padrao': PRIORIDADE_AGENDADA
+    }).scalar()
+    db.commit()
+    if job_id is None:
+        return None
+    return db.query(AgendamentoComando).get(job_id)
+
+
+def claim_compatible(db, job, worker, raia=RAIA_GERAL):
+    """
+    Reserva os agendamentos vencidos que podem ser enviados junto com `job` numa única
+    chamada ao ScheduleCommands. Retorna a lista de ids (vazia se não houver ou se o
+    agrupamento estiver desativado).
+    """
+    janela = datetime.timedelta(seconds=Config.AGENDAMENTO_AGRUPAR_JANELA_SEGUNDOS)
+    limite = Config.AGENDAMENTO_AGRUPAR_MAXIMO - 1
+    if not janela or limite <= 0:
+        return []
+    job_ids = db.execute(_CLAIM_COMPATIBLE_SQL, {
+        'agora': get_local_now().replace(tzinfo=None),
+        'inicio': job.data_hora_execucao - janela,
+        'fim': job.data_hora_execucao + janela,
+        'comandos': job.comandos,
+        'relogios': job.relogios,
+        'worker': worker,
+        'limite': limite,
+        'prioridade_maxima': _prioridade_maxima(raia),
+        'prioridade_padrao': PRIORIDADE_AGENDADA
+    }).scalars().all()
+    db.commit()
+    return list(job_ids)
+
+
+class LeaderLock:
+    """
+    Eleição de líder entre processos pelo sp_getapplock do SQL Server, para tarefas que
+    não podem rodar em dois lugares ao mesmo tempo (ex.: disparo dos comandos recorrentes).
+    O lock fica preso a uma conexão dedicada, fora do pool; se a conexão cair o SQL Server
+    libera o lock e outro processo assume na próxima tentativa.
+    """
+
+    def __init__(self, resource):
+        self.resource = resource
+        self._conn = None
+
+    def acquire(self):
+        """Retorna True se este processo é (ou acabou de se tornar) o líder. Não bloqueia."""
+        if self._conn is not None:
+            try:
+                self._conn.execute(text("SELECT 1")).scalar()
+                return True
+            except Exception as e:
+                print(f"[AGENDAMENTO WORKER] Conexão do lock '{self.resource}' perdida: {e}")
+                self._discard()
+
+        conn = engine.connect()
+        try:
+            resultado = conn.execute(_APPLOCK_SQL, {'resource': self.resource}).scalar()
+            conn.commit()
+        except Exception:
+            conn.invalidate()
+            conn.close()
+            raise
+        if resultado is not None and resultado >= 0:
+            self._conn = conn
+            print(f"[AGENDAMENTO WORKER] Este processo assumiu o lock '{self.resource}'.")
+            return True
+        conn.close()
+        return False
+
+    def _discard(self):
+        # Descarta a conexão física (em vez de devolvê-la ao pool) para o lock não ficar preso nela
+        try:
+            self._conn.invalidate()
+            self._conn.close()
+        except Exception:
+            pass
+        self._conn = None
+
+
+@contextmanager
+def _database_clock_locks(clock_ids):
+    """
+    Reserva dos relógios entre processos: um sp_getapplock por relógio numa conexão dedicada,
+    pedidos em ordem crescente para dois processos nunca esperarem um pelo outro em ciclo.
+    """
+    if not clock_ids:
+        yield
+        return
+    conn = engine.connect()
+    try:
+        for clock_id in sorted(clock_ids):
+            resultado = conn.execute(_CLOCK_LOCK_SQL, {'resource': f'agendamento_relogio_{clock_id}'}).scalar()
+            conn.commit()
+            if resultado is None or resultado < 0:
+                raise RuntimeError(f"lock do relógio {clock_id} não obtido (sp_getapplock retornou {resultado})")
+        yield
+    finally:
+        # Descarta a conexão física (em vez de devolvê-la ao pool): os locks de sessão são liberados com ela
+        conn.invalidate()
+        conn.close()
+
+
+class ClockLocks:
+    """
+    Reserva de conjuntos de relógios: um job espera enquanto outro, deste ou de outro processo,
+    usa algum dos seus relógios.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._busy = set()
+
+    @contextmanager
+    def holding(self, clock_ids):
+        clock_ids = frozenset(clock_ids)
+        with self._cond:
+            # Reserva todos os relógios de uma vez, assim dois jobs nunca ficam esperando um pelo outro
+            self._cond.wait_for(lambda: not (clock_ids & self._busy))
+            self._busy |= clock_ids
+        try:
+            with _database_clock_locks(clock_ids):
+                yield
+        finally:
+            with self._cond:
+                self._busy -= clock_ids
+                self._cond.notify_all()
+
+    def busy(self):
+        with self._cond:
+            return set(self._busy)
+
+
+clock_locks = ClockLocks()
+
+
+def next_due(db, raia=RAIA_GERAL):
+    """Data/hora de execução do agendamento pendente mais próximo da raia (None se não houver)."""
+    query = db.query(AgendamentoComando.data_hora_execucao).filter(AgendamentoComando.status == 'Pendente')
+    if raia == RAIA_IMEDIATA:
+        query = query.filter(AgendamentoComando.prioridade == PRIORIDADE_IMEDIATA)
+    return query.order_by(AgendamentoComando.data_hora_execucao.asc()).limit(1).scalar()
+
+
+def next_recurrent_run(command, now):
+    """Próximo disparo de um ComandoRecorrente (datas locais sem fuso), com as mesmas regras do worker."""
+    hora, minuto = (int(parte) for parte in command.hora_execucao.split(':'))
+    dia = max(now.date(), command.data_inicio.date())
+    if command.ultimo_disparo and command.ultimo_disparo.date() >= dia:
+        dia = command.ultimo_disparo.date() + datetime.timedelta(days=1)
+    return datetime.datetime.combine(dia, datetime.time(hora, minuto))
+
+
+def seconds_until(due_times, now, maximo):
+    """
+    Segundos até o vencimento mais próximo, entre 1 e `maximo`. O máximo cobre jobs
+    gravados por outros processos e mudanças de relógio; o mínimo evita laço apertado
+    quando o job vencido está reservado por outro worker.
+    """
+    due_times = [d for d in due_times if d is not None]
+    if not due_times:
+        return maximo
+    return min(max((min(due_times) - now).total_seconds(), 1), maximo)
@@ -0,0 +1,272 @@
+"""
+Cliente HTTP compartilhado para a API REST do Kairos (dimepkairos.com.br).
+
+Todas as chamadas ao Kairos passam por aqui para reaproveitar conexões keep-alive
+(evitando um novo handshake TLS a cada requisição), aplicar uma única política de
+retry/backoff e usar timeouts definidos por endpoint.
+"""
+import datetime
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+from config import Config
+
+# Endpoints da API REST do Kairos (relativos a Config.KAIROS_BASE_URL)
+GET_APPOINTMENTS = "Appointment/GetAppointmentsV2"
+SEARCH_PEOPLE = "People/SearchPeople"
+SEARCH_PERSON = "People/SearchPerson"
+SEARCH_CLOCKS = "Clock/SearchClocks"
+SCHEDULE_COMMANDS = "Clock/ScheduleCommands"
+ASSOCIATE_CLOCKS = "Clock/AssociateClocks"
+UNASSOCIATE_CLOCKS = "Clock/UnassociateClocks"
+MARK_DISMISS = "Dismiss/MarkDismiss"
+
+# Timeouts (conexão, leitura) em segundos para cada endpoint
+DEFAULT_TIMEOUT = (10, 60)
+TIMEOUTS = {
+    GET_APPOINTMENTS: (10, 120),
+    SEARCH_PEOPLE: (10, 60),
+    SEARCH_PERSON: (10, 30),
+    SEARCH_CLOCKS: (10, 30),
+    SCHEDULE_COMMANDS: (10, 90),
+    ASSOCIATE_CLOCKS: (10, 90),
+    UNASSOCIATE_CLOCKS: (10, 90),
+    MARK_DISMISS: (10, 60),
+}
+
+# Endpoints que apenas consultam dados. Mesmo sendo POST, podem ser repetidos com
+# segurança em caso de erro 5xx ou queda de conexão. Os demais (envio de comandos,
+# associação, desligamento) só são repetidos quando a conexão nem chegou a ser aberta.
+IDEMPOTENT_ENDPOINTS = {GET_APPOINTMENTS, SEARCH_PEOPLE, SEARCH_PERSON, SEARCH_CLOCKS}
+
+
+class KairosError(Exception):
+    """Falha em uma consulta ao Kairos (HTTP diferente de 200 ou Sucesso = false)."""
+
+    def __init__(self, mensagem, http_status=None):
+        super().__init__(mensagem)
+        self.http_status = http_status
+
+
+class TokenBucket:
+    """
+    Limitador de taxa (token bucket) compartilhado entre threads.
+    Libera até `burst` requisições imediatas e depois `rate` requisições por segundo.
+    Com rate <= 0 o limite fica desativado.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.capacity = max(float(burst), 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# Limite de requisições ao Kairos deste processo (substitui as pausas fixas entre chamadas). Não é
+# coordenado entre processos: com vários processos o volume total é a soma dos limites de cada um
+rate_limiter = TokenBucket(Config.KAIROS_RATE_LIMIT, Config.KAIROS_RATE_BURST)
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _pool_size():
+    """
+    Tamanho do pool: KAIROS_POOL_SIZE, ou o pico de requisições simultâneas ao Kairos. Cada
+    bloco de uma consulta longa busca suas páginas com KAIROS_PAGE_WORKERS threads (o mesmo
+    vale para cada job de Locais de Ponto), cada agendamento em execução consulta crachás com
+    KAIROS_CRACHA_WORKERS threads, e cada thread do waitress pode fazer uma chamada direta.
+    Com menos conexões que isso o urllib3 descarta as excedentes e abre novas a cada rajada.
+    """
+    if Config.KAIROS_POOL_SIZE > 0:
+        return Config.KAIROS_POOL_SIZE
+    return (
+        Config.WAITRESS_THREADS
+        + (Config.KAIROS_CHUNK_WORKERS + Config.LOCAIS_PONTO_JOB_WORKERS) * Config.KAIROS_PAGE_WORKERS
+        + Config.AGENDAMENTO_JOBS_SIMULTANEOS * Config.KAIROS_CRACHA_WORKERS
+    )
+
+
+def _build_session(idempotent):
+    if idempotent:
+        retries = Retry(
+            total=Config.KAIROS_MAX_RETRIES,
+            backoff_factor=Config.KAIROS_BACKOFF_FACTOR,
+            status_forcelist=[500, 502, 503, 504],
+            allowed_methods=frozenset(['GET', 'POST']),
+            raise_on_status=False
+        )
+    else:
+        retries = Retry(
+            total=Config.KAIROS_MAX_RETRIES,
+            connect=Config.KAIROS_MAX_RETRIES,
+            read=0,
+            status=0,
+            other=0,
+            backoff_factor=Config.KAIROS_BACKOFF_FACTOR,
+            raise_on_status=False
+        )
+
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=_pool_size(),
+        max_retries=retries
+    )
+    http = requests.Session()
+    http.mount('https://', adapter)
+    http.mount('http://', adapter)
+    http.headers.update({k: v for k, v in Config.KAIROS_HEADERS.items() if v is not None})
+    return http
+
+
+def get_session(idempotent=True):
+    """Retorna a sessão HTTP compartilhada do processo (criada sob demanda)."""
+    http = _sessions.get(idempotent)
+    if http is None:
+        with _sessions_lock:
+            http = _sessions.get(idempotent)
+            if http is None:
+                http = _build_session(idempotent)
+                _sessions[idempotent] = http
+    return http
+
+
+def post(endpoint, payload, timeout=None):
+    """
+    Envia um POST JSON para um endpoint do Kairos usando o pool compartilhado.
+    Retorna o objeto requests.Response; o tratamento do status fica com o chamador.
+    """
+    url = f"{Config.KAIROS_BASE_URL}/{endpoint}"
+    http = get_session(endpoint in IDEMPOTENT_ENDPOINTS)
+    rate_limiter.acquire()
+    return http.post(url, json=payload, timeout=timeout or TIMEOUTS.get(endpoint, DEFAULT_TIMEOUT))
+
+
+def _fetch_page(endpoint, payload, page):
+    response = post(endpoint, dict(payload, Pagina=page))
+    if response.status_code != 200:
+        raise KairosError('Erro ao consultar API Kairos', http_status=response.status_code)
+
+    resp_json = response.json()
+    if not resp_json.get('Sucesso'):
+        raise KairosError(resp_json.get('Mensagem', 'Erro desconhecido na API'))
+    return resp_json
+
+
+def fetch_all_pages(endpoint, payload, max_workers=None, fail_fast=True):
+    """
+    Busca todas as páginas de uma consulta paginada do Kairos (campos Pagina/TotalPagina).
+
+    A página 1 é buscada primeiro para descobrir o TotalPagina; as demais são buscadas
+    em paralelo por um pool limitado de threads. Os registros ('Obj') são devolvidos na
+    ordem das páginas. Com fail_fast=True a primeira página com erro interrompe a busca
+    e levanta KairosError (ou a exceção de rede original); com fail_fast=False as páginas
+    com erro são apenas registradas no log e ignoradas.
+    """
+    first = _fetch_page(endpoint, payload, 1)
+    total_pages = int(first.get('TotalPagina') or 1)
+    pages = [first.get('Obj') or []] + [[] for _ in range(total_pages - 1)]
+
+    if total_pages > 1:
+        workers = min(max_workers or Config.KAIROS_PAGE_WORKERS, total_pages - 1)
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='kairos-page')
+        try:
+            futures = {
+                executor.submit(_fetch_page, endpoint, payload, page): page
+                for page in range(2, total_pages + 1)
+            }
+            for future in as_completed(futures):
+                page = futures[future]
+                try:
+                    pages[page - 1] = future.result().get('Obj') or []
+                except Exception as e:
+                    if fail_fast:
+                        raise
+                    print(f"Erro ao buscar página {page}/{total_pages} de {endpoint}: {e}")
+        finally:
+            # Em caso de falha, descarta as páginas que ainda não começaram
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    records = []
+    for page_records in pages:
+        records.extend(page_records)
+    return records
+
+
+def split_date_range(start, end, chunk_days):
+    """Divide o intervalo [start, end] em blocos consecutivos de até chunk_days dias."""
+    chunks = []
+    current = start
+    while current <= end:
+        chunk_end = min(current + datetime.timedelta(days=chunk_days - 1), end)
+        chunks.append((current, chunk_end))
+        current = chunk_end + datetime.timedelta(days=1)
+    return chunks
+
+
+def iter_date_chunks(endpoint, base_payload, start, end, chunk_days=5, max_workers=None):
+    """
+    Executa uma consulta paginada do Kairos em blocos de datas (DataInicio/DataFim),
+    buscando vários blocos em paralelo e entregando-os em ordem cronológica.
+
+    Gera tuplas (inicio_bloco, fim_bloco, registros). No máximo 2 * max_workers blocos
+    ficam em andamento ou aguardando consumo, o que mantém a memória limitada mesmo
+    em intervalos longos. O volume total de chamadas continua sujeito ao rate_limiter.
+    Em caso de erro, a KairosError levantada recebe o atributo `periodo` com o bloco.
+    """
+    chunks = split_date_range(start, end, chunk_days)
+    if not chunks:
+        return
+
+    def fetch_chunk(chunk):
+        chunk_start, chunk_end = chunk
+        payload = dict(
+            base_payload,
+            DataInicio=chunk_start.strftime("%d-%m-%Y"),
+            DataFim=chunk_end.strftime("%d-%m-%Y")
+        )
+        try:
+            return fetch_all_pages(endpoint, payload)
+        except KairosError as err:
+            err.periodo = chunk
+            raise
+
+    workers = min(max_workers or Config.KAIROS_CHUNK_WORKERS, len(chunks))
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='kairos-chunk')
+    try:
+        remaining = iter(chunks)
+        in_flight = deque(
+            (chunk, executor.submit(fetch_chunk, chunk))
+            for chunk in itertools.islice(remaining, workers * 2)
+        )
+        while in_flight:
+            chunk, future = in_flight.popleft()
+            records = future.result()
+            next_chunk = next(remaining, None)
+            if next_chunk is not None:
+                in_flight.append((next_chunk, executor.submit(fetch_chunk, next_chunk)))
+            yield chunk[0], chunk[1], records
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,229 @@
+"""
+Consulta de Locais de Ponto: em quais grupos de relógios cada crachá registrou ponto.
+
+Os crachás são consultados em lotes (um GetAppointmentsV2 com vários CrachasPessoa)
+e os registros são separados por crachá através da Matrícula interna do Kairos,
+usando o diretório de pessoas. Só os lotes em que a API retorna erro, e os crachás
+que não estão no diretório, são consultados um a um.
+
+Consultas grandes também podem rodar como jobs em segundo plano (submit_job), com
+progresso consultável pelo id do job e resultado mantido em memória para download.
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+import clock_topology
+import kairos_client
+
+
+def _base_payload(start_date, end_date):
+    return {
+        "DataInicio": start_date,
+        "DataFim": end_date,
+        "CalculoNaoAtualizado": "true",
+        "ResponseType": "AS400V1"
+    }
+
+
+def _add_to_groups(result, cracha, relogio_ids):
+    for grupo in clock_topology.groups_for(relogio_ids):
+        result['grupo_crachas'][grupo].add(cracha)
+
+
+def _query_single(result, cracha, start_date, end_date):
+    payload = dict(_base_payload(start_date, end_date), CrachasPessoa=[cracha])
+    response = kairos_client.post(kairos_client.GET_APPOINTMENTS, payload)
+
+    if response.status_code == 200:
+        resp_json = response.json()
+        sucesso = resp_json.get("Sucesso")
+        obj_list = resp_json.get("Obj")
+
+        if sucesso and isinstance(obj_list, list) and len(obj_list) > 0:
+            relogio_ids = {item.get("RelogioID") for item in obj_list if item.get("RelogioID") is not None}
+            _add_to_groups(result, cracha, relogio_ids)
+        elif sucesso and isinstance(obj_list, list) and len(obj_list) == 0:
+            result['crachas_sem_dados'].append(cracha)
+        elif not sucesso and obj_list is None:
+            result['crachas_inexistentes'].append(cracha)
+    else:
+        print(f"Erro ao consultar api/admin/locais_ponto crachá {cracha}: {response.status_code}")
+        # We log it but continue processing the rest
+
+
+def _query_batch(result, batch, start_date, end_date):
+    """
+    Consulta um lote de crachás [(cracha, matricula_kairos)] numa única chamada paginada.
+    Retorna False quando a API reporta erro, para o lote ser refeito crachá a crachá.
+    """
+    payload = dict(_base_payload(start_date, end_date), CrachasPessoa=[cracha for cracha, _ in batch])
+    try:
+        records = kairos_client.fetch_all_pages(kairos_client.GET_APPOINTMENTS, payload)
+    except kairos_client.KairosError as e:
+        print(f"Erro ao consultar lote de {len(batch)} crachás em api/admin/locais_ponto, consultando individualmente: {e}")
+        return False
+
+    relogios_por_matricula = {matricula: set() for _, matricula in batch}
+    for item in records:
+        relogios = relogios_por_matricula.get(str(item.get('Matricula')))
+        if relogios is None:
+            # Registro que não pertence a nenhum crachá do lote: não dá para separar com segurança
+            print(f"Matrícula {item.get('Matricula')} inesperada no lote de locais de ponto, consultando individualmente.")
+            return False
+        if item.get("RelogioID") is not None:
+            relogios.add(item.get("RelogioID"))
+
+    found = {str(item.get('Matricula')) for item in records}
+    for cracha, matricula in batch:
+        if matricula in found:
+            _add_to_groups(result, cracha, relogios_por_matricula[matricula])
+        else:
+            result['crachas_sem_dados'].append(cracha)
+    return True
+
+
+def consultar_locais_ponto(crachas, start_date, end_date, employees_map, batch_size=None, progress=None):
+    """
+    Classifica os crachás entre os grupos de relógios em que bateram ponto no período.
+    Retorna {'grupo_crachas': {grupo: set(crachas)}, 'crachas_sem_dados': [...], 'crachas_inexistentes': [...]}.
+
+    `employees_map` é o diretório {Matricula: {'Cracha': ...}} usado para separar os
+    registros de cada lote por crachá. `progress(processados, resultado_parcial)` é
+    chamado depois de cada lote ou consulta individual.
+    """
+    batch_size = batch_size or Config.LOCAIS_PONTO_CRACHAS_POR_LOTE
+    result = {
+        'grupo_crachas': {grupo: set() for grupo in clock_topology.location_names()},
+        'crachas_sem_dados': [],
+        'crachas_inexistentes': []
+    }
+
+    matricula_por_cracha = {}
+    for mat, info in employees_map.items():
+        if info.get('Cracha') is not None:
+            matricula_por_cracha[str(info['Cracha']).strip()] = mat
+
+    conhecidos = []
+    individuais = []
+    for cracha in crachas:
+        matricula = matricula_por_cracha.get(str(cracha).strip())
+        if matricula is None:
+            # Fora do diretório (pessoa nova ou crachá inexistente): consulta individual
+            individuais.append(cracha)
+        else:
+            conhecidos.append((cracha, matricula))
+
+    processados = 0
+    for i in range(0, len(conhecidos), batch_size):
+        batch = conhecidos[i:i + batch_size]
+        if _query_batch(result, batch, start_date, end_date):
+            processados += len(batch)
+            if progress:
+                progress(processados, result)
+        else:
+            individuais.extend(cracha for cracha, _ in batch)
+
+    for cracha in individuais:
+        _query_single(result, cracha, start_date, end_date)
+        processados += 1
+        if progress:
+            progress(processados, result)
+
+    return result
+
+
+def serialize_result(result):
+    """Converte o resultado para JSON (listas ordenadas, só grupos com crachás)."""
+    return {
+        'grupo_crachas': {k: sorted(v) for k, v in result['grupo_crachas'].items() if v},
+        'crachas_sem_dados': sorted(result['crachas_sem_dados']),
+        'crachas_inexistentes': sorted(result['crachas_inexistentes'])
+    }
+
+
+class LocaisPontoJob:
+    """Consulta de Locais de Ponto executada em segundo plano."""
+
+    def __init__(self, crachas, start_date, end_date, user_id=None):
+        self.id = uuid.uuid4().hex
+        self.crachas = crachas
+        self.start_date = start_date
+        self.end_date = end_date
+        self.user_id = user_id
+        self.status = 'pendente'  # pendente, executando, concluido, erro
+        self.total = len(crachas)
+        self.processados = 0
+        self.resultado = serialize_result({'grupo_crachas': {}, 'crachas_sem_dados': [], 'crachas_inexistentes': []})
+        self.erro = None
+        self.criado_em = time.time()
+        self.concluido_em = None
+        self._lock = threading.Lock()
+
+    def update(self, processados, result):
+        snapshot = serialize_result(result)
+        with self._lock:
+            self.processados = processados
+            self.resultado = snapshot
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'job_id': self.id,
+                'status': self.status,
+                'total': self.total,
+                'processados': self.processados,
+                'start_date': self.start_date,
+                'end_date': self.end_date,
+                'erro': self.erro,
+                'data': self.resultado
+            }
+
+
+_executor = ThreadPoolExecutor(max_workers=Config.LOCAIS_PONTO_JOB_WORKERS, thread_name_prefix='locais-ponto')
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+def _run_job(job, employees_map_loader):
+    with job._lock:
+        job.status = 'executando'
+    try:
+        result = consultar_locais_ponto(
+            job.crachas, job.start_date, job.end_date, employees_map_loader(), progress=job.update
+        )
+        job.update(job.total, result)
+        with job._lock:
+            job.status = 'concluido'
+    except Exception as e:
+        print(f"Erro no job de locais de ponto {job.id}: {e}")
+        with job._lock:
+            job.status = 'erro'
+            job.erro = str(e)
+    finally:
+        with job._lock:
+            job.concluido_em = time.time()
+
+
+def _purge_expired_jobs():
+    limite = time.time() - Config.LOCAIS_PONTO_JOB_RETENCAO_HORAS * 3600
+    with _jobs_lock:
+        for job_id in [j.id for j in _jobs.values() if j.concluido_em and j.concluido_em < limite]:
+            del _jobs[job_id]
+
+
+def submit_job(crachas, start_date, end_date, employees_map_loader, user_id=None):
+    """Agenda a consulta no executor e retorna o job imediatamente."""
+    _purge_expired_jobs()
+    job = LocaisPontoJob(crachas, start_date, end_date, user_id=user_id)
+    with _jobs_lock:
+        _jobs[job.id] = job
+    _executor.submit(_run_job, job, employees_map_loader)
+    return job
+
+
+def get_job(job_id):
+    with _jobs_lock:
+        return _jobs.get(job_id)
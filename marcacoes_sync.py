@@ -0,0 +1,215 @@
+"""
+Armazém local de marcações (tabela `marcacoes`).
+
+Um worker em segundo plano baixa do GetAppointmentsV2 as marcações de cada dia uma
+única vez depois que o dia sai da janela mutável (MARCACOES_JANELA_MUTAVEL_DIAS) e
+re-sincroniza periodicamente apenas os dias recentes. As rotas de relatório leem do
+SQL Server os dias já fechados e sincronizados e consultam a API só para o restante.
+"""
+import datetime
+import threading
+import time
+
+from sqlalchemy import func
+
+from config import Config, get_local_now
+from database import get_db_session
+from db_setup import Marcacao, MarcacaoSincronizacao
+import kairos_client
+
+
+def _as_date(value):
+    return value.date() if isinstance(value, datetime.datetime) else value
+
+
+def _is_closed(day, today):
+    return day <= today - datetime.timedelta(days=Config.MARCACOES_JANELA_MUTAVEL_DIAS)
+
+
+def _to_kairos_record(m):
+    # Mesmo formato dos registros do GetAppointmentsV2 (ResponseType AS400V1)
+    matricula = int(m.matricula) if m.matricula.isdigit() else m.matricula
+    return {
+        'Matricula': matricula,
+        'RelogioID': m.relogio_id,
+        'NumeroSerieRep': m.numero_serie_rep,
+        'Dia': m.data.day,
+        'Mes': m.data.month,
+        'Ano': m.data.year,
+        'Hora': m.hora,
+        'Minuto': m.minuto
+    }
+
+
+def plan_date_range(db, start, end, today=None):
+    """
+    Divide o intervalo [start, end] entre o armazém local e a API do Kairos.
+    Retorna (faixa_local, faixa_api), onde cada faixa é uma tupla (inicio, fim) ou None.
+    Só vão para o armazém os dias já fechados e sincronizados de forma definitiva;
+    se faltar algum desses dias o intervalo inteiro é consultado na API.
+    """
+    start, end = _as_date(start), _as_date(end)
+    if start > end:
+        return None, (start, end)
+
+    today = today or get_local_now().date()
+    cut = min(end, today - datetime.timedelta(days=Config.MARCACOES_JANELA_MUTAVEL_DIAS))
+    if cut < start:
+        return None, (start, end)
+
+    synced_days = db.query(func.count(MarcacaoSincronizacao.data)).filter(
+        MarcacaoSincronizacao.data >= start,
+        MarcacaoSincronizacao.data <= cut,
+        MarcacaoSincronizacao.definitivo == True
+    ).scalar()
+    if synced_days < (cut - start).days + 1:
+        return None, (start, end)
+
+    api_range = (cut + datetime.timedelta(days=1), end) if cut < end else None
+    return (start, cut), api_range
+
+
+def load_records(db, start, end, matricula=None):
+    """Marcações do armazém local entre start e end, em ordem cronológica."""
+    query = db.query(Marcacao).filter(Marcacao.data >= start, Marcacao.data <= end)
+    if matricula is not None:
+        query = query.filter(Marcacao.matricula == str(matricula))
+    query = query.order_by(Marcacao.data, Marcacao.hora, Marcacao.minuto, Marcacao.id)
+    return [_to_kairos_record(m) for m in query]
+
+
+def iter_appointments(start, end, base_payload, matricula=None, plan=None, chunk_days=5):
+    """
+    Gera (inicio, fim, registros) em ordem cronológica para o intervalo pedido.
+    Os dias cobertos pelo armazém local saem do SQL Server; o restante é buscado no
+    Kairos com base_payload (em blocos de chunk_days dias, ou numa única consulta
+    paginada quando chunk_days é None).
+
+    `matricula` é a matrícula interna do Kairos usada para filtrar o armazém quando a
+    consulta é individual. `plan` permite reaproveitar um plan_date_range já calculado;
+    use plan=(None, (start, end)) para ignorar o armazém.
+    """
+    start, end = _as_date(start), _as_date(end)
+    if plan is None:
+        db = get_db_session()
+        try:
+            plan = plan_date_range(db, start, end)
+        finally:
+            db.close()
+    local_range, api_range = plan
+
+    if local_range:
+        local_start, local_end = local_range
+        db = get_db_session()
+        try:
+            step = chunk_days or (local_end - local_start).days + 1
+            for chunk_start, chunk_end in kairos_client.split_date_range(local_start, local_end, step):
+                yield chunk_start, chunk_end, load_records(db, chunk_start, chunk_end, matricula)
+        finally:
+            db.close()
+
+    if api_range:
+        api_start, api_end = api_range
+        if chunk_days:
+            yield from kairos_client.iter_date_chunks(kairos_client.GET_APPOINTMENTS, base_payload, api_start, api_end, chunk_days=chunk_days)
+        else:
+            payload = dict(base_payload, DataInicio=api_start.strftime("%d-%m-%Y"), DataFim=api_end.strftime("%d-%m-%Y"))
+            yield api_start, api_end, kairos_client.fetch_all_pages(kairos_client.GET_APPOINTMENTS, payload)
+
+
+def sync_day(db, day, today=None):
+    """Baixa todas as marcações de um dia e substitui as linhas desse dia no armazém."""
+    today = today or get_local_now().date()
+    day_str = day.strftime("%d-%m-%Y")
+    payload = {
+        "DataInicio": day_str,
+        "DataFim": day_str,
+        "CalculoNaoAtualizado": "true",
+        "ResponseType": "AS400V1",
+        "IdsPessoa": [0]
+    }
+    records = kairos_client.fetch_all_pages(kairos_client.GET_APPOINTMENTS, payload)
+
+    rows = []
+    for r in records:
+        try:
+            record_day = datetime.date(int(r['Ano']), int(r['Mes']), int(r['Dia']))
+            relogio_id = r.get('RelogioID')
+            if record_day != day or r.get('Matricula') is None:
+                continue
+            rows.append({
+                'data': record_day,
+                'hora': int(r.get('Hora') or 0),
+                'minuto': int(r.get('Minuto') or 0),
+                'matricula': str(r.get('Matricula')),
+                'relogio_id': int(relogio_id) if relogio_id is not None else None,
+                'numero_serie_rep': r.get('NumeroSerieRep')
+            })
+        except (KeyError, TypeError, ValueError):
+            continue
+
+    db.query(Marcacao).filter(Marcacao.data == day).delete(synchronize_session=False)
+    if rows:
+        db.bulk_insert_mappings(Marcacao, rows)
+
+    registro = db.query(MarcacaoSincronizacao).get(day)
+    if not registro:
+        registro = MarcacaoSincronizacao(data=day)
+        db.add(registro)
+    registro.sincronizado_em = get_local_now().replace(tzinfo=None)
+    registro.total_registros = len(rows)
+    registro.definitivo = _is_closed(day, today)
+    db.commit()
+    return len(rows)
+
+
+def sync_pending_days(db, today=None):
+    """
+    Um ciclo de sincronização: re-sincroniza os dias da janela mutável e baixa até
+    MARCACOES_SYNC_DIAS_POR_CICLO dias fechados que ainda não têm sincronização definitiva
+    (do mais recente para o mais antigo).
+    """
+    today = today or get_local_now().date()
+    window = Config.MARCACOES_JANELA_MUTAVEL_DIAS
+    oldest = today - datetime.timedelta(days=Config.MARCACOES_HISTORICO_DIAS)
+
+    definitive_days = {
+        row.data for row in db.query(MarcacaoSincronizacao.data).filter(
+            MarcacaoSincronizacao.data >= oldest,
+            MarcacaoSincronizacao.definitivo == True
+        )
+    }
+
+    mutable_days = [today - datetime.timedelta(days=i) for i in range(window)]
+    closed_days = []
+    day = today - datetime.timedelta(days=window)
+    while day >= oldest and len(closed_days) < Config.MARCACOES_SYNC_DIAS_POR_CICLO:
+        if day not in definitive_days:
+            closed_days.append(day)
+        day -= datetime.timedelta(days=1)
+
+    for day in mutable_days + closed_days:
+        try:
+            total = sync_day(db, day, today)
+            print(f"[MARCACOES SYNC] {day.strftime('%d/%m/%Y')}: {total} marcações sincronizadas.")
+        except Exception as e:
+            db.rollback()
+            print(f"[MARCACOES SYNC] Erro ao sincronizar {day.strftime('%d/%m/%Y')}: {e}")
+
+
+def sync_worker():
+    while True:
+        db = get_db_session()
+        try:
+            sync_pending_days(db)
+        except Exception as e:
+            print(f"[MARCACOES SYNC] Erro no ciclo: {e}")
+        finally:
+            db.close()
+        time.sleep(Config.MARCACOES_SYNC_INTERVALO_MINUTOS * 60)
+
+
+def start_sync_worker():
+    thread = threading.Thread(target=sync_worker, daemon=True, name='marcacoes-sync')
+    thread.start()
+    return thread
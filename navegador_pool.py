@@ -0,0 +1,202 @@
+"""
+Pool de navegadores Chromium (Playwright) autenticados no site do Kairos, usado pela
+automação dos relógios (automacao_relogio.py).
+
+A API síncrona do Playwright só pode ser usada pela thread que a iniciou, então cada
+navegador do pool pertence a uma thread própria (_BrowserWorker) que executa os passos
+recebidos e devolve as linhas de log por uma fila. O navegador continua aberto entre as
+execuções e o login só é refeito quando a sessão expira; depois de
+AUTOMACAO_NAVEGADOR_OCIOSO_MINUTOS sem uso ele é fechado para liberar memória (e
+reaberto na próxima execução).
+"""
+import queue
+import threading
+
+from playwright.sync_api import sync_playwright
+
+from config import Config
+
+BASE_URL = 'https://www.dimepkairos.com.br'
+LOGIN_USER_SELECTOR = '#LogOnModel_UserName'
+LOGIN_PASSWORD_SELECTOR = '#LogOnModel_Password'
+LOGIN_BUTTON_SELECTOR = '#btnFormLogin'
+
+_FIM = object()
+
+
+class _BrowserWorker(threading.Thread):
+    """Thread dona de um navegador, contexto e página; executa uma tarefa de cada vez."""
+
+    def __init__(self, pool, indice):
+        super().__init__(daemon=True, name=f'automacao-navegador-{indice}')
+        self.pool = pool
+        self.indice = indice
+        self.tasks = queue.Queue()
+        self._playwright = None
+        self._browser = None
+        self._context = None
+        self.page = None
+
+    def run(self):
+        while True:
+            try:
+                credentials, steps, saida = self.tasks.get(timeout=Config.AUTOMACAO_NAVEGADOR_OCIOSO_MINUTOS * 60)
+            except queue.Empty:
+                if self._browser is not None:
+                    print(f"[AUTOMACAO] Navegador {self.indice} ocioso, encerrando.")
+                    self._close()
+                continue
+
+            try:
+                for linha in self._prepare(credentials):
+                    saida.put(linha)
+                for linha in steps(self.page):
+                    saida.put(linha)
+            except Exception as e:
+                saida.put(f"❌ Erro geral na automação: {str(e)}\n")
+                # Estado do navegador desconhecido: é recriado na próxima execução
+                self._close()
+            finally:
+                saida.put(_FIM)
+                self.pool._release(self)
+
+    def _prepare(self, credentials):
+        if self._browser is None or not self._browser.is_connected():
+            self._close()
+            yield "🔄 Abrindo navegador...\n"
+            self._playwright = sync_playwright().start()
+            self._browser = self._playwright.chromium.launch(headless=True)
+            self._context = self._browser.new_context(viewport={"width": 1280, "height": 800})
+            self.page = self._context.new_page()
+        else:
+            yield "♻️ Reutilizando navegador já aberto.\n"
+        yield from self._ensure_login(credentials)
+
+    def _ensure_login(self, credentials):
+        login, password = credentials
+        self.page.goto(BASE_URL, wait_until='domcontentloaded')
+        if self.page.locator(LOGIN_USER_SELECTOR).count() == 0:
+            yield "✅ Sessão do Kairos ainda ativa.\n"
+            return
+
+        yield "🔐 Realizando login...\n"
+        self.page.type(LOGIN_USER_SELECTOR, login, delay=50)
+        self.page.type(LOGIN_PASSWORD_SELECTOR, password, delay=50)
+        self.page.wait_for_selector(LOGIN_BUTTON_SELECTOR)
+        self.page.click(LOGIN_BUTTON_SELECTOR)
+
+        # Wait for navigation after form submission
+        self.page.wait_for_load_state('domcontentloaded')
+        yield "✅ Login realizado com sucesso.\n"
+
+    def _close(self):
+        for recurso in (self._context, self._browser):
+            if recurso is not None:
+                try:
+                    recurso.close()
+                except Exception:
+                    pass
+        if self._playwright is not None:
+            try:
+                self._playwright.stop()
+            except Exception:
+                pass
+        self._playwright = self._browser = self._context = self.page = None
+
+
+class BrowserPool:
+    """Até `size` navegadores, criados sob demanda e reaproveitados entre as execuções."""
+
+    def __init__(self, size):
+        self.size = max(size, 1)
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._created = 0
+
+    def stream(self, credentials, steps, cancelar=None):
+        """
+        Executa `steps(page)` (um gerador de linhas de log) num navegador do pool,
+        repassando as linhas conforme são produzidas. Se o consumidor parar antes do fim
+        (ex.: cliente desconectou), `cancelar` é sinalizado para os passos pararem e o
+        gerador só fecha depois que o navegador terminar o que estava fazendo.
+        """
+        worker = self._acquire()
+        if worker is None:
+            yield "⏳ Todos os navegadores estão em uso, aguardando um ficar livre...\n"
+            worker = self._idle.get()
+
+        saida = queue.Queue()
+        worker.tasks.put((credentials, steps, saida))
+        terminou = False
+        try:
+            while True:
+                linha = saida.get()
+                if linha is _FIM:
+                    terminou = True
+                    return
+                yield linha
+        finally:
+            if not terminou:
+                if cancelar is not None:
+                    cancelar.set()
+                while saida.get() is not _FIM:
+                    pass
+
+    def stream_parallel(self, credentials, steps_list, cancelar=None):
+        """
+        Executa cada `steps` da lista num navegador diferente, ao mesmo tempo, repassando as
+        linhas de todos conforme chegam. Se houver mais passos do que navegadores, os
+        excedentes esperam um navegador ficar livre. Como em stream(), parar de consumir
+        sinaliza `cancelar` e espera todos os navegadores terminarem.
+        """
+        if len(steps_list) == 1:
+            yield from self.stream(credentials, steps_list[0], cancelar)
+            return
+
+        saida = queue.Queue()
+
+        def consumir(steps):
+            try:
+                for linha in self.stream(credentials, steps):
+                    saida.put(linha)
+            except Exception as e:
+                saida.put(f"❌ Erro geral na automação: {str(e)}\n")
+            finally:
+                saida.put(_FIM)
+
+        for steps in steps_list:
+            threading.Thread(target=consumir, args=(steps,), daemon=True).start()
+
+        pendentes = len(steps_list)
+        try:
+            while pendentes:
+                linha = saida.get()
+                if linha is _FIM:
+                    pendentes -= 1
+                else:
+                    yield linha
+        finally:
+            if pendentes and cancelar is not None:
+                cancelar.set()
+            while pendentes:
+                if saida.get() is _FIM:
+                    pendentes -= 1
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created >= self.size:
+                return None
+            self._created += 1
+            worker = _BrowserWorker(self, self._created)
+        worker.start()
+        return worker
+
+    def _release(self, worker):
+        self._idle.put(worker)
+
+
+pool = BrowserPool(Config.AUTOMACAO_NAVEGADORES)
@@ -0,0 +1,48 @@
+"""
+Agendador de comandos como processo separado do servidor web.
+
+    python -m scheduler [--workers N] [--imediatos N] [--intervalo SEGUNDOS]
+
+Use junto com AGENDAMENTO_EMBUTIDO=false no servidor web (serve.py), para que os
+agendamentos não disputem o GIL com as requisições. Vários processos podem rodar ao
+mesmo tempo: cada agendamento é reservado de forma atômica (job_queue.claim_next) e
+os comandos recorrentes só são disparados pelo processo que detém o lock de líder.
+Jobs com relógios em comum não rodam ao mesmo tempo nem em processos diferentes
+(job_queue.ClockLocks). O KAIROS_RATE_LIMIT vale por processo: divida-o entre eles.
+"""
+import argparse
+import time
+
+from config import Config
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Executa os agendamentos de comandos de relógio.')
+    parser.add_argument('--workers', type=int, default=Config.AGENDAMENTO_WORKERS,
+                        help='workers da raia geral (agendamentos e comandos recorrentes)')
+    parser.add_argument('--imediatos', type=int, default=Config.AGENDAMENTO_WORKERS_IMEDIATOS,
+                        help='workers dedicados aos agendamentos imediatos')
+    parser.add_argument('--intervalo', type=int, default=Config.AGENDAMENTO_SCHEDULER_INTERVALO_SEGUNDOS,
+                        help='espera máxima entre verificações da fila, em segundos')
+    args = parser.parse_args(argv)
+
+    # Este processo só executa agendamentos: sem o worker embutido no import do app e sem a
+    # sincronização de marcações, que continua com o servidor web
+    Config.AGENDAMENTO_EMBUTIDO = False
+    Config.MARCACOES_SYNC_ATIVO = False
+    # As rotas de outro processo não conseguem acordar os workers daqui (job_queue.notify)
+    Config.AGENDAMENTO_INTERVALO_SEGUNDOS = args.intervalo
+
+    import app as web_app
+
+    web_app.start_scheduler_workers(args.workers, args.imediatos)
+    print(f"[AGENDADOR] Iniciado com {args.workers} worker(s) gerais e {args.imediatos} imediato(s); verificando a fila a cada {args.intervalo}s no máximo.")
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        print("[AGENDADOR] Encerrando.")
+
+
+if __name__ == '__main__':
+    main()
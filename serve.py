@@ -1,5 +1,6 @@
 from waitress import serve
 from app import app
+from config import Config
 import socket
 
 def get_ip_address():
@@ -21,7 +22,10 @@ if __name__ == "__main__":
     print(f"Starting server on {host}:{port}")
     print(f"Access locally at: http://localhost:{port}")
     print(f"Access from network at: http://{ip_address}:{port}")
+    if not Config.AGENDAMENTO_EMBUTIDO:
+        print("Scheduled commands are disabled in this process (AGENDAMENTO_EMBUTIDO=false); run `python -m scheduler`.")
     
-    # Usamos threads=12 para permitir lidar com múltiplas requisições concorrentes que aguardam a API externa.
+    # Usamos WAITRESS_THREADS (padrão 12) para permitir lidar com múltiplas requisições concorrentes que aguardam a API externa.
     # Como são threads de I/O (espera de rede) e não de CPU, computadores simples conseguem rodar dezenas delas sem problemas.
-    serve(app, host=host, port=port, threads=12)
+    # O pool de conexões do kairos_client é dimensionado pelo mesmo valor (KAIROS_POOL_SIZE).
+    serve(app, host=host, port=port, threads=Config.WAITRESS_THREADS)
@@ -536,18 +536,41 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
+    // Botão "Refazer falhas": reenvia o formulário pedindo só as etapas que falharam na execução
+    function oferecerRefazerFalhas(consoleDiv, form, linha) {
+        const match = linha.match(/📊 Execução #(\d+): .* com falha/);
+        if (!match) return;
+        let refazerBtn = consoleDiv.querySelector('.btn-refazer-falhas');
+        if (!refazerBtn) {
+            refazerBtn = document.createElement('button');
+            refazerBtn.type = 'button';
+            refazerBtn.className = 'btn btn-secondary btn-refazer-falhas';
+            refazerBtn.style.marginTop = '10px';
+            consoleDiv.appendChild(refazerBtn);
+        }
+        refazerBtn.textContent = `🔁 Refazer falhas (execução #${match[1]})`;
+        refazerBtn.style.display = 'inline-block';
+        refazerBtn.onclick = () => {
+            refazerBtn.style.display = 'none';
+            form.dataset.refazer = match[1];
+            form.requestSubmit();
+        };
+    }
+
     // Reposição de Ponteiro Form Submit Handler (SSE Streaming)
     const ponteiroForm = document.getElementById('ponteiroForm');
     if (ponteiroForm) {
         ponteiroForm.addEventListener('submit', function(e) {
             e.preventDefault();
             const dateVal = document.getElementById('dataPonteiro').value;
+            const refazer = ponteiroForm.dataset.refazer;
+            delete ponteiroForm.dataset.refazer;
             
             const selectedClocks = Array.from(
                 document.querySelectorAll('input[name="relogios"]:checked')
             ).map(cb => parseInt(cb.value, 10));
 
-            if (selectedClocks.length === 0) {
+            if (!refazer && selectedClocks.length === 0) {
                 alert("Por favor, selecione pelo menos um relógio.");
                 return;
             }
@@ -557,6 +580,8 @@ document.addEventListener('DOMContentLoaded', () => {
             const cancelBtn = document.getElementById('cancelPonteiro');
             
             consoleDiv.style.display = 'block';
+            const refazerAnterior = consoleDiv.querySelector('.btn-refazer-falhas');
+            if (refazerAnterior) refazerAnterior.style.display = 'none';
             logContent.innerHTML = '⏳ Conectando ao servidor para iniciar reposição de ponteiro...\n';
             if (cancelBtn) cancelBtn.style.display = 'block';
 
@@ -565,7 +590,9 @@ document.addEventListener('DOMContentLoaded', () => {
             btn.textContent = 'Processando Reposição...';
 
             const relogiosParam = encodeURIComponent(JSON.stringify(selectedClocks));
-            const url = `/api/automacao/stream?tipo=ponteiro&data=${dateVal}&relogios=${relogiosParam}`;
+            const url = refazer
+                ? `/api/automacao/stream?refazer=${refazer}`
+                : `/api/automacao/stream?tipo=ponteiro&data=${dateVal}&relogios=${relogiosParam}`;
             let eventSource = new EventSource(url);
 
             const cleanUp = () => {
@@ -589,8 +616,10 @@ document.addEventListener('DOMContentLoaded', () => {
             eventSource.onmessage = function(event) {
                 logContent.innerHTML += event.data + '\n';
                 logContent.scrollTop = logContent.scrollHeight;
+                oferecerRefazerFalhas(consoleDiv, ponteiroForm, event.data);
                 
-                if (event.data.includes('🏁 Automação') || event.data.includes('❌ Erro') || event.data.includes('🔒 Navegador encerrado.')) {
+                // Erros de um relógio vêm com o prefixo "[Relógio N]" e não encerram a execução
+                if (event.data.includes('🏁 Automação') || event.data.startsWith('❌ Erro') || event.data.includes('🔒 Navegador encerrado.')) {
                     cleanUp();
                 }
             };
@@ -608,12 +637,14 @@ document.addEventListener('DOMContentLoaded', () => {
     if (datahoraForm) {
         datahoraForm.addEventListener('submit', function(e) {
             e.preventDefault();
+            const refazer = datahoraForm.dataset.refazer;
+            delete datahoraForm.dataset.refazer;
             
             const selectedClocks = Array.from(
                 document.querySelectorAll('input[name="relogios"]:checked')
             ).map(cb => parseInt(cb.value, 10));
 
-            if (selectedClocks.length === 0) {
+            if (!refazer && selectedClocks.length === 0) {
                 alert("Por favor, selecione pelo menos um relógio.");
                 return;
             }
@@ -623,6 +654,8 @@ document.addEventListener('DOMContentLoaded', () => {
             const cancelBtn = document.getElementById('cancelDataHora');
 
             consoleDiv.style.display = 'block';
+            const refazerAnterior = consoleDiv.querySelector('.btn-refazer-falhas');
+            if (refazerAnterior) refazerAnterior.style.display = 'none';
             logContent.innerHTML = '⏳ Conectando ao servidor para iniciar envio de data e hora...\n';
             if (cancelBtn) cancelBtn.style.display = 'block';
 
@@ -631,7 +664,9 @@ document.addEventListener('DOMContentLoaded', () => {
             btn.textContent = 'Enviando Data e Hora...';
 
             const relogiosParam = encodeURIComponent(JSON.stringify(selectedClocks));
-            const url = `/api/automacao/stream?tipo=datahora&relogios=${relogiosParam}`;
+            const url = refazer
+                ? `/api/automacao/stream?refazer=${refazer}`
+                : `/api/automacao/stream?tipo=datahora&relogios=${relogiosParam}`;
             let eventSource = new EventSource(url);
 
             const cleanUp = () => {
@@ -655,8 +690,10 @@ document.addEventListener('DOMContentLoaded', () => {
             eventSource.onmessage = function(event) {
                 logContent.innerHTML += event.data + '\n';
                 logContent.scrollTop = logContent.scrollHeight;
+                oferecerRefazerFalhas(consoleDiv, datahoraForm, event.data);
                 
-                if (event.data.includes('🏁 Automação') || event.data.includes('❌ Erro') || event.data.includes('🔒 Navegador encerrado.')) {
+                // Erros de um relógio vêm com o prefixo "[Relógio N]" e não encerram a execução
+                if (event.data.includes('🏁 Automação') || event.data.startsWith('❌ Erro') || event.data.includes('🔒 Navegador encerrado.')) {
                     cleanUp();
                 }
             };
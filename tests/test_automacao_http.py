@@ -0,0 +1,106 @@
+"""
+Leitura e envio dos formulários do site do Kairos (automacao_http._FormParser e _form_payload),
+com uma página Advanced/{id} salva em tests/fixtures.
+
+Rodar da raiz do projeto: python -m unittest discover tests
+"""
+import os
+import unittest
+
+from automacao_http import _form_payload, _parse
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'relogio_advanced.html')
+
+
+def _pagina():
+    with open(FIXTURE, encoding='utf-8') as arquivo:
+        return _parse(arquivo.read())
+
+
+def _form_com(pagina, field_id):
+    return next(form for form in pagina.forms if form.field(id=field_id))
+
+
+class FormParserTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pagina = _pagina()
+
+    def test_collects_every_form_with_action_and_method(self):
+        self.assertEqual(
+            [(form.action, form.method) for form in self.pagina.forms],
+            [('/Dimep/Account/LogOff', 'post'),
+             ('/Dimep/Relogios/ReposicaoPonteiro/7', 'post'),
+             ('/Dimep/Relogios/Comandos/7', 'post')]
+        )
+
+    def test_validation_errors_and_ok_banner(self):
+        self.assertEqual(self.pagina.erros, ['Relógio\xa0sem comunicação', 'desde 01/01/2026'])
+        self.assertTrue(self.pagina.ok)
+
+    def test_errors_block_ends_at_its_own_closing_tag(self):
+        # <br/> e <input/> dentro do bloco não podem encerrá-lo antes da hora
+        pagina = _parse('<div class="validation-summary-errors"><ul><li>a<br/>b</li></ul>c<input/>d</div>'
+                        '<p>fora</p>')
+        self.assertEqual(pagina.erros, ['a', 'b', 'c', 'd'])
+
+    def test_select_textarea_and_button_defaults(self):
+        form = _form_com(self.pagina, 'checkImportarMarcacoes')
+        self.assertEqual(form.field(id='selectModelo')['value'], '2')
+        self.assertIsNone(form.field(id='selectVazio')['value'])
+        self.assertEqual(form.field(id='textareaObservacao')['value'], 'Linha 1\nLinha & 2')
+        botao = form.field(**{'class': 'buttonImportar'})
+        self.assertEqual((botao['tag'], botao['type']), ('input', 'button'))
+
+    def test_buttons_outside_the_form_are_not_fields(self):
+        # O "Sim" da reposição fica no diálogo de confirmação, fora do formulário
+        form = _form_com(self.pagina, 'textboxData')
+        self.assertIsNone(form.field(id='bReposicaoPonteiro'))
+        self.assertFalse(any(form.field(id='bReposicaoPonteiro') for form in self.pagina.forms))
+
+
+class FormPayloadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pagina = _pagina()
+
+    def test_defaults_skip_unchecked_disabled_and_unclicked_buttons(self):
+        form = _form_com(self.pagina, 'textboxData')
+        self.assertEqual(_form_payload(form), [
+            ('__RequestVerificationToken', 'tok-reposicao'),
+            ('Relogio.Id', '7'),
+            ('TipoReposicao', 'Todos'),
+            ('Data', '')
+        ])
+
+    def test_marked_radio_replaces_default_and_values_fill_fields(self):
+        form = _form_com(self.pagina, 'textboxData')
+        payload = _form_payload(form, marcar=('radioAPartirDeData',), valores={'textboxData': '01/02/2026'})
+        self.assertIn(('TipoReposicao', 'APartirDeData'), payload)
+        self.assertNotIn(('TipoReposicao', 'Todos'), payload)
+        self.assertIn(('Data', '01/02/2026'), payload)
+
+    def test_checkboxes_keep_page_order_and_hidden_companions(self):
+        form = _form_com(self.pagina, 'checkImportarMarcacoes')
+        payload = _form_payload(
+            form, marcar=('radioFunctionImportar', 'checkImportarMarcacoes', 'checkboxImportarStatusImediato')
+        )
+        self.assertEqual(payload, [
+            ('__RequestVerificationToken', 'tok-comandos'),
+            ('Funcao', 'Importar'),
+            ('ImportarMarcacoes', 'true'),
+            ('ImportarMarcacoes', 'false'),
+            ('ImportarStatusImediato', 'on'),
+            ('Modelo', '2'),
+            ('Observacao', 'Linha 1\nLinha & 2')
+        ])
+
+    def test_only_the_clicked_submit_button_is_sent(self):
+        form = _form_com(self.pagina, 'checkImportarMarcacoes')
+        self.assertNotIn(('Acao', 'Exportar'), _form_payload(form))
+        botao = form.field(**{'class': 'buttonExportar'})
+        self.assertIn(('Acao', 'Exportar'), _form_payload(form, botao=botao))
+
+
+if __name__ == '__main__':
+    unittest.main()
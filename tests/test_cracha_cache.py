@@ -0,0 +1,47 @@
+"""
+Cache de consultas de crachá (utils_envio_comando.cracha_cache).
+
+Rodar da raiz do projeto: python -m unittest discover tests
+"""
+import unittest
+from unittest import mock
+
+import utils_envio_comando
+from utils_envio_comando import _cracha_key, cracha_cache, dismiss_employee, fetch_cracha
+
+
+class CrachaCacheKeyTest(unittest.TestCase):
+
+    def setUp(self):
+        cracha_cache.invalidate()
+
+    def tearDown(self):
+        cracha_cache.invalidate()
+
+    def test_numeric_badges_share_key(self):
+        self.assertEqual(_cracha_key(12345), _cracha_key("00000012345"))
+        self.assertEqual(_cracha_key(" 12345 "), _cracha_key(12345))
+
+    def test_non_numeric_badge_key_is_kept(self):
+        self.assertEqual(_cracha_key(" AB12 "), "AB12")
+
+    def test_dismissal_with_padded_badge_invalidates_int_entry(self):
+        pessoa = {"cracha": 12345, "matricula": "1", "nome": "Fulano", "sucesso": True, "id": 7}
+        with mock.patch.object(utils_envio_comando, '_search_cracha', return_value=pessoa) as search:
+            # Agendamentos/associação consultam com int
+            fetch_cracha(12345)
+            fetch_cracha(12345)
+            self.assertEqual(search.call_count, 1)
+
+            # O desligamento chega do arquivo com zeros à esquerda
+            response = mock.Mock(status_code=200)
+            response.json.return_value = {"Sucesso": True}
+            with mock.patch.object(utils_envio_comando.kairos_client, 'post', return_value=response):
+                dismiss_employee({"cracha": "00000012345", "id": 7}, "01/01/2026")
+
+            fetch_cracha(12345)
+            self.assertEqual(search.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,79 +1,147 @@
-import requests
 import json
 import io
 import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
+from cache_utils import TTLCache
 from config import Config, get_local_now
+import biometria_pessoas
+import kairos_client
+
+# Resultado do SearchPerson por crachá (Id, Nome, Matrícula, desligamento e biometria).
+# Só pessoas encontradas e com biometria entram no cache; erros, crachás inexistentes e
+# pessoas sem biometria (que podem ser cadastradas a qualquer momento) são consultados de novo.
+cracha_cache = TTLCache(Config.CRACHA_CACHE_TTL_MINUTOS * 60, name='CACHE CRACHAS')
+
+
+def _cracha_key(cracha):
+    # Crachás numéricos chegam como int (agendamentos, associação) ou como texto com zeros à
+    # esquerda (arquivo de desligamento); todos precisam cair na mesma chave do cache
+    chave = str(cracha).strip()
+    return str(int(chave)) if chave.isdigit() else chave
 
-# Tempo limite para requisições à API do Kairos (em segundos)
-TIMEOUT = 60
 
 def fetch_cracha(cracha):
-    url = "https://www.dimepkairos.com.br/RestServiceApi/People/SearchPerson"
-    payload = {"Cracha": cracha, "CarregarBiometrias": "true"}
-    
+    cached = cracha_cache.get(_cracha_key(cracha))
+    if cached is not None:
+        return dict(cached, cracha=cracha)
+
+    result = _search_cracha(cracha)
+    if result.get("id") is not None and not result.get("semTemplates"):
+        cracha_cache.set(_cracha_key(cracha), result)
+    return dict(result)
+
+def _search_person(cracha, carregar_biometrias):
+    """Consulta o SearchPerson. Retorna (pessoa, None) ou (None, resultado_de_erro)."""
+    payload = {"Cracha": cracha, "CarregarBiometrias": "true" if carregar_biometrias else "false"}
+    response = kairos_client.post(kairos_client.SEARCH_PERSON, payload)
+    data = None
+    if response.status_code == 200:
+        data = response.json()
+        if data.get("Sucesso") and data.get("Obj"):
+            # Handle JSON string inside Obj if necessary
+            obj_data = data["Obj"]
+            if isinstance(obj_data, str):
+                try:
+                    obj_data = json.loads(obj_data)
+                except json.JSONDecodeError:
+                    return None, {"cracha": cracha, "sucesso": False, "mensagem": "Erro ao interpretar dados da API (JSON inválido)."}
+
+            if isinstance(obj_data, list) and len(obj_data) > 0:
+                return obj_data[0], None
+
+    mensagem_erro = data.get("Mensagem") if data else "Erro desconhecido"
+    return None, {"cracha": cracha, "sucesso": False, "mensagem": mensagem_erro}
+
+def _search_cracha(cracha):
     try:
-        response = requests.post(url, json=payload, headers=Config.KAIROS_HEADERS, timeout=TIMEOUT)
-        if response.status_code == 200:
-            data = response.json()
-            if data.get("Sucesso") and data.get("Obj"):
-                # Handle JSON string inside Obj if necessary
-                obj_data = data["Obj"]
-                if isinstance(obj_data, str):
-                    try:
-                        obj_data = json.loads(obj_data)
-                    except json.JSONDecodeError:
-                        return {"cracha": cracha, "sucesso": False, "mensagem": "Erro ao interpretar dados da API (JSON inválido)."}
-                
-                if isinstance(obj_data, list) and len(obj_data) > 0:
-                    person = obj_data[0]
-                    matricula = person.get("Matricula")
-                    nome = person.get("Nome")
-                    data_demissao = person.get("DataDemissao")
-                    templates = person.get("Template") or person.get("Templates") or []
-                    
-                    if not templates or len(templates) == 0:
-                        return {
-                            "cracha": cracha,
-                            "sucesso": True,
-                            "semTemplates": True,
-                            "mensagem": "Não possui Biometria",
-                            "nome": nome,
-                            "id": person.get("Id")
-                        }
-                    
-                    if data_demissao and data_demissao != "01/01/1753 00:00:00":
-                        data_demissao_curta = data_demissao.split(" ")[0]
-                        return {
-                            "cracha": cracha,
-                            "sucesso": False,
-                            "mensagem": "Funcionário Desligado",
-                            "dataDesligamento": data_demissao_curta,
-                            "nome": nome,
-                            "id": person.get("Id")
-                        }
-                    
-                    return {"cracha": cracha, "matricula": matricula, "nome": nome, "sucesso": True, "id": person.get("Id")}
-        
-        mensagem_erro = data.get("Mensagem") if 'data' in locals() and data else "Erro desconhecido"
-        return {"cracha": cracha, "sucesso": False, "mensagem": mensagem_erro}
-        
+        # Consulta leve (sem templates) só para crachás de pessoas com biometria já confirmada;
+        # nos demais casos uma única consulta com templates (ver biometria_pessoas.py)
+        chave = _cracha_key(cracha)
+        person = None
+        kairos_id = biometria_pessoas.biometric_person_id(chave)
+        if kairos_id is not None:
+            person, erro = _search_person(cracha, carregar_biometrias=False)
+            if erro:
+                return erro
+            if person.get("Id") != kairos_id:
+                # O crachá passou para outra pessoa: verifica a biometria dela
+                person = None
+
+        if person is not None:
+            possui_biometria = True
+        else:
+            person, erro = _search_person(cracha, carregar_biometrias=True)
+            if erro:
+                return erro
+            templates = person.get("Template") or person.get("Templates") or []
+            possui_biometria = len(templates) > 0
+            biometria_pessoas.record(person.get("Id"), chave, possui_biometria)
+
+        matricula = person.get("Matricula")
+        nome = person.get("Nome")
+        data_demissao = person.get("DataDemissao")
+
+        if not possui_biometria:
+            return {
+                "cracha": cracha,
+                "sucesso": True,
+                "semTemplates": True,
+                "mensagem": "Não possui Biometria",
+                "nome": nome,
+                "id": person.get("Id")
+            }
+
+        if data_demissao and data_demissao != "01/01/1753 00:00:00":
+            data_demissao_curta = data_demissao.split(" ")[0]
+            return {
+                "cracha": cracha,
+                "sucesso": False,
+                "mensagem": "Funcionário Desligado",
+                "dataDesligamento": data_demissao_curta,
+                "nome": nome,
+                "id": person.get("Id")
+            }
+
+        return {"cracha": cracha, "matricula": matricula, "nome": nome, "sucesso": True, "id": person.get("Id")}
+
     except Exception as e:
         return {"cracha": cracha, "sucesso": False, "mensagem": str(e)}
 
+def fetch_crachas(crachas, max_workers=None, progress=None):
+    """
+    Consulta vários crachás em paralelo (fetch_cracha com um pool limitado de threads,
+    usando a sessão e o limite de taxa compartilhados do kairos_client). Crachás repetidos
+    são consultados uma única vez. Retorna os resultados na mesma ordem de `crachas`.
+    `progress(resultado)` é chamado para cada crachá distinto consultado.
+    """
+    unicos = list(dict.fromkeys(crachas))
+    if not unicos:
+        return []
+
+    workers = min(max_workers or Config.KAIROS_CRACHA_WORKERS, len(unicos))
+    resultados = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='kairos-cracha') as executor:
+        futures = {executor.submit(fetch_cracha, cracha): cracha for cracha in unicos}
+        # Progresso na ordem em que as consultas terminam, para um crachá lento não travar o contador
+        for future in as_completed(futures):
+            result = future.result()
+            resultados[futures[future]] = result
+            if progress:
+                progress(result)
+    return [dict(resultados[cracha]) for cracha in crachas]
+
 def unassociate_clocks(cracha_list, relogio_list):
-    url = "https://www.dimepkairos.com.br/RestServiceApi/Clock/UnassociateClocks"
     payload = {
         "PessoaCracha": cracha_list,
         "RelogioNumero": relogio_list
     }
     try:
-        requests.post(url, json=payload, headers=Config.KAIROS_HEADERS, timeout=TIMEOUT)
+        kairos_client.post(kairos_client.UNASSOCIATE_CLOCKS, payload)
     except Exception as e:
         print(f"Erro ao desassociar os crachás: {e}")
 
 def associate_clocks(cracha_list, relogio_list):
-    url = "https://www.dimepkairos.com.br/RestServiceApi/Clock/AssociateClocks"
     payload = {
         "PessoaCracha": cracha_list,
         "RelogioNumero": relogio_list,
@@ -81,7 +149,7 @@ def associate_clocks(cracha_list, relogio_list):
         "EnviarListaTemplate": True
     }
     try:
-        response = requests.post(url, json=payload, headers=Config.KAIROS_HEADERS, timeout=TIMEOUT)
+        response = kairos_client.post(kairos_client.ASSOCIATE_CLOCKS, payload)
         if response.status_code == 200 and response.json().get("Sucesso"):
             return {"sucesso": True}
         else:
@@ -90,7 +158,6 @@ def associate_clocks(cracha_list, relogio_list):
         return {"sucesso": False, "mensagem": str(e)}
 
 def schedule_commands(cracha_list, config_options, relogio_list):
-    url = "https://www.dimepkairos.com.br/RestServiceApi/Clock/ScheduleCommands"
     # Ensure config_options keys correspond exactly to Kairos API flags
     payload = {
         "PessoaCracha": cracha_list,
@@ -99,7 +166,7 @@ def schedule_commands(cracha_list, config_options, relogio_list):
     payload.update(config_options)
     
     try:
-        response = requests.post(url, json=payload, headers=Config.KAIROS_HEADERS, timeout=TIMEOUT)
+        response = kairos_client.post(kairos_client.SCHEDULE_COMMANDS, payload)
         if response.status_code == 200 and response.json().get("Sucesso"):
             return {"sucesso": True, "mensagem": "Comandos agendados com sucesso.", "detalhes": response.json()}
         return {"sucesso": False, "mensagem": response.json().get("Mensagem", "Falha no agendamento")}
@@ -107,10 +174,9 @@ def schedule_commands(cracha_list, config_options, relogio_list):
         return {"sucesso": False, "mensagem": str(e)}
 
 def fetch_clocks():
-    url = "https://www.dimepkairos.com.br/RestServiceApi/Clock/SearchClocks"
     payload = {"TodosRelogios": "true"}
     try:
-        response = requests.post(url, json=payload, headers=Config.KAIROS_HEADERS, timeout=TIMEOUT)
+        response = kairos_client.post(kairos_client.SEARCH_CLOCKS, payload)
         if response.status_code == 200 and response.json().get("Sucesso"):
             return response.json().get("Obj", [])
         return []
@@ -119,14 +185,15 @@ def fetch_clocks():
         return []
 
 def dismiss_employee(employee, data_desligamento):
-    url = "https://www.dimepkairos.com.br/RestServiceApi/Dismiss/MarkDismiss"
     payload = {
         "PESSOAID": employee.get("id"),
         "MOTIVO": "11-Rescisão sem justa causa por iniciativa do empregador",
         "DATA": data_desligamento
     }
     try:
-        response = requests.post(url, json=payload, headers=Config.KAIROS_HEADERS, timeout=TIMEOUT)
+        response = kairos_client.post(kairos_client.MARK_DISMISS, payload)
+        # A situação da pessoa mudou (ou pode ter mudado): a próxima consulta vai ao Kairos
+        cracha_cache.invalidate(_cracha_key(employee.get("cracha")))
         if response.status_code == 200 and response.json().get("Sucesso"):
             return {"sucesso": True, "employee": employee}
         else: